@@ -0,0 +1,271 @@
+"""Precomputed transit access from every tract centroid to its nearest facilities.
+
+The batch job routes each tract centroid to the *k* nearest facilities by
+straight-line distance, checkpointing every result so an interrupted run can
+resume. The finished matrix is written as a small Parquet artifact that the
+map loads as the ``transit_minutes`` scoring factor.
+"""
+
+import json
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from facility_index import FacilityIndex
+from route_model import route_metrics
+from transit import (
+    DEFAULT_MAX_CONCURRENT_ROUTES,
+    NoRoutesFound,
+    iter_transit_routes,
+    run_transit_routes,
+)
+from utils import ACCESS_FACTOR_COLUMN, file_hash
+
+ACCESS_METADATA_KEY = b"transit_access"
+TRACT_KEY_COLUMNS = ["County", "tract"]
+
+
+class CheckpointMismatch(ValueError):
+    """A checkpoint was written by a run with different parameters."""
+
+
+def route_pairs(tracts: pd.DataFrame, facilities: pd.DataFrame, k: int) -> pd.DataFrame:
+    """Pair each tract centroid with its *k* nearest facilities, one row per pair."""
+    index = FacilityIndex(facilities)
+    columns = {name: [] for name in ["tract_row", "rank", "facility", "direct_km"]}
+    lats = tracts["centroid_lat"].to_numpy(dtype=float)
+    lons = tracts["centroid_lon"].to_numpy(dtype=float)
+    for row, (lat, lon) in enumerate(zip(lats, lons)):
+        if np.isnan(lat) or np.isnan(lon):
+            continue
+        rows, distances = index.nearest_rows(lat, lon, k)
+        columns["tract_row"].append(np.full(len(rows), row))
+        columns["rank"].append(np.arange(1, len(rows) + 1))
+        columns["facility"].append(rows)
+        columns["direct_km"].append(distances)
+    columns = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=int)
+        for name, parts in columns.items()
+    }
+    tract_rows = columns.pop("tract_row")
+    pairs = tracts[TRACT_KEY_COLUMNS].iloc[tract_rows].reset_index(drop=True)
+    pairs["rank"] = columns["rank"].astype(np.int8)
+    pairs["facility"] = columns["facility"].astype(np.int32)
+    pairs["direct_km"] = columns["direct_km"].astype(np.float32)
+    pairs["start_lat"] = lats[tract_rows]
+    pairs["start_lng"] = lons[tract_rows]
+    return pairs
+
+
+def _pair_key(county: str, tract: str, facility: int) -> str:
+    return f"{county}|{tract}|{facility}"
+
+
+def _checkpoint_header(line: str) -> Optional[dict]:
+    try:
+        return json.loads(line).get("checkpoint")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def read_checkpoint(path: Optional[str], params: Optional[dict] = None) -> Dict[str, dict]:
+    """Return finished results from a checkpoint file, keyed by tract and facility.
+
+    Requests that failed with a transient error are left out so a resumed run
+    retries them; "no route" answers are kept. The first line records the run
+    parameters; if they differ from *params*, CheckpointMismatch is raised
+    rather than reusing routes computed for another run.
+    """
+    done = {}
+    if not path or not os.path.exists(path) or not os.path.getsize(path):
+        return done
+    with open(path) as f:
+        header = _checkpoint_header(f.readline())
+        if params is not None and header != params:
+            raise CheckpointMismatch(
+                f"{path} was written with {header}, not {params}; "
+                "delete it or use another checkpoint"
+            )
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line
+                continue
+            if _is_final(record):
+                done[_pair_key(record["County"], record["tract"], record["facility"])] = record
+    return done
+
+
+def _is_final(record: dict) -> bool:
+    return not record.get("error") or record.get("no_route", False)
+
+
+def _route_record(pair, legs, error: Optional[Exception]) -> dict:
+    record = {
+        "County": pair.County,
+        "tract": pair.tract,
+        "facility": int(pair.facility),
+        "travel_time_s": None,
+        "walk_time_s": None,
+    }
+    if error is not None:
+        record["error"] = str(error)
+        record["no_route"] = isinstance(error, NoRoutesFound)
+    elif legs:
+        metrics = route_metrics(legs)
+        record["travel_time_s"] = metrics["total_duration_s"]
+        record["walk_time_s"] = metrics["total_walk_time_s"]
+    return record
+
+
+def compute_transit_access(
+    tracts: pd.DataFrame,
+    facilities: pd.DataFrame,
+    k: int = 3,
+    departure_time: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_ROUTES,
+    fetch: Optional[Callable[..., list]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    route_kwargs: Optional[dict] = None,
+    checkpoint_params: Optional[dict] = None,
+) -> pd.DataFrame:
+    """Route every tract centroid to its *k* nearest facilities.
+
+    Each finished request is appended to *checkpoint_path* as a JSON line, and
+    pairs already in the checkpoint are not requested again. A checkpoint left
+    by a run with another *k*, *departure_time* or *checkpoint_params* (e.g.
+    the routing source or input hashes) raises CheckpointMismatch. Routes are
+    fetched on one event loop by default; pass a blocking *fetch* function to
+    route through a thread pool instead. *route_kwargs* are added to every
+    request (e.g. a route cache).
+
+    Returns one row per (tract, facility) pair with ``rank``, ``facility`` (the
+    facility's row position), ``direct_km``, ``travel_time_s`` and
+    ``walk_time_s``; times are NaN where no route was found.
+    """
+    pairs = route_pairs(tracts, facilities, k)
+    params = {"k": k, "departure_time": departure_time, **(checkpoint_params or {})}
+    done = read_checkpoint(checkpoint_path, params)
+    keys = [
+        _pair_key(county, tract, facility)
+        for county, tract, facility in zip(pairs["County"], pairs["tract"], pairs["facility"])
+    ]
+    todo = [i for i, key in enumerate(keys) if key not in done]
+
+    facility_lats = facilities["lat"].to_numpy(dtype=float)
+    facility_lons = facilities["lon"].to_numpy(dtype=float)
+    route_requests = [
+        {
+            "start_lat": float(pairs["start_lat"].iat[i]),
+            "start_lng": float(pairs["start_lng"].iat[i]),
+            "end_lat": float(facility_lats[pairs["facility"].iat[i]]),
+            "end_lng": float(facility_lons[pairs["facility"].iat[i]]),
+            "departure_time": departure_time,
+            **(route_kwargs or {}),
+        }
+        for i in todo
+    ]
+
+    total = len(pairs)
+    finished = total - len(todo)
+    if progress is not None and finished:
+        progress(finished, total)
+    checkpoint = None
+    if checkpoint_path:
+        checkpoint = open(checkpoint_path, "a")
+        if not checkpoint.tell():
+            checkpoint.write(json.dumps({"checkpoint": params}) + "\n")
+    rows = list(pairs.itertuples(index=False))
+
+    def record_result(request_idx, legs, error):
+        nonlocal finished
+        i = todo[request_idx]
+        record = _route_record(rows[i], legs, error)
+        if checkpoint is not None:
+            checkpoint.write(json.dumps(record) + "\n")
+            checkpoint.flush()
+        if _is_final(record):
+            done[keys[i]] = record
+        finished += 1
+        if progress is not None:
+            progress(finished, total)
+
+    try:
+        if fetch is None:
+            run_transit_routes(route_requests, record_result, max_concurrency)
+        else:
+            for result in iter_transit_routes(route_requests, max_concurrency, fetch):
+                record_result(*result)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    pairs = pairs.drop(columns=["start_lat", "start_lng"])
+    for column in ("travel_time_s", "walk_time_s"):
+        values = [done[key][column] if key in done else None for key in keys]
+        pairs[column] = np.array(values, dtype=float).astype(np.float32)
+    return pairs
+
+
+def write_transit_access(access: pd.DataFrame, path: str, metadata: Optional[dict] = None):
+    """Write the access matrix to *path* as Parquet, atomically."""
+    table = pa.Table.from_pandas(access, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            ACCESS_METADATA_KEY: json.dumps(metadata or {}).encode(),
+        }
+    )
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def read_transit_access_metadata(path: str) -> Optional[dict]:
+    metadata = pq.read_schema(path).metadata or {}
+    if ACCESS_METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[ACCESS_METADATA_KEY])
+
+
+def transit_access_is_current(path: str, facilities_path: Optional[str]) -> bool:
+    """Whether the artifact at *path* was built from the facilities file at *facilities_path*."""
+    metadata = read_transit_access_metadata(path)
+    if metadata is None:
+        return False
+    if not facilities_path:
+        return True
+    try:
+        return metadata.get("facilities_hash") == file_hash(facilities_path)
+    except FileNotFoundError:
+        # Deployments may ship only the built artifact
+        return True
+
+
+def transit_access_factor(access: pd.DataFrame) -> pd.DataFrame:
+    """Minutes by transit from each tract to its closest reachable facility.
+
+    Tracts where none of the nearest facilities could be reached get the worst
+    observed time, so unreachable areas score as the highest need.
+    """
+    minutes = access.groupby(TRACT_KEY_COLUMNS, sort=False)["travel_time_s"].min() / 60
+    minutes = minutes.fillna(minutes.max()).astype(float)
+    return minutes.rename(ACCESS_FACTOR_COLUMN).reset_index()
+
+
+def attach_transit_access(tract: pd.DataFrame, path: str) -> pd.DataFrame:
+    """Add the ``transit_minutes`` column from the access artifact at *path*."""
+    factor = transit_access_factor(pd.read_parquet(path))
+    factor["tract"] = factor["tract"].astype(tract["tract"].dtype)
+    factor["County"] = factor["County"].astype(tract["County"].dtype)
+    merged = tract.drop(columns=ACCESS_FACTOR_COLUMN, errors="ignore").merge(
+        factor, on=TRACT_KEY_COLUMNS, how="left"
+    )
+    merged.index = tract.index
+    return merged
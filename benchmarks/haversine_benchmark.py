@@ -0,0 +1,69 @@
+# /// script
+# dependencies = ["numpy", "pandas"]
+# ///
+
+"""Compare the scalar haversine_distance with the vectorized kernels in distance.py.
+
+Run from the repository root: ``python benchmarks/haversine_benchmark.py``.
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from distance import haversine_distance, haversine_matrix, haversine_one_to_many
+
+
+def _best(stmt, number):
+    """Best-of-five seconds per call."""
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number
+
+
+def main():
+    rng = np.random.default_rng(0)
+    facilities = pd.read_csv("data/shnwnc_facilities.csv")
+    origin = (35.2271, -80.8431)
+
+    for n in (len(facilities), 10_000, 100_000):
+        lats = rng.uniform(33.8, 36.6, size=n)
+        lons = rng.uniform(-84.3, -75.5, size=n)
+        frame = pd.DataFrame({"lat": lats, "lon": lons})
+        scalar = _best(
+            lambda: frame.apply(
+                lambda row: haversine_distance(*origin, row["lat"], row["lon"]), axis=1
+            ),
+            number=1,
+        )
+        vector = _best(lambda: haversine_one_to_many(*origin, lats, lons), number=20)
+        vector32 = _best(
+            lambda: haversine_one_to_many(*origin, lats, lons, dtype=np.float32), number=20
+        )
+        print(
+            f"one-to-many n={n:>7}: scalar apply {scalar * 1e3:9.2f} ms | "
+            f"float64 {vector * 1e3:7.3f} ms | float32 {vector32 * 1e3:7.3f} ms | "
+            f"{scalar / vector:,.0f}x"
+        )
+
+    clients = 20_000
+    lats1 = rng.uniform(33.8, 36.6, size=clients)
+    lons1 = rng.uniform(-84.3, -75.5, size=clients)
+    lats2 = facilities["lat"].to_numpy()
+    lons2 = facilities["lon"].to_numpy()
+    for dtype in (np.float64, np.float32):
+        for chunk_rows in (None, 1024):
+            seconds = _best(
+                lambda: haversine_matrix(lats1, lons1, lats2, lons2, dtype, chunk_rows), number=1
+            )
+            print(
+                f"matrix {clients}x{len(lats2)} {np.dtype(dtype).name} "
+                f"chunk_rows={chunk_rows}: {seconds * 1e3:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
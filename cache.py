@@ -0,0 +1,98 @@
+"""SQLite-backed persistent key/value cache with per-entry expiry."""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+MISSING = object()
+
+
+class PersistentCache:
+    """A JSON value store in SQLite, partitioned by *namespace*.
+
+    Entries expire after the TTL given when they are set. The connection is
+    shared between threads behind a lock, and ``hits``/``misses`` count lookups
+    made through this instance.
+    """
+
+    def __init__(self, path: str, namespace: str = "default"):
+        self.path = path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Return the unexpired value for *key*, or *default* on a miss."""
+        entry = self.get_with_expiry(key)
+        return default if entry is MISSING else entry[0]
+
+    def get_with_expiry(self, key: str) -> Any:
+        """Return ``(value, expires_at)`` for an unexpired *key*, or MISSING."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None or row[1] <= time.time():
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store *value* (JSON-serializable) under *key* for *ttl* seconds."""
+        payload = json.dumps(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.namespace, key, payload, time.time() + ttl),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+
+    def purge_expired(self) -> int:
+        """Delete expired entries in this namespace and return how many were removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+                (self.namespace, time.time()),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,68 @@
+# /// script
+# dependencies = ["pandas", "pyarrow"]
+# ///
+
+"""Index the transit stops within walking distance of every facility.
+
+Run from the repository root with a GTFS feed (directory or zip):
+
+    python data/build_facility_stops.py --gtfs data/gtfs.zip
+
+The table is tied to the current facilities file; rebuild it after the
+facilities change.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from facility_stops import (
+    DEFAULT_MAX_STOP_WALK_M,
+    build_facility_stops,
+    write_facility_stops,
+)
+from gtfs_router import read_stops
+from utils import file_hash, load_config
+
+DEFAULT_OUTPUT = "data/facility_stops.parquet"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gtfs", required=True, help="GTFS feed (directory or zip)")
+    parser.add_argument(
+        "--max-walk", type=float, default=DEFAULT_MAX_STOP_WALK_M, help="meters"
+    )
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    facilities_path = load_config()["file_paths"]["programs"]
+    facilities = pd.read_csv(facilities_path)
+    stops = read_stops(args.gtfs)
+
+    table = build_facility_stops(facilities, stops, args.max_walk)
+    write_facility_stops(
+        table,
+        args.output,
+        {
+            "gtfs": Path(args.gtfs).name,
+            "max_walk_m": args.max_walk,
+            "n_facilities": len(facilities),
+            "facilities_hash": file_hash(facilities_path),
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+        },
+    )
+    covered = table["facility"].nunique()
+    print(
+        f"Wrote {len(table)} facility-stop pairs to {args.output} "
+        f"({covered} of {len(facilities)} facilities have a stop within {args.max_walk:.0f} m)"
+    )
+
+
+if __name__ == "__main__":
+    main()
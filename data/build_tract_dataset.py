@@ -0,0 +1,23 @@
+# /// script
+# dependencies = ["pandas", "geopandas", "pyarrow", "streamlit"]
+# ///
+
+"""Rebuild data/tracts.parquet from the ACS pickle and food insecurity CSV.
+
+Run from the repository root after refreshing any of the source files.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from utils import build_tract_dataset, load_config, tract_sources_hash
+
+if __name__ == "__main__":
+    config = load_config()
+    tract = build_tract_dataset(config)
+    print(
+        f"Wrote {len(tract)} tracts to {config['file_paths']['tract_dataset']} "
+        f"(source hash {tract_sources_hash(config)[:12]})"
+    )
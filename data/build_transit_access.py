@@ -0,0 +1,126 @@
+# /// script
+# dependencies = ["pandas", "geopandas", "pyarrow", "streamlit", "requests"]
+# ///
+
+"""Route every tract centroid to its nearest facilities and write data/transit_access.parquet.
+
+Run from the repository root with MAPS_API_KEY set. Progress is checkpointed,
+so rerunning with the same options after an interruption only requests the
+routes still missing:
+
+    python data/build_transit_access.py --k 3 --departure "2025-03-05 10:00:00"
+
+With --gtfs, routes come from a local GTFS feed instead of the Routes API and
+no API key is needed.
+"""
+
+import argparse
+import functools
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from accessibility import CheckpointMismatch, compute_transit_access, write_transit_access
+from gtfs_router import GTFSRouter
+from route_cache import get_route_cache
+from transit import DEFAULT_MAX_CONCURRENT_ROUTES, get_transit_routes
+from utils import file_hash, load_and_process_data, load_config, tract_sources_hash
+
+
+def next_weekday_morning():
+    """10:00 on the next weekday, a typical time for a pantry visit."""
+    day = datetime.now().date() + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return f"{day:%Y-%m-%d} 10:00:00"
+
+
+def tracts_hash(config):
+    """Hash of the tract inputs: their source files, or the built dataset if only it ships."""
+    try:
+        return tract_sources_hash(config)
+    except FileNotFoundError:
+        return file_hash(config["file_paths"]["tract_dataset"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3, help="facilities routed per tract")
+    parser.add_argument("--departure", default=None, help="'YYYY-MM-DD HH:MM:SS' departure")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENT_ROUTES)
+    parser.add_argument("--output", default=None, help="defaults to file_paths.transit_access")
+    parser.add_argument("--checkpoint", default=None, help="defaults to <output>.checkpoint.jsonl")
+    parser.add_argument("--gtfs", default=None, help="GTFS feed (directory or zip) to route offline")
+    args = parser.parse_args()
+
+    config = load_config()
+    output = args.output or config["file_paths"]["transit_access"]
+    checkpoint = args.checkpoint or f"{output}.checkpoint.jsonl"
+    departure = args.departure or next_weekday_morning()
+
+    tracts = load_and_process_data(config)
+    facilities_path = config["file_paths"]["programs"]
+    facilities = pd.read_csv(facilities_path)
+
+    def report(done, total):
+        print(f"\r{done}/{total} routes", end="", flush=True)
+
+    routing_source = f"gtfs:{os.path.basename(args.gtfs)}" if args.gtfs else "routes_api"
+    # Routes in a checkpoint are only reused for the same routing source and inputs
+    sources = {
+        "routing": routing_source,
+        "facilities_hash": file_hash(facilities_path),
+        "tracts_hash": tracts_hash(config),
+    }
+    if args.gtfs:
+        # Offline routing is CPU-bound, so requests run one at a time
+        router = GTFSRouter.load(args.gtfs)
+        routing = {
+            "fetch": functools.partial(get_transit_routes, backend=router),
+            "max_concurrency": 1,
+        }
+    else:
+        routing = {
+            "max_concurrency": args.concurrency,
+            "route_kwargs": {"cache": get_route_cache()},
+        }
+    try:
+        access = compute_transit_access(
+            tracts,
+            facilities,
+            k=args.k,
+            departure_time=departure,
+            checkpoint_path=checkpoint,
+            checkpoint_params=sources,
+            progress=report,
+            **routing,
+        )
+    except CheckpointMismatch as e:
+        sys.exit(str(e))
+    print()
+
+    write_transit_access(
+        access,
+        output,
+        {
+            "k": args.k,
+            "departure_time": departure,
+            **sources,
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+        },
+    )
+    missing = int(access["travel_time_s"].isna().sum())
+    print(f"Wrote {len(access)} tract-facility routes to {output} ({missing} without a route)")
+    if missing:
+        print(f"Kept {checkpoint}; rerun to retry requests that failed")
+    else:
+        os.remove(checkpoint)
+
+
+if __name__ == "__main__":
+    main()
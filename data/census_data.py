@@ -1,32 +1,83 @@
 # /// script
-# dependencies = ["census", "pandas", "streamlit", "tqdm", "geopandas", "pygris"]
+# dependencies = ["census", "pandas", "streamlit", "geopandas", "pygris"]
 # ///
 
+"""Fetch ACS tract tables for our counties and rebuild data/full_acs_data.pkl.
+
+Run from the repository root with CENSUS_API_KEY set (or in Streamlit secrets):
+
+    python data/census_data.py
+
+Every (table, county) request runs on a worker pool and each response is
+stored in an on-disk cache as soon as it arrives. A rerun after a failure
+only fetches what is still missing; --refresh downloads everything again.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import geopandas as gpd
 import pandas as pd
+import requests
 from census import Census
-import streamlit as st
-import geopandas as gpd
+from census.core import CensusException
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from cache import MISSING, PersistentCache
+
+ACS_YEAR = 2023
+STATE_FIPS = "37"
+COUNTIES_PATH = "data/counties.csv"
+VARIABLES_PATH = "data/census_variables.csv"
+DEFAULT_CACHE_PATH = "data/census_cache.sqlite"
+# ACS 5-year releases do not change once published
+DEFAULT_CACHE_TTL_SECONDS = 365 * 24 * 3600
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+# Tables the map reads, and where each is written
+TABLE_OUTPUTS = {"B17020": "data/poverty.csv", "B08201": "data/vehicle.csv"}
+
+
+def load_counties(path: str = COUNTIES_PATH) -> Dict[str, str]:
+    """County name to three-digit FIPS code for every county we serve."""
+    counties = pd.read_csv(path, dtype={"FIPS": str})
+    return dict(zip(counties["County"], counties["FIPS"]))
 
-# Load counties data and build dictionaries
-df_counties = pd.read_csv("data/counties.csv", dtype={"FIPS": str})
-county_fips = {row["County"]: row["FIPS"] for _, row in df_counties.iterrows()}
-county_seats = {row["County"]: row["CountySeat"] for _, row in df_counties.iterrows()}
-city_coords = {row["CountySeat"]: (row["lat"], row["lon"]) for _, row in df_counties.iterrows()}
 
-# Load and group census variables
-df_vars = pd.read_csv("data/census_variables.csv")
-census_variables = {}
-for var, group in df_vars.groupby("census_variable"):
-    census_variables[var] = dict(zip(group["census_variable_measure"], group["description"]))
+def load_census_variables(path: str = VARIABLES_PATH) -> Dict[str, Dict[str, str]]:
+    """ACS table to ``{variable: description}`` for the active variables."""
+    variables = pd.read_csv(path)
+    if "active" in variables:
+        variables = variables[variables["active"] == 1]
+    return {
+        table: dict(zip(group["census_variable_measure"], group["description"]))
+        for table, group in variables.groupby("census_variable")
+    }
 
 
-census_key = st.secrets["CENSUS_API_KEY"]
-census = Census(census_key, year=2023)
+def make_census_client(api_key: Optional[str] = None, year: int = ACS_YEAR) -> Census:
+    """Census API client; the key defaults to CENSUS_API_KEY, then Streamlit secrets."""
+    api_key = api_key or os.getenv("CENSUS_API_KEY")
+    if not api_key:
+        import streamlit as st
+
+        api_key = st.secrets["CENSUS_API_KEY"]
+    return Census(api_key, year=year)
+
 
 def pct_more_people_than_vehicles(row):
     if row["Total Households"] == 0:
         return 0
-    one_person = row["1-Person Households with No Vehicle Available"] 
+    one_person = row["1-Person Households with No Vehicle Available"]
     two_person = row["2-Person Households with No Vehicle Available"] + row["2-Person Households with 1 Vehicle Available"]
     three_person = row["3-Person Households with No Vehicle Available"] + row["3-Person Households with 1 Vehicle Available"] + row["3-Person Households with 2 Vehicles Available"]
     four_person = row["4-or-More-Person Households with No Vehicle Available"] + row["4-or-More-Person Households with 1 Vehicle Available"] + row["4-or-More-Person Households with 2 Vehicles Available"]
@@ -47,43 +98,119 @@ def pct_below_poverty(row):
 # c = census.acs5.get(("NAME", "B08201_001E"), {'for': 'tract:*', 'in': 'state:37 county:081'})
 # df = pd.DataFrame(c)
 
-if __name__ == "__main__":
-    from tqdm.auto import tqdm
-    import pygris
 
-    # for var in tqdm(census_variables):
-    #     new = 1
-    #     for county, fips in tqdm(county_fips.items(), leave=False):
-    #         print(county, fips)
-    #         c = census.acs5.get(("NAME", *list(census_variables[var].keys())), {"for": "tract:*", "in": f"state:37 county:{fips}"})
-    #         c = pd.DataFrame(c)
-    #         if new:
-    #             df = c.copy()
-    #             new = 0
-    #         else:
-    #             df = pd.concat([df, c], ignore_index=True, axis=0)
-    #         # print(f"\nAdded {county} County, North Carolina ({fips}), {len(c)} rows, {len(df)} total rows")
-        
-    #     df.rename(columns=census_variables[var], inplace=True)
-            
-    #     df["tract"] = df["NAME"].str.extract(r"Tract (\d+(?:\.\d+)?);").astype(str)
-    #     df["County"] = df["NAME"].str.extract(r"; (.*); North Carolina")
-    #     df.to_csv(f"data/{var}.csv", index=False)
-        
-    # poverty = pd.read_csv("data/B17020.csv", dtype={"tract": str})
-    # poverty.to_csv("data/poverty.csv", index=False)
-    poverty = pd.read_csv("data/poverty.csv", dtype={"tract": str})
-
-    # vehicle = pd.read_csv("data/B08201.csv", dtype={"tract": str})
-    # vehicle.to_csv("data/vehicle.csv", index=False)
-    vehicle = pd.read_csv("data/vehicle.csv", dtype={"tract": str})
+def _cache_key(year: int, table: str, fips: str, fields: List[str]) -> str:
+    return f"acs5:{year}:{table}:{STATE_FIPS}:{fips}:{','.join(fields)}"
 
-    tracts: gpd.GeoDataFrame = pygris.tracts(state="NC", cb=True)
-    tracts = tracts[['NAMELSADCO', 'TRACTCE', 'geometry']].rename(columns={'NAMELSADCO': 'County'})
-    tracts["tract"] = tracts.TRACTCE.astype(str).apply(lambda x: str(int(x[:-2])) + "." + x[-2:]).astype(str)
-    poverty["tract"] = poverty.tract.astype(str).apply(lambda x: x if '.' in x else x + ".00")
-    vehicle["tract"] = vehicle.tract.astype(str).apply(lambda x: x if '.' in x else x + ".00")
-    tracts.to_pickle("data/tracts_new.pkl")
+
+def _fetch_with_retries(
+    census: Census, fields: List[str], fips: str, max_retries: int, backoff_seconds: float
+) -> List[dict]:
+    geo = {"for": "tract:*", "in": f"state:{STATE_FIPS} county:{fips}"}
+    for attempt in range(max_retries + 1):
+        try:
+            return census.acs5.get(("NAME", *fields), geo)
+        except (CensusException, requests.exceptions.RequestException):
+            if attempt == max_retries:
+                raise
+            delay = backoff_seconds * 2**attempt
+            time.sleep(delay * (random.random() + 0.5))
+
+
+def fetch_acs_tables(
+    census: Census,
+    census_variables: Dict[str, Dict[str, str]],
+    county_fips: Dict[str, str],
+    cache: Optional[PersistentCache] = None,
+    refresh: bool = False,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, pd.DataFrame]:
+    """Fetch every ACS table for every county's tracts.
+
+    Requests run concurrently and successful responses go into *cache* as
+    they arrive, so cached (table, county) pairs are never requested again
+    (unless *refresh* is set, which re-downloads everything).
+    If any request still fails after its retries, a RuntimeError naming them
+    is raised once the rest have finished; rerunning resumes from the cache.
+
+    Returns one DataFrame per table, with variables renamed to their
+    descriptions and ``tract`` and ``County`` parsed from ``NAME``.
+    """
+    year = census.acs5.default_year
+    jobs = [(table, fips) for table in census_variables for fips in county_fips.values()]
+    responses: Dict[Tuple[str, str], List[dict]] = {}
+    pending = []
+    for table, fips in jobs:
+        key = _cache_key(year, table, fips, list(census_variables[table]))
+        cached = cache.get(key) if cache is not None and not refresh else MISSING
+        if cached is MISSING:
+            pending.append((table, fips, key))
+        else:
+            responses[table, fips] = cached
+
+    done = len(responses)
+    if done and progress is not None:
+        progress(done, len(jobs))
+    failures = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            futures = {
+                pool.submit(
+                    _fetch_with_retries,
+                    census,
+                    list(census_variables[table]),
+                    fips,
+                    max_retries,
+                    backoff_seconds,
+                ): (table, fips, key)
+                for table, fips, key in pending
+            }
+            for future in as_completed(futures):
+                table, fips, key = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    failures.append(f"{table} county {fips}: {e}")
+                    continue
+                responses[table, fips] = rows
+                if cache is not None:
+                    cache.set(key, rows, DEFAULT_CACHE_TTL_SECONDS)
+                done += 1
+                if progress is not None:
+                    progress(done, len(jobs))
+    if failures:
+        raise RuntimeError(
+            f"{len(failures)} ACS requests failed; rerun to retry them:\n" + "\n".join(failures)
+        )
+
+    tables = {}
+    for table, variables in census_variables.items():
+        # Collected per county and concatenated once, in county order
+        frames = [pd.DataFrame(responses[table, fips]) for fips in county_fips.values()]
+        df = pd.concat(frames, ignore_index=True).rename(columns=variables)
+        df["tract"] = df["NAME"].str.extract(r"Tract (\d+(?:\.\d+)?);", expand=False).astype(str)
+        df["County"] = df["NAME"].str.extract(r"; (.*); North Carolina", expand=False)
+        tables[table] = df
+    return tables
+
+
+def write_acs_tables(tables: Dict[str, pd.DataFrame]) -> None:
+    for table, df in tables.items():
+        df.to_csv(TABLE_OUTPUTS.get(table, f"data/{table}.csv"), index=False)
+
+
+def build_full_acs(
+    tracts: gpd.GeoDataFrame,
+    poverty: pd.DataFrame,
+    vehicle: pd.DataFrame,
+    counties: Iterable[str],
+) -> gpd.GeoDataFrame:
+    """Join the poverty and vehicle tables onto tract geometry and add the percentages."""
+    poverty = poverty.assign(tract=poverty.tract.astype(str).apply(lambda x: x if '.' in x else x + ".00"))
+    vehicle = vehicle.assign(tract=vehicle.tract.astype(str).apply(lambda x: x if '.' in x else x + ".00"))
 
     full_file = tracts.merge(poverty, on=["County", "tract"], how="left", suffixes=("", "_p"))
     full_file = full_file.merge(vehicle, on=["County", "tract"], how="left", suffixes=("", "_v"))
@@ -91,18 +218,60 @@ if __name__ == "__main__":
     full_file["pct_poverty"] = full_file.apply(pct_below_poverty, axis=1)
     full_file["pct_no_vehicle"] = full_file.apply(pct_no_vehicle, axis=1)
     full_file["pct_fewer_vehicles"] = full_file.apply(pct_more_people_than_vehicles, axis=1)
-    full_file = full_file.loc[full_file["County"].isin(county_fips.keys())]
-    
+    return full_file.loc[full_file["County"].isin(counties)]
+
+
+def load_nc_tracts() -> gpd.GeoDataFrame:
+    import pygris
+
+    tracts: gpd.GeoDataFrame = pygris.tracts(state="NC", cb=True)
+    tracts = tracts[['NAMELSADCO', 'TRACTCE', 'geometry']].rename(columns={'NAMELSADCO': 'County'})
+    tracts["tract"] = tracts.TRACTCE.astype(str).apply(lambda x: str(int(x[:-2])) + "." + x[-2:]).astype(str)
+    return tracts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--year", type=int, default=ACS_YEAR)
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="on-disk response cache")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached responses")
+    parser.add_argument(
+        "--no-fetch", action="store_true", help="rebuild from the existing table CSVs"
+    )
+    args = parser.parse_args()
+
+    county_fips = load_counties()
+    if not args.no_fetch:
+        cache = PersistentCache(args.cache, namespace="census")
+
+        def report(done, total):
+            print(f"\r{done}/{total} county tables", end="", flush=True)
+
+        started = time.monotonic()
+        tables = fetch_acs_tables(
+            make_census_client(year=args.year),
+            load_census_variables(),
+            county_fips,
+            cache=cache,
+            refresh=args.refresh,
+            max_workers=args.workers,
+            progress=report,
+        )
+        print(f"\nFetched {len(tables)} tables in {time.monotonic() - started:.1f}s")
+        write_acs_tables(tables)
+
+    poverty = pd.read_csv(TABLE_OUTPUTS["B17020"], dtype={"tract": str})
+    vehicle = pd.read_csv(TABLE_OUTPUTS["B08201"], dtype={"tract": str})
+
+    tracts = load_nc_tracts()
+    tracts.to_pickle("data/tracts_new.pkl")
+    full_file = build_full_acs(tracts, poverty, vehicle, county_fips.keys())
+
     full_file.sort_values(["County", "tract"]).to_csv("data/full_acs_data.csv", index=False)
     with open("data/full_acs_data.pkl", "wb") as f:
         full_file.to_pickle(f)
 
-    # Save county seat coordinates
-    # city_coords_df = pd.DataFrame(city_coords).T.reset_index()
-    # city_coords_df.columns = ["City", "lat", "lon"]
-    # city_coords_df.to_csv("data/city_coords.csv", index=False)
 
-    # Move data to localdata folder
-    # import shutil
-    # shutil.move("data/B17020.csv", "data/localdata/POVERTY_STATUS_IN_THE_PAST_12_MONTHS_BY_AGE.csv")
-    # shutil.move("data/B08201.csv", "data/localdata/Household_size_by_vehicles_available.csv")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Great-circle (haversine) distances between points given in decimal degrees.
+
+Also estimates walking distance and time from straight-line distances.
+"""
+
+from math import asin, cos, radians, sin, sqrt
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+WALK_SPEED_MPS = 1.25
+# Straight-line distances are stretched by this factor to approximate the street network
+WALK_DETOUR_FACTOR = 1.3
+
+# Rows per block when a distance matrix is computed in chunks
+DEFAULT_CHUNK_ROWS = 1024
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate the great circle distance between two points
+    on the earth (specified in decimal degrees)
+    Returns distance in kilometers
+    """
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    return c * EARTH_RADIUS_KM
+
+
+def _radians(values, dtype) -> np.ndarray:
+    return np.radians(np.asarray(values, dtype=dtype))
+
+
+def _haversine(lat1, lon1, cos_lat1, lat2, lon2, cos_lat2) -> np.ndarray:
+    """Haversine kernel on broadcastable arrays of radians, returning km."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2
+    # Scalar inputs give a NumPy scalar, which cannot be written to in place
+    a = np.asarray(a)
+    np.clip(a, 0, 1, out=a)
+    return (2 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(a, out=a), out=a)
+
+
+def haversine_one_to_many(lat: float, lon: float, lats, lons, dtype=np.float64) -> np.ndarray:
+    """Distances in km from one point to each of *lats*/*lons*, shape (n,)."""
+    lat = _radians(lat, dtype)
+    lon = _radians(lon, dtype)
+    lats = _radians(lats, dtype)
+    lons = _radians(lons, dtype)
+    return _haversine(lat, lon, np.cos(lat), lats, lons, np.cos(lats))
+
+
+def haversine_pairwise(lats1, lons1, lats2, lons2, dtype=np.float64) -> np.ndarray:
+    """Distances in km between matching points of two equal-length sets, shape (n,)."""
+    lats1, lons1 = _radians(lats1, dtype), _radians(lons1, dtype)
+    lats2, lons2 = _radians(lats2, dtype), _radians(lons2, dtype)
+    return _haversine(lats1, lons1, np.cos(lats1), lats2, lons2, np.cos(lats2))
+
+
+def iter_haversine_chunks(
+    lats1, lons1, lats2, lons2, dtype=np.float64, chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield ``(start, block)`` where *block* holds distances for rows ``start:start + len(block)``.
+
+    Use this when the full (n, m) matrix does not fit in memory, e.g. to reduce
+    each block to a nearest distance or a count within a radius.
+    """
+    lats1, lons1 = _radians(lats1, dtype), _radians(lons1, dtype)
+    lats2, lons2 = _radians(lats2, dtype), _radians(lons2, dtype)
+    cos1, cos2 = np.cos(lats1)[:, np.newaxis], np.cos(lats2)[np.newaxis, :]
+    for start in range(0, len(lats1), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        yield start, _haversine(
+            lats1[rows, np.newaxis],
+            lons1[rows, np.newaxis],
+            cos1[rows],
+            lats2[np.newaxis, :],
+            lons2[np.newaxis, :],
+            cos2,
+        )
+
+
+def haversine_matrix(
+    lats1, lons1, lats2, lons2, dtype=np.float64, chunk_rows: Optional[int] = None
+) -> np.ndarray:
+    """Distances in km between every point in set 1 and every point in set 2, shape (n, m).
+
+    With *chunk_rows*, the matrix is filled a block of rows at a time so the
+    temporaries stay at ``chunk_rows * m`` elements instead of ``n * m``.
+    """
+    if chunk_rows is None:
+        chunk_rows = max(len(np.atleast_1d(lats1)), 1)
+    out = np.empty((len(np.atleast_1d(lats1)), len(np.atleast_1d(lats2))), dtype=dtype)
+    for start, block in iter_haversine_chunks(lats1, lons1, lats2, lons2, dtype, chunk_rows):
+        out[start : start + len(block)] = block
+    return out
+
+
+def walk_meters(km: np.ndarray) -> np.ndarray:
+    """Estimated walking distance for straight-line distances in km."""
+    return km * 1000 * WALK_DETOUR_FACTOR
+
+
+def walk_seconds(meters: np.ndarray) -> np.ndarray:
+    """Walking time in whole seconds for walking distances in meters."""
+    return np.ceil(meters / WALK_SPEED_MPS).astype(np.int32)
+
+
+def walk_links(
+    lats1, lons1, lats2, lons2, max_walk_m: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Walkable pairs between two point sets as a compressed adjacency list.
+
+    Returns ``(offsets, targets, meters)``: the points of set 2 within
+    *max_walk_m* of point ``i`` of set 1 are ``targets[offsets[i]:offsets[i + 1]]``,
+    with estimated walking distances in ``meters``.
+    """
+    counts, targets, meters = [], [], []
+    for _, block in iter_haversine_chunks(lats1, lons1, lats2, lons2):
+        block = walk_meters(block)
+        rows, cols = np.nonzero(block <= max_walk_m)
+        counts.append(np.bincount(rows, minlength=len(block)))
+        targets.append(cols)
+        meters.append(block[rows, cols])
+    if not counts:
+        return np.zeros(1, dtype=np.int64), np.empty(0, np.int32), np.empty(0, np.float32)
+    offsets = np.concatenate([[0], np.cumsum(np.concatenate(counts))])
+    return (
+        offsets,
+        np.concatenate(targets).astype(np.int32),
+        np.concatenate(meters).astype(np.float32),
+    )
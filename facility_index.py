@@ -0,0 +1,110 @@
+"""In-memory facility lookup for nearest-facility queries."""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from distance import haversine_one_to_many
+
+
+class FacilityIndex:
+    """Facility coordinates held as arrays for k-nearest and radius queries.
+
+    This is not a tree: every query is a vectorized brute-force scan computing
+    exact great-circle (haversine) distances to each candidate row. Rows are
+    grouped by Program Type up front, so a filtered query only scans the
+    matching rows. A scan of a few thousand facilities takes well under a
+    millisecond; the cost grows linearly with the number of facilities.
+    """
+
+    def __init__(self, facilities: pd.DataFrame):
+        valid = facilities["lat"].notna() & facilities["lon"].notna()
+        self.facilities = facilities
+        self._rows = np.flatnonzero(valid.to_numpy())
+        located = facilities.iloc[self._rows]
+        self._lat = located["lat"].to_numpy(dtype=np.float64)
+        self._lon = located["lon"].to_numpy(dtype=np.float64)
+        self._type_positions = {}
+        if "Program Type" in facilities.columns:
+            codes, types = pd.factorize(located["Program Type"])
+            self._type_positions = {
+                program_type: np.flatnonzero(codes == i) for i, program_type in enumerate(types)
+            }
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _candidates(self, program_types: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        if not program_types:
+            return None
+        positions = [
+            self._type_positions[t] for t in program_types if t in self._type_positions
+        ]
+        if not positions:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(positions))
+
+    def _distances(self, lat: float, lon: float, candidates: Optional[np.ndarray]):
+        if candidates is None:
+            return haversine_one_to_many(lat, lon, self._lat, self._lon)
+        return haversine_one_to_many(lat, lon, self._lat[candidates], self._lon[candidates])
+
+    def _result(self, rows: np.ndarray, distances: np.ndarray) -> pd.DataFrame:
+        result = self.facilities.take(rows)
+        result["distance_km"] = distances
+        return result
+
+    def nearest_rows(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        program_types: Optional[Iterable[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positional rows and distances (km) of the *k* facilities closest to (lat, lon)."""
+        candidates = self._candidates(program_types)
+        distances = self._distances(lat, lon, candidates)
+        k = max(min(k, len(distances)), 0)
+        if k < len(distances):
+            top = np.argpartition(distances, k - 1)[:k] if k else np.empty(0, dtype=np.intp)
+            top = top[np.lexsort((top, distances[top]))]
+        else:
+            top = np.argsort(distances, kind="stable")
+        positions = top if candidates is None else candidates[top]
+        return self._rows[positions], distances[top]
+
+    def within_rows(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        program_types: Optional[Iterable[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positional rows and distances (km) of facilities within *radius_km*, nearest first."""
+        candidates = self._candidates(program_types)
+        distances = self._distances(lat, lon, candidates)
+        hits = np.flatnonzero(distances <= radius_km)
+        hits = hits[np.argsort(distances[hits], kind="stable")]
+        positions = hits if candidates is None else candidates[hits]
+        return self._rows[positions], distances[hits]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        program_types: Optional[Iterable[str]] = None,
+    ) -> pd.DataFrame:
+        """Return the *k* facilities closest to (lat, lon), nearest first, with ``distance_km``."""
+        return self._result(*self.nearest_rows(lat, lon, k, program_types))
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        program_types: Optional[Iterable[str]] = None,
+    ) -> pd.DataFrame:
+        """Return every facility within *radius_km* of (lat, lon), nearest first."""
+        return self._result(*self.within_rows(lat, lon, radius_km, program_types))
@@ -0,0 +1,102 @@
+"""Precomputed walks between each facility and its nearby transit stops.
+
+The table is built offline from a GTFS feed's stops and the facilities file,
+one row per (facility, stop) pair within walking distance. The transit tool
+uses it to flag facilities whose last-mile walk is too long, before spending
+a route request on them.
+"""
+
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from distance import walk_links, walk_seconds
+from utils import file_hash
+
+FACILITY_STOPS_METADATA_KEY = b"facility_stops"
+DEFAULT_MAX_STOP_WALK_M = 1200
+
+
+def build_facility_stops(
+    facilities: pd.DataFrame,
+    stops: pd.DataFrame,
+    max_walk_m: float = DEFAULT_MAX_STOP_WALK_M,
+) -> pd.DataFrame:
+    """Stops within *max_walk_m* of each facility, nearest first.
+
+    Returns one row per pair with ``facility`` (the facility's row position),
+    ``stop_id``, ``walk_m`` and ``walk_s``. Facilities without coordinates or
+    without a stop in range have no rows.
+    """
+    offsets, targets, meters = walk_links(
+        facilities["lat"].to_numpy(dtype=float),
+        facilities["lon"].to_numpy(dtype=float),
+        stops["stop_lat"].to_numpy(dtype=float),
+        stops["stop_lon"].to_numpy(dtype=float),
+        max_walk_m,
+    )
+    table = pd.DataFrame(
+        {
+            "facility": np.repeat(np.arange(len(facilities)), np.diff(offsets)).astype(np.int32),
+            "stop_id": pd.Categorical(stops["stop_id"].to_numpy()[targets]),
+            "walk_m": meters.astype(np.float32),
+            "walk_s": walk_seconds(meters),
+        }
+    )
+    return table.sort_values(["facility", "walk_m"], kind="stable", ignore_index=True)
+
+
+def write_facility_stops(table: pd.DataFrame, path: str, metadata: Optional[dict] = None):
+    """Write the facility-stop table to *path* as Parquet, atomically."""
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    arrow = arrow.replace_schema_metadata(
+        {
+            **(arrow.schema.metadata or {}),
+            FACILITY_STOPS_METADATA_KEY: json.dumps(metadata or {}).encode(),
+        }
+    )
+    tmp_path = f"{path}.tmp"
+    pq.write_table(arrow, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def read_facility_stops(path: str) -> Tuple[pd.DataFrame, dict]:
+    """Return the facility-stop table at *path* and the metadata it was written with."""
+    arrow = pq.read_table(path)
+    metadata = (arrow.schema.metadata or {}).get(FACILITY_STOPS_METADATA_KEY)
+    return arrow.to_pandas(), json.loads(metadata) if metadata else {}
+
+
+class FacilityStopIndex:
+    """Walk from each facility to its nearest transit stop, by facility row position.
+
+    Facilities with no stop in the table count as an infinite walk, so they are
+    never transit-reachable.
+    """
+
+    def __init__(self, table: pd.DataFrame, n_facilities: int, max_walk_m: float):
+        self.max_walk_m = max_walk_m
+        nearest = table.groupby("facility", sort=False)["walk_s"].min()
+        self._nearest_walk_s = np.full(n_facilities, np.inf)
+        self._nearest_walk_s[nearest.index.to_numpy()] = nearest.to_numpy()
+
+    @classmethod
+    def load(cls, path: str, facilities_path: str) -> Optional["FacilityStopIndex"]:
+        """Load the table at *path*, or None if it was built from another facilities file."""
+        table, metadata = read_facility_stops(path)
+        if metadata.get("facilities_hash") != file_hash(facilities_path):
+            return None
+        return cls(table, metadata["n_facilities"], metadata["max_walk_m"])
+
+    def nearest_walk_s(self, rows) -> np.ndarray:
+        """Seconds from each facility in *rows* to its nearest stop (inf if none)."""
+        return self._nearest_walk_s[np.asarray(rows)]
+
+    def reachable(self, rows, max_walk_s: float) -> np.ndarray:
+        """Whether each facility in *rows* has a stop within *max_walk_s* on foot."""
+        return self.nearest_walk_s(rows) <= max_walk_s
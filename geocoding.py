@@ -0,0 +1,450 @@
+"""Concurrent, rate-limited batch geocoding for uploaded address lists.
+
+BatchGeocoder geocodes from a thread pool through googlemaps; the async
+functions send the same requests on an AsyncMapsClient, sharing its session
+with route requests.
+"""
+
+import asyncio
+import contextlib
+import functools
+import random
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Optional, Sequence, Tuple
+
+import aiohttp
+import googlemaps
+import pandas as pd
+import requests
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
+
+from cache import MISSING, PersistentCache
+from maps_client import AsyncMapsClient, pooled_session, run_with_maps_client
+
+LatLon = Tuple[float, float]
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_QUERIES_PER_SECOND = 40.0
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_SECONDS = 0.5
+
+DEFAULT_CACHE_PATH = "data/geocode_cache.sqlite"
+DEFAULT_CACHE_TTL_SECONDS = 90 * 24 * 3600
+DEFAULT_NEGATIVE_CACHE_TTL_SECONDS = 24 * 3600
+
+# Geocoding API statuses worth retrying; anything else is a permanent failure
+_RETRYABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+
+
+def clean_text(value) -> Optional[str]:
+    """Normalize free-form text used in address matching."""
+    if pd.isna(value):
+        return None
+
+    text = unicodedata.normalize("NFKC", str(value))
+    text = re.sub(r"\s+", " ", text).strip()
+
+    return text if text else None
+
+
+def clean_text_column(values: pd.Series) -> pd.Series:
+    """Vectorized ``clean_text``: normalized strings, with NA for missing or blank values."""
+    present = values.notna()
+    cleaned = (
+        values[present]
+        .astype(str)
+        .str.normalize("NFKC")
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    cleaned = cleaned.reindex(values.index).astype(object)
+    return cleaned.where(cleaned.notna() & (cleaned != ""), None)
+
+
+_ADDRESS_KEY_COLUMNS = ("Address", "Address Line 2", "City", "Zip")
+
+
+def build_address_key(row: pd.Series) -> Optional[str]:
+    """Create a normalized key for grouping rows by address."""
+    parts = []
+    for col in _ADDRESS_KEY_COLUMNS:
+        if col in row:
+            value = clean_text(row[col])
+            if value:
+                parts.append(value.lower())
+    if parts:
+        return "|".join(parts)
+
+    lat = row.get("lat")
+    lon = row.get("lon")
+    if pd.notna(lat) and pd.notna(lon):
+        return f"{round(lat, 6)}_{round(lon, 6)}"
+
+    return None
+
+
+def build_address_keys(df: pd.DataFrame) -> pd.Series:
+    """Vectorized ``build_address_key`` over every row of *df*."""
+    keys = pd.Series(None, index=df.index, dtype=object)
+    for col in _ADDRESS_KEY_COLUMNS:
+        if col not in df.columns:
+            continue
+        part = clean_text_column(df[col]).str.lower()
+        joined = keys + "|" + part
+        keys = joined.where(keys.notna() & part.notna(), keys.where(keys.notna(), part))
+
+    if {"lat", "lon"}.issubset(df.columns):
+        has_coords = keys.isna() & df["lat"].notna() & df["lon"].notna()
+        coords = df.loc[has_coords, ["lat", "lon"]].astype(float).round(6).astype(str)
+        keys[has_coords] = coords["lat"] + "_" + coords["lon"]
+    return keys
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing *rate* acquisitions per second on average."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Block until a token is available, then take it."""
+        while wait := self._take():
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Wait without blocking the event loop until a token is available, then take it."""
+        while wait := self._take():
+            await asyncio.sleep(wait)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (Timeout, TransportError, HTTPError)):
+        return True
+    return isinstance(exc, ApiError) and exc.status in _RETRYABLE_STATUSES
+
+
+class GeocodeCache:
+    """Persistent geocode results keyed by a normalized address string.
+
+    Addresses the API could not find are cached as None with a shorter TTL, so
+    a typo is not re-sent every upload but a newly built address is picked up.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_CACHE_TTL_SECONDS,
+        negative_ttl: float = DEFAULT_NEGATIVE_CACHE_TTL_SECONDS,
+    ):
+        self.store = PersistentCache(path, namespace="geocode")
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def get(self, key: str):
+        """Return (lat, lon), None for a cached failure, or MISSING."""
+        value = self.store.get(key)
+        if value is MISSING or value is None:
+            return value
+        return tuple(value)
+
+    def set(self, key: str, location: Optional[LatLon]) -> None:
+        if location is None:
+            self.store.set(key, None, self.negative_ttl)
+        else:
+            self.store.set(key, list(location), self.ttl)
+
+    @property
+    def hits(self) -> int:
+        return self.store.hits
+
+    @property
+    def misses(self) -> int:
+        return self.store.misses
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+@functools.lru_cache(maxsize=None)
+def get_geocode_cache(path: str = DEFAULT_CACHE_PATH) -> GeocodeCache:
+    """Return the process-wide geocode cache stored at *path*."""
+    return GeocodeCache(path)
+
+
+@functools.lru_cache(maxsize=1)
+def _geocoding_session() -> requests.Session:
+    # No urllib3 retries: googlemaps already retries 5xx responses itself
+    return pooled_session()
+
+
+def make_maps_client(api_key: str, **kwargs) -> googlemaps.Client:
+    """Create a googlemaps client that leaves quota retries to BatchGeocoder.
+
+    Requests go through a shared pooled session that does not retry on its
+    own, so a failing address is retried by googlemaps (5xx, within
+    *retry_timeout*) and then by BatchGeocoder, not by the transport as well.
+    """
+    kwargs.setdefault("requests_session", _geocoding_session())
+    kwargs.setdefault("queries_per_second", 1000)
+    kwargs.setdefault("retry_over_query_limit", False)
+    kwargs.setdefault("retry_timeout", 10)
+    return googlemaps.Client(key=api_key, **kwargs)
+
+
+def _split_cached(keys, cache: Optional[GeocodeCache]) -> Tuple[list, list]:
+    """Cached results for *keys* (None where missing) and the positions still to geocode."""
+    results: list = [None] * len(keys)
+    pending = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache is not None and key else MISSING
+        if cached is MISSING:
+            pending.append(i)
+        else:
+            results[i] = cached
+    return results, pending
+
+
+class BatchGeocoder:
+    """Geocode many addresses with a bounded worker pool and a shared rate limit.
+
+    Quota and transient errors are retried with jittered exponential backoff.
+    Addresses that fail permanently, or still fail after the last retry, map to None.
+    """
+
+    def __init__(
+        self,
+        client: googlemaps.Client,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        queries_per_second: float = DEFAULT_QUERIES_PER_SECOND,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+        cache: Optional[GeocodeCache] = None,
+    ):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.rate_limiter = TokenBucket(queries_per_second)
+        self.cache = cache
+
+    def _lookup(self, address: str) -> Tuple[Optional[LatLon], bool]:
+        """Geocode *address*; the flag is True when the outcome can be cached."""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                result = self.client.geocode(address)
+            except Exception as exc:
+                if not _is_retryable(exc) or attempt == self.max_retries:
+                    # Errors such as REQUEST_DENIED say nothing about the address
+                    return None, False
+                delay = self.backoff_seconds * 2**attempt
+                time.sleep(delay * (random.random() + 0.5))
+                continue
+            if result:
+                location = result[0]["geometry"]["location"]
+                return (location["lat"], location["lng"]), True
+            return None, True
+        return None, False
+
+    def geocode_one(self, address: str) -> Optional[LatLon]:
+        """Geocode a single address, returning (lat, lon) or None."""
+        return self._lookup(address)[0]
+
+    def geocode(
+        self,
+        addresses: Sequence[str],
+        progress: Optional[Callable[[int, int], None]] = None,
+        keys: Optional[Sequence[Optional[str]]] = None,
+    ) -> list:
+        """Geocode *addresses* concurrently, preserving input order.
+
+        *keys* are the normalized cache keys for each address (None skips the
+        cache for that address). *progress* is called as ``progress(done, total)``
+        from the calling thread each time an address finishes.
+        """
+        total = len(addresses)
+        if keys is None:
+            keys = [None] * total
+
+        results, pending = _split_cached(keys, self.cache)
+        done = total - len(pending)
+        if done and progress is not None:
+            progress(done, total)
+        if not pending:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as pool:
+            futures = {pool.submit(self._lookup, addresses[i]): i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                location, definitive = future.result()
+                results[i] = location
+                if self.cache is not None and keys[i] and definitive:
+                    self.cache.set(keys[i], location)
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        return results
+
+
+@functools.lru_cache(maxsize=1)
+def _async_rate_limiter() -> TokenBucket:
+    # One limit for every async batch, since they all share one client
+    return TokenBucket(DEFAULT_QUERIES_PER_SECOND)
+
+
+async def geocode_address_async(
+    client: AsyncMapsClient,
+    address: str,
+    rate_limiter: Optional[TokenBucket] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+) -> Tuple[Optional[LatLon], bool]:
+    """Geocode *address* on an open AsyncMapsClient.
+
+    Same contract as ``BatchGeocoder._lookup``: returns the location (or None)
+    and whether the outcome can be cached. Every attempt takes a token from
+    *rate_limiter* (default: the limiter shared by all async batches). Quota
+    statuses are retried here; HTTP-level retries are left to the client.
+    """
+    rate_limiter = rate_limiter or _async_rate_limiter()
+    for attempt in range(max_retries + 1):
+        await rate_limiter.acquire_async()
+        try:
+            response = await client.get(GEOCODE_URL, params={"address": address})
+            response.raise_for_status()
+            data = response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None, False
+        status = data.get("status")
+        if status == "OK" and data.get("results"):
+            location = data["results"][0]["geometry"]["location"]
+            return (location["lat"], location["lng"]), True
+        if status == "ZERO_RESULTS":
+            return None, True
+        if status not in _RETRYABLE_STATUSES or attempt == max_retries:
+            return None, False
+        delay = backoff_seconds * 2**attempt
+        await asyncio.sleep(delay * (random.random() + 0.5))
+    return None, False
+
+
+async def iter_geocodes_async(
+    client: AsyncMapsClient,
+    addresses: Sequence[str],
+    rate_limiter: Optional[TokenBucket] = None,
+) -> AsyncIterator[Tuple[int, Optional[LatLon], bool]]:
+    """Geocode *addresses* on *client*, yielding ``(index, location, cacheable)`` as each finishes.
+
+    Closing the iterator early cancels the lookups still in flight.
+    """
+
+    async def lookup(i):
+        return (i, *await geocode_address_async(client, addresses[i], rate_limiter))
+
+    tasks = [asyncio.ensure_future(lookup(i)) for i in range(len(addresses))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def geocode_addresses_async(
+    client: AsyncMapsClient,
+    addresses: Sequence[str],
+    keys: Optional[Sequence[Optional[str]]] = None,
+    cache: Optional[GeocodeCache] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    rate_limiter: Optional[TokenBucket] = None,
+) -> list:
+    """Async counterpart of ``BatchGeocoder.geocode`` on an open AsyncMapsClient.
+
+    The client's concurrency limit bounds the fan-out and *rate_limiter* the
+    request rate. Cache handling and the *keys* and *progress* arguments work
+    as in BatchGeocoder.
+    """
+    total = len(addresses)
+    if keys is None:
+        keys = [None] * total
+    results, pending = _split_cached(keys, cache)
+    done = total - len(pending)
+    if done and progress is not None:
+        progress(done, total)
+
+    lookups = iter_geocodes_async(client, [addresses[i] for i in pending], rate_limiter)
+    async with contextlib.aclosing(lookups):
+        async for j, location, cacheable in lookups:
+            i = pending[j]
+            results[i] = location
+            if cache is not None and keys[i] and cacheable:
+                cache.set(keys[i], location)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+    return results
+
+
+def geocode_addresses(
+    addresses: Sequence[str],
+    keys: Optional[Sequence[Optional[str]]] = None,
+    cache: Optional[GeocodeCache] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    api_key: Optional[str] = None,
+) -> list:
+    """Blocking wrapper around the async geocoder, on the shared AsyncMapsClient.
+
+    Requests go through the process-wide client for *api_key* (default:
+    ``MAPS_API_KEY``), so batches reuse one session and its connections, and
+    share one rate limit. Cache writes and *progress* calls happen in the
+    calling thread.
+    """
+    total = len(addresses)
+    if keys is None:
+        keys = [None] * total
+    results, pending = _split_cached(keys, cache)
+    done = total - len(pending)
+    if done and progress is not None:
+        progress(done, total)
+    if not pending:
+        return results
+
+    lookups = run_with_maps_client(
+        lambda client: iter_geocodes_async(client, [addresses[i] for i in pending]),
+        api_key=api_key,
+    )
+    with contextlib.closing(lookups):
+        for j, location, cacheable in lookups:
+            i = pending[j]
+            results[i] = location
+            if cache is not None and keys[i] and cacheable:
+                cache.set(keys[i], location)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+    return results
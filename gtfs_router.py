@@ -0,0 +1,422 @@
+"""Offline transit routing over a GTFS feed with the Connection Scan Algorithm.
+
+The feed is loaded once into flat arrays: every hop of every trip becomes a
+"connection" (departure stop and time, arrival stop and time), and walking
+transfers between nearby stops are stored as a compressed adjacency list.
+An earliest-arrival query is then a single scan over the day's connections in
+departure order, so no Routes API call is needed.
+
+Times are seconds after midnight of the service day. Trips that run past
+midnight are only seen on the day they start, and stops without a scheduled
+time are skipped rather than interpolated.
+"""
+
+import os
+import threading
+import zipfile
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from distance import (
+    haversine_one_to_many,
+    haversine_pairwise,
+    walk_links,
+    walk_meters,
+    walk_seconds,
+)
+from route_model import RouteLeg, RouteStep
+from transit import NoRoutesFound
+
+DEFAULT_MAX_WALK_M = 800
+DEFAULT_MAX_TRANSFER_M = 400
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_CACHED_DAYS = 8
+
+_INF = 1 << 40
+_ORIGIN, _WALK, _RIDE = 0, 1, 2
+
+
+def _read_table(path: str, name: str, required: bool = True) -> Optional[pd.DataFrame]:
+    """Read ``<name>.txt`` from a GTFS directory or zip file, all columns as strings."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as feed:
+            if f"{name}.txt" not in feed.namelist():
+                table = None
+            else:
+                with feed.open(f"{name}.txt") as f:
+                    table = pd.read_csv(f, dtype=str, keep_default_na=False)
+    else:
+        file_path = os.path.join(path, f"{name}.txt")
+        table = (
+            pd.read_csv(file_path, dtype=str, keep_default_na=False)
+            if os.path.exists(file_path)
+            else None
+        )
+    if table is None and required:
+        raise FileNotFoundError(f"GTFS feed {path} has no {name}.txt")
+    if table is not None:
+        table.columns = table.columns.str.strip()
+    return table
+
+
+def read_stops(path: str) -> pd.DataFrame:
+    """Boardable stops from a GTFS feed: stop_id, stop_name, stop_lat and stop_lon."""
+    stops = _read_table(path, "stops")
+    if "location_type" in stops:
+        # Stations, entrances and other location types are not boarded directly
+        stops = stops[stops["location_type"].isin(["", "0"])]
+    if "stop_name" not in stops:
+        stops = stops.assign(stop_name=stops["stop_id"])
+    return pd.DataFrame(
+        {
+            "stop_id": stops["stop_id"].to_numpy(),
+            "stop_name": stops["stop_name"].to_numpy(),
+            "stop_lat": pd.to_numeric(stops["stop_lat"]).to_numpy(dtype=np.float64),
+            "stop_lon": pd.to_numeric(stops["stop_lon"]).to_numpy(dtype=np.float64),
+        }
+    )
+
+
+def _seconds(times: pd.Series) -> np.ndarray:
+    """'HH:MM:SS' GTFS times (hours may exceed 23) to seconds; blanks become -1."""
+    parts = times.str.strip().str.split(":", expand=True)
+    if parts.shape[1] < 3:
+        return np.full(len(times), -1, dtype=np.int32)
+    numbers = parts.iloc[:, :3].apply(pd.to_numeric, errors="coerce")
+    seconds = numbers[0] * 3600 + numbers[1] * 60 + numbers[2]
+    return seconds.fillna(-1).to_numpy(dtype=np.int32)
+
+
+def _time_string(day: date, seconds: int) -> str:
+    # Timetable times are local to the agency, so no UTC "Z" or offset is claimed
+    moment = datetime.combine(day, datetime.min.time()) + timedelta(seconds=int(seconds))
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class GTFSRouter:
+    """Earliest-arrival transit routing over one GTFS feed.
+
+    Implements the routing backend interface of ``transit.get_transit_routes``:
+    ``routes()`` returns the same RouteLeg/RouteStep model parsed from the
+    Routes API, so route metrics and directions work unchanged. Walking to and
+    from stops is limited to *max_walk_m* and transfers between stops to
+    *max_transfer_m*, both measured along straight lines stretched by
+    ``WALK_DETOUR_FACTOR``.
+    """
+
+    def __init__(
+        self,
+        stops: pd.DataFrame,
+        routes: pd.DataFrame,
+        trips: pd.DataFrame,
+        stop_times: pd.DataFrame,
+        calendar: Optional[pd.DataFrame] = None,
+        calendar_dates: Optional[pd.DataFrame] = None,
+        max_walk_m: float = DEFAULT_MAX_WALK_M,
+        max_transfer_m: float = DEFAULT_MAX_TRANSFER_M,
+    ):
+        self.max_walk_m = max_walk_m
+        stop_ids = pd.Index(stops["stop_id"])
+        names = stops["stop_name"] if "stop_name" in stops else stops["stop_id"]
+        self.stop_names = names.tolist()
+        self._stop_lat = pd.to_numeric(stops["stop_lat"]).to_numpy(dtype=np.float64)
+        self._stop_lon = pd.to_numeric(stops["stop_lon"]).to_numpy(dtype=np.float64)
+
+        # Trips: line name, headsign and service calendar, by trip code
+        trips = trips.reset_index(drop=True)
+        routes = routes.set_index("route_id")
+        names = pd.Series("", index=routes.index)
+        # Short names ("7") are preferred; long names fill in where a route has none
+        for column in ("route_long_name", "route_short_name"):
+            if column in routes:
+                names = routes[column].where(routes[column] != "", names)
+        self.trip_lines = trips["route_id"].map(names).fillna("").tolist()
+        self.trip_headsigns = (
+            trips["trip_headsign"].tolist() if "trip_headsign" in trips else [""] * len(trips)
+        )
+        service_codes, self._service_ids = pd.factorize(trips["service_id"])
+        self._trip_service = service_codes.astype(np.int32)
+        self._calendar = calendar
+        self._calendar_dates = calendar_dates
+
+        # Connections in trip order: one per consecutive pair of timed stops
+        timed = stop_times.assign(
+            _arrival=_seconds(stop_times["arrival_time"]),
+            _departure=_seconds(stop_times["departure_time"]),
+            _trip=pd.Index(trips["trip_id"]).get_indexer(stop_times["trip_id"]),
+            _stop=stop_ids.get_indexer(stop_times["stop_id"]),
+            _sequence=pd.to_numeric(stop_times["stop_sequence"]),
+        )
+        timed = timed[
+            (timed["_trip"] >= 0) & (timed["_stop"] >= 0) & (timed["_departure"] >= 0)
+        ].sort_values(["_trip", "_sequence"], kind="stable")
+        trip = timed["_trip"].to_numpy(dtype=np.int32)
+        stop = timed["_stop"].to_numpy(dtype=np.int32)
+        arrival = np.where(timed["_arrival"] >= 0, timed["_arrival"], timed["_departure"])
+        departure = timed["_departure"].to_numpy(dtype=np.int32)
+        hop = trip[:-1] == trip[1:]
+        self._trip = trip[:-1][hop]
+        self._dep_stop = stop[:-1][hop]
+        self._arr_stop = stop[1:][hop]
+        self._dep_time = departure[:-1][hop]
+        self._arr_time = arrival[1:][hop].astype(np.int32)
+        hop_km = haversine_pairwise(
+            self._stop_lat[self._dep_stop],
+            self._stop_lon[self._dep_stop],
+            self._stop_lat[self._arr_stop],
+            self._stop_lon[self._arr_stop],
+        )
+        # Cumulative ride distance, so a ride's length is a difference of two entries
+        self._cumulative_m = np.concatenate([[0.0], np.cumsum(hop_km * 1000)])
+        self._by_departure = np.argsort(self._dep_time, kind="stable")
+
+        offsets, targets, meters = walk_links(
+            self._stop_lat, self._stop_lon, self._stop_lat, self._stop_lon, max_transfer_m
+        )
+        self._transfers = (offsets, targets, walk_seconds(meters))
+        self._days: "OrderedDict[date, tuple]" = OrderedDict()
+        self._days_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "GTFSRouter":
+        """Load a GTFS feed from a directory or zip file."""
+        return cls(
+            _read_table(path, "stops"),
+            _read_table(path, "routes"),
+            _read_table(path, "trips"),
+            _read_table(path, "stop_times"),
+            _read_table(path, "calendar", required=False),
+            _read_table(path, "calendar_dates", required=False),
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        """Number of connections in the feed."""
+        return len(self._trip)
+
+    def _active_services(self, day: date) -> np.ndarray:
+        active = np.ones(len(self._service_ids), dtype=bool)
+        stamp = day.strftime("%Y%m%d")
+        if self._calendar is not None:
+            calendar = self._calendar.set_index("service_id").reindex(self._service_ids)
+            runs = (
+                (calendar[_WEEKDAYS[day.weekday()]] == "1")
+                & (calendar["start_date"] <= stamp)
+                & (calendar["end_date"] >= stamp)
+            )
+            active = runs.to_numpy(dtype=bool, copy=True)
+        if self._calendar_dates is not None:
+            exceptions = self._calendar_dates[self._calendar_dates["date"] == stamp]
+            for service_id, exception_type in zip(
+                exceptions["service_id"], exceptions["exception_type"]
+            ):
+                code = self._service_ids.get_indexer([service_id])[0]
+                if code >= 0:
+                    active[code] = exception_type == "1"
+        return active
+
+    def _day(self, day: date) -> tuple:
+        """The day's running connections in departure order, as lists for a fast scan.
+
+        The router is shared across Streamlit sessions, so the day cache is
+        only touched under a lock. Two threads missing the same day may both
+        build it; the result is the same either way.
+        """
+        with self._days_lock:
+            if day in self._days:
+                self._days.move_to_end(day)
+                return self._days[day]
+        order = self._by_departure
+        order = order[self._active_services(day)[self._trip_service[self._trip[order]]]]
+        connections = (
+            order.tolist(),
+            self._dep_time[order].tolist(),
+            self._arr_time[order].tolist(),
+            self._dep_stop[order].tolist(),
+            self._arr_stop[order].tolist(),
+            self._trip[order].tolist(),
+        )
+        with self._days_lock:
+            self._days[day] = connections
+            if len(self._days) > _CACHED_DAYS:
+                self._days.popitem(last=False)
+        return connections
+
+    def _nearby_stops(self, lat: float, lon: float) -> Dict[int, int]:
+        meters = walk_meters(haversine_one_to_many(lat, lon, self._stop_lat, self._stop_lon))
+        stops = np.flatnonzero(meters <= self.max_walk_m)
+        return dict(zip(stops.tolist(), walk_seconds(meters[stops]).tolist()))
+
+    def _scan(self, day: date, start: int, access: Dict[int, int], egress: Dict[int, int]):
+        """Connection Scan from *start*; returns (arrival at destination, last stop, trace)."""
+        positions, dep_time, arr_time, dep_stop, arr_stop, trip = self._day(day)
+        offsets, targets, seconds = self._transfers
+        arrival = [_INF] * len(self.stop_names)
+        # How each stop was reached: (_ORIGIN,), (_WALK, from_stop) or (_RIDE, board, alight)
+        reached = [None] * len(self.stop_names)
+        boarded = {}
+        best, best_stop = _INF, -1
+
+        for stop, walk in access.items():
+            arrival[stop] = start + walk
+            reached[stop] = (_ORIGIN,)
+            if stop in egress and start + walk + egress[stop] < best:
+                best, best_stop = start + walk + egress[stop], stop
+
+        for c in range(bisect_left(dep_time, start), len(dep_time)):
+            if dep_time[c] >= best:
+                break
+            t = trip[c]
+            if t not in boarded:
+                if arrival[dep_stop[c]] > dep_time[c]:
+                    continue
+                boarded[t] = c
+            stop = arr_stop[c]
+            if arr_time[c] >= arrival[stop]:
+                continue
+            arrival[stop] = arr_time[c]
+            reached[stop] = (_RIDE, boarded[t], c)
+            if stop in egress and arr_time[c] + egress[stop] < best:
+                best, best_stop = arr_time[c] + egress[stop], stop
+            for i in range(offsets[stop], offsets[stop + 1]):
+                to, walk = targets[i], arr_time[c] + seconds[i]
+                if walk < arrival[to]:
+                    arrival[to] = walk
+                    reached[to] = (_WALK, stop)
+                    if to in egress and walk + egress[to] < best:
+                        best, best_stop = walk + egress[to], to
+        return best, best_stop, (positions, dep_time, arr_time, dep_stop, trip, arrival, reached)
+
+    def routes(
+        self,
+        start_lat: float,
+        start_lng: float,
+        end_lat: float,
+        end_lng: float,
+        departure: datetime,
+        alternative_routes: bool = False,
+    ) -> List[RouteLeg]:
+        """Earliest-arrival route departing at *departure*, as a single leg.
+
+        Only the fastest route is returned; *alternative_routes* is accepted for
+        interface compatibility. Raises NoRoutesFound when the destination
+        cannot be reached by transit or on foot.
+        """
+        day = departure.date()
+        start = departure.hour * 3600 + departure.minute * 60 + departure.second
+        origin, destination = (start_lat, start_lng), (end_lat, end_lng)
+        access = self._nearby_stops(start_lat, start_lng)
+        egress = self._nearby_stops(end_lat, end_lng)
+        direct_m = walk_meters(haversine_one_to_many(start_lat, start_lng, [end_lat], [end_lng]))
+        direct_walk = int(walk_seconds(direct_m)[0])
+        walkable = direct_m[0] <= self.max_walk_m
+
+        best, best_stop, trace = self._scan(day, start, access, egress)
+        if best_stop < 0 or (walkable and start + direct_walk <= best):
+            if not walkable:
+                raise NoRoutesFound("No routes found")
+            steps = [self._walk_step(0, origin, destination, direct_walk, "Walk to destination")]
+            return [self._leg(steps, direct_walk, origin, destination)]
+
+        positions, dep_time, arr_time, dep_stop, trip, arrival, reached = trace
+        location = self._stop_location
+        backwards = [
+            self._walk_step(
+                0,
+                location(best_stop),
+                destination,
+                best - arrival[best_stop],
+                "Walk to destination",
+            )
+        ]
+        stop = best_stop
+        while reached[stop][0] != _ORIGIN:
+            how = reached[stop]
+            if how[0] == _WALK:
+                previous = how[1]
+                backwards.append(
+                    self._walk_step(
+                        0,
+                        location(previous),
+                        location(stop),
+                        arrival[stop] - arrival[previous],
+                        f"Walk to {self.stop_names[stop]}",
+                    )
+                )
+            else:
+                board, alight = how[1], how[2]
+                previous = dep_stop[board]
+                backwards.append(
+                    self._ride_step(
+                        day,
+                        trip[board],
+                        positions[board],
+                        positions[alight],
+                        dep_time[board],
+                        arr_time[alight],
+                    )
+                )
+            stop = previous
+        backwards.append(
+            self._walk_step(
+                0, origin, location(stop), arrival[stop] - start, f"Walk to {self.stop_names[stop]}"
+            )
+        )
+
+        steps = [step for step in reversed(backwards) if step.duration_s > 0 or step.is_transit]
+        for i, step in enumerate(steps):
+            step.step_index = i
+        return [self._leg(steps, best - start, origin, destination)]
+
+    def _stop_location(self, stop: int) -> Tuple[float, float]:
+        return float(self._stop_lat[stop]), float(self._stop_lon[stop])
+
+    @staticmethod
+    def _walk_step(index, start, end, duration_s, instructions) -> RouteStep:
+        km = haversine_one_to_many(start[0], start[1], [end[0]], [end[1]])[0]
+        return RouteStep(
+            step_index=index,
+            travel_mode="WALK",
+            distance_meters=int(round(walk_meters(km))),
+            duration_s=int(duration_s),
+            instructions=instructions,
+            start_location=start,
+            end_location=end,
+        )
+
+    def _ride_step(self, day, trip, board, alight, departure_s, arrival_s) -> RouteStep:
+        """A ride from connection *board* to *alight* (positions in trip order)."""
+        start, end = self._dep_stop[board], self._arr_stop[alight]
+        return RouteStep(
+            step_index=0,
+            travel_mode="TRANSIT",
+            distance_meters=int(round(self._cumulative_m[alight + 1] - self._cumulative_m[board])),
+            duration_s=int(arrival_s - departure_s),
+            start_location=self._stop_location(start),
+            end_location=self._stop_location(end),
+            line_name=self.trip_lines[trip],
+            departure_stop=self.stop_names[start],
+            arrival_stop=self.stop_names[end],
+            departure_time=_time_string(day, departure_s),
+            arrival_time=_time_string(day, arrival_s),
+            headsign=self.trip_headsigns[trip],
+            stop_count=int(alight - board + 1),
+        )
+
+    @staticmethod
+    def _leg(steps, duration_s, start, end) -> RouteLeg:
+        return RouteLeg(
+            route_index=0,
+            leg_index=0,
+            distance_meters=sum(step.distance_meters for step in steps),
+            duration_s=int(duration_s),
+            steps=steps,
+            start_location=start,
+            end_location=end,
+        )
@@ -1,12 +1,25 @@
+import itertools
 import json
-import re
-import unicodedata
 
 import geopandas as gpd
+import numpy as np
 import plotly.express as px
+import shapely
 import streamlit as st
 import pandas as pd
-import googlemaps
+
+from geocoding import (
+    BatchGeocoder,
+    build_address_key,
+    build_address_keys,
+    clean_text,
+    clean_text_column,
+    get_geocode_cache,
+    make_maps_client,
+)
+from uploads import UploadRegistry
+
+_clean_text = clean_text
 
 _CANONICAL_UPLOAD_COLUMNS = {
     "lat": "lat",
@@ -27,37 +40,17 @@ _CANONICAL_UPLOAD_COLUMNS = {
 }
 
 
-def _clean_text(value):
-    """Normalize free-form text used in address matching."""
-    if pd.isna(value):
-        return None
-
-    text = unicodedata.normalize("NFKC", str(value))
-    text = re.sub(r"\s+", " ", text).strip()
-
-    return text if text else None
-
-
-_ADDRESS_KEY_COLUMNS = ("Address", "Address Line 2", "City", "Zip")
-
-
-def build_address_key(row: pd.Series) -> str | None:
-    """Create a normalized key for grouping rows by address."""
-    parts = []
-    for col in _ADDRESS_KEY_COLUMNS:
-        if col in row:
-            value = _clean_text(row[col])
-            if value:
-                parts.append(value.lower())
-    if parts:
-        return "|".join(parts)
-
-    lat = row.get("lat")
-    lon = row.get("lon")
-    if pd.notna(lat) and pd.notna(lon):
-        return f"{round(lat, 6)}_{round(lon, 6)}"
-
-    return None
+def _format_coordinates(df: pd.DataFrame) -> pd.Series:
+    """Format lat/lon as ``(lat, lon)`` to four decimals, NA where either is missing."""
+    text = pd.Series(None, index=df.index, dtype=object)
+    if not {"lat", "lon"}.issubset(df.columns):
+        return text
+    has_coords = df["lat"].notna() & df["lon"].notna()
+    if has_coords.any():
+        lat = np.char.mod("%.4f", df.loc[has_coords, "lat"].to_numpy(dtype=float))
+        lon = np.char.mod("%.4f", df.loc[has_coords, "lon"].to_numpy(dtype=float))
+        text[has_coords] = np.char.add(np.char.add(np.char.add("(", lat), ", "), np.char.add(lon, ")"))
+    return text
 
 
 def _normalize_uploaded_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -82,89 +75,301 @@ def _normalize_uploaded_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-@st.cache_data
-def process_coordinates(uploaded_file):
+def upload_geocode_addresses(df: pd.DataFrame) -> pd.Series:
+    """Build the single-line address string sent to the geocoder for each upload row."""
+
+    def text(col):
+        return df[col].astype("string").fillna("")
+
+    addresses = text("Address") + " "
+    if "Address Line 2" in df.columns:
+        addresses += (text("Address Line 2") + " ").where(df["Address Line 2"].notnull(), "")
+    return (addresses + text("City") + ", NC " + text("Zip")).astype(object)
+
+
+UPLOAD_CHUNK_ROWS = 5000
+
+
+def _upload_progress(uploaded_file):
+    """Return a callable giving the fraction of *uploaded_file* read so far, or None."""
+    size = getattr(uploaded_file, "size", None)
+    if not size:
+        return lambda: None
+
+    def fraction():
+        try:
+            return min(uploaded_file.tell() / size, 1.0)
+        except (OSError, ValueError):
+            return None
+
+    return fraction
+
+
+def _iter_excel_chunks(uploaded_file, chunksize: int):
+    """Yield ``(chunk, fraction_read)`` from the first sheet of an xlsx workbook."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [
+            str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)
+        ]
+        total = (sheet.max_row or 0) - 1
+        read = 0
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row[: len(columns)])
+            if len(batch) == chunksize:
+                read += len(batch)
+                yield pd.DataFrame(batch, columns=columns), (read / total if total > 0 else None)
+                batch = []
+        if batch or not read:
+            read += len(batch)
+            yield pd.DataFrame(batch, columns=columns), 1.0
+    finally:
+        workbook.close()
+
+
+def iter_upload_chunks(uploaded_file, chunksize: int = UPLOAD_CHUNK_ROWS):
+    """Yield ``(chunk, fraction_read)`` pairs of at most *chunksize* raw upload rows.
+
+    CSV cells are read as text so a column is parsed the same way in every chunk;
+    *fraction_read* is None when the upload size is unknown.
+    """
+    if uploaded_file.name.endswith(".xlsx"):
+        yield from _iter_excel_chunks(uploaded_file, chunksize)
+        return
+    fraction = _upload_progress(uploaded_file)
+    for chunk in pd.read_csv(uploaded_file, chunksize=chunksize, dtype=str):
+        yield chunk, fraction()
+
+
+def _trim_upload_chunk(chunk: pd.DataFrame, columns) -> pd.DataFrame:
+    """Apply the normalized header to *chunk* and drop columns the map never uses."""
+    chunk.columns = columns
+    chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+    return chunk[[col for col in chunk.columns if col in _UPLOAD_COLUMNS]]
+
+
+def _geocode_upload_chunks(chunks, columns, progress=None) -> pd.DataFrame:
+    """Geocode the address rows of upload *chunks*, reporting through *progress*."""
+    report = progress or (lambda fraction, text: None)
+    cache = get_geocode_cache()
+    geocoder = BatchGeocoder(make_maps_client(st.secrets["MAPS_API_KEY"]), cache=cache)
+    report(0.0, "Geocoding addresses...")
+    hits_before = cache.hits
+
+    # Geocode each distinct address once across all chunks; rows without a key
+    # are geocoded individually
+    locations_by_key = {}
+    processed = []
+    rows = geocoded = 0
+    for chunk, fraction in chunks:
+        chunk = _trim_upload_chunk(chunk, columns).reset_index(drop=True)
+        keys = build_address_keys(chunk)
+        todo = (~keys.duplicated() & ~keys.isin(locations_by_key.keys())) | keys.isna()
+
+        def update_progress(done, total, fraction=fraction):
+            value = fraction if fraction is not None else 0.0
+            report(value, f"Geocoded {geocoded + done} addresses from {rows + total} rows")
+
+        results = geocoder.geocode(
+            upload_geocode_addresses(chunk[todo]).tolist(),
+            progress=update_progress,
+            keys=keys[todo].tolist(),
+        )
+        locations_by_key.update(
+            (key, loc) for key, loc in zip(keys[todo], results) if isinstance(key, str)
+        )
+        locations = pd.Series(results, index=chunk.index[todo], dtype=object)
+        locations = locations.reindex(chunk.index).where(keys.isna(), keys.map(locations_by_key))
+        chunk["lat"] = [loc[0] if loc else None for loc in locations]
+        chunk["lon"] = [loc[1] if loc else None for loc in locations]
+        processed.append(chunk)
+        rows += len(chunk)
+        geocoded += int(todo.sum())
+
+    df = pd.concat(processed, ignore_index=True)
+    df.attrs["geocode_summary"] = {
+        "geocoded": geocoded,
+        "duplicates": rows - geocoded,
+        "cache_hits": cache.hits - hits_before,
+    }
+    return df
+
+
+def process_coordinates(uploaded_file, chunksize: int = UPLOAD_CHUNK_ROWS, progress=None):
+    """Read an uploaded file into a frame of locations, geocoding address rows.
+
+    *progress*, if given, is called as ``progress(fraction, text)`` while
+    addresses are geocoded; the caller owns any progress UI. Geocoding counts
+    are left in ``df.attrs["geocode_summary"]``. The result is not cached here:
+    the upload registry skips unchanged uploads and geocodes persist in the
+    geocode cache.
+    """
     if uploaded_file is None:
         return None
-    if uploaded_file.name.endswith(".xlsx"):
-        df = pd.read_excel(uploaded_file)
-    else:
-        df = pd.read_csv(uploaded_file)
+    chunks = iter_upload_chunks(uploaded_file, chunksize)
+    first = next(chunks, None)
+    if first is None:
+        st.error("Uploaded file is empty.")
+        return None
 
     # Normalize column headers once so downstream lookups are reliable and case-insensitive
-    df = _normalize_uploaded_columns(df)
-    if "lat" in df.columns and "lon" in df.columns:
+    columns = _normalize_uploaded_columns(first[0].head(0)).columns
+    if "lat" in columns and "lon" in columns:
+        df = pd.concat(
+            [_trim_upload_chunk(chunk, columns) for chunk, _ in itertools.chain([first], chunks)],
+            ignore_index=True,
+        )
+        df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
+        df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
         # Add source filename to help identify which file data came from
         df["source_file"] = uploaded_file.name
         return df
-    with st.spinner("Geocoding addresses..."):
-        required_fields = {"Address", "City", "Zip"}
-        if required_fields.issubset(set(df.columns)):
-            maps_client = googlemaps.Client(key=st.secrets["MAPS_API_KEY"])
-
-            def geocode_row(row):
-                address = (
-                    f"{row['Address']} "
-                    + (
-                        f"{row['Address Line 2']} "
-                        if "Address Line 2" in row and pd.notnull(row["Address Line 2"])
-                        else ""
-                    )
-                    + f"{row['City']}, NC {row['Zip']}"
-                )
-                result = maps_client.geocode(address)
-                if result:
-                    location = result[0]["geometry"]["location"]
-                    return pd.Series([location["lat"], location["lng"]])
-                return pd.Series([None, None])
-
-            df[["lat", "lon"]] = df.apply(geocode_row, axis=1)
-
-            # If Program Type is missing, set default to "Client"
-            if "Program Type" not in df.columns:
-                df["Program Type"] = "Client"
-            df.loc[(df["Program Type"].str.len() == 0) | df["Program Type"].isnull(), "Program Type"] = "Client"
-            
-            # Add source filename to help identify which file data came from
-            df["source_file"] = uploaded_file.name
-            
-            return df
+    if not {"Address", "City", "Zip"}.issubset(set(columns)):
         st.error(
             "Uploaded file must contain either lat/lon columns or the required address fields."
         )
         return None
 
+    if first[0].empty:
+        # A header-only upload has no addresses to geocode
+        df = _trim_upload_chunk(first[0], columns).assign(lat=None, lon=None)
+    else:
+        df = _geocode_upload_chunks(itertools.chain([first], chunks), columns, progress)
+    df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
+    df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
+
+    # If Program Type is missing, set default to "Client"
+    if "Program Type" not in df.columns:
+        df["Program Type"] = "Client"
+    df.loc[(df["Program Type"].str.len() == 0) | df["Program Type"].isnull(), "Program Type"] = "Client"
 
-def map_hovertext(row):
-    # Main header with tract and county
-    s = f"<b>Census Tract {row['tract']}</b><br>"
-    s += f"<i>{row['County']}</i><br>"
-    s += "-------------------<br>"  # Simple text separator instead of hr tag
+    # Add source filename to help identify which file data came from
+    df["source_file"] = uploaded_file.name
 
-    # Combined score with better contrast for black background
-    s += f"<b style='color:#00FFFF'>Combined Score:</b> {row['combined_pct']:.2f}<br>"
+    return df
+
+
+_HOVER_SCORE_LINES = (
+    ("pct_poverty", "Poverty", "<br>"),
+    ("pct_food_insecure", "Food Insecurity", "<br>"),
+    ("pct_vehicle", "Lack of Vehicles", ""),
+)
 
-    # Component scores section
-    if any(row.get(col, 0) > 0 for col in ["pct_poverty", "pct_food_insecure", "pct_vehicle"]):
-        s += "<br>"
 
-        if row.get("pct_poverty", 0) > 0:
-            s += f"<b style='color:#FFFF00'>Poverty:</b> {row['pct_poverty']:.2f}<br>"
-        if row.get("pct_food_insecure", 0) > 0:
-            s += f"<b style='color:#FFFF00'>Food Insecurity:</b> {row['pct_food_insecure']:.2f}<br>"
-        if row.get("pct_vehicle", 0) > 0:
-            s += f"<b style='color:#FFFF00'>Lack of Vehicles:</b> {row['pct_vehicle']:.2f}"
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _tract_hover_headers(tract_key, _tracts):
+    """Build the static tract/county part of the hover text once per tract set."""
+    # Main header with tract and county, then a simple text separator instead of hr tag
+    header = "<b>Census Tract " + _tracts["tract"].astype(str) + "</b><br>"
+    header += "<i>" + _tracts["County"].astype(str) + "</i><br>"
+    header += "-------------------<br>"
+    return header.to_numpy(dtype=str)
 
-    return s
+
+def map_hovertext(df):
+    """Return hover text for every tract in *df*, built with array string operations."""
+    headers = _tract_hover_headers(tuple(df.index), df[["tract", "County"]])
+
+    # Combined score with better contrast for black background
+    combined = np.char.mod("%.2f", df["combined_pct"].to_numpy(dtype=float))
+    text = np.char.add(
+        np.char.add(headers, "<b style='color:#00FFFF'>Combined Score:</b> "), combined
+    )
+    text = np.char.add(text, "<br>")
+
+    # Component scores section, only listing factors above zero
+    components = np.full(len(df), "", dtype=object)
+    has_component = np.zeros(len(df), dtype=bool)
+    for col, label, line_end in _HOVER_SCORE_LINES:
+        if col not in df.columns:
+            continue
+        values = df[col].fillna(0).to_numpy(dtype=float)
+        positive = values > 0
+        line = np.char.add(
+            np.char.add(f"<b style='color:#FFFF00'>{label}:</b> ", np.char.mod("%.2f", values)),
+            line_end,
+        )
+        components = np.where(positive, components + line.astype(object), components)
+        has_component |= positive
+
+    return np.where(has_component, text.astype(object) + "<br>" + components, text.astype(object))
+
+
+# Simplification tolerance in degrees, keyed by the minimum map zoom it applies to
+_DEFAULT_SIMPLIFY_TOLERANCES = {"0": 0.002, "8": 0.001, "10": 0.0003, "12": 0.0}
+_DEFAULT_COORDINATE_PRECISION = 5
+
+
+def _simplify_tolerance(map_config):
+    """Pick the simplification tolerance configured for the map's starting zoom.
+
+    Plotly cannot swap geometry as the user zooms, so the tolerance for the
+    configured initial zoom is used for every view.
+    """
+    tolerances = map_config.get("simplify_tolerances", _DEFAULT_SIMPLIFY_TOLERANCES)
+    zoom = map_config.get("zoom", 0)
+    tolerance = 0.0
+    for level, level_tolerance in sorted((float(z), float(t)) for z, t in tolerances.items()):
+        if level <= zoom:
+            tolerance = level_tolerance
+    return tolerance
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _tract_geojson(tract_key, tolerance, precision, _geometry):
+    """Simplify, quantize and serialize tract polygons once per tract set.
+
+    Tracts are simplified as a coverage: each shared border is simplified once,
+    so neighbouring tracts stay edge to edge without gaps or slivers. If the
+    polygons do not form a valid coverage they are left unsimplified.
+
+    *tract_key* identifies the tract set; *_geometry* is not hashed. The returned
+    dict is shared across reruns and sessions and must not be mutated.
+    """
+    geoms = _geometry.to_numpy().copy()
+    present = ~shapely.is_missing(geoms)
+    if tolerance and shapely.coverage_is_valid(geoms[present]):
+        geoms[present] = shapely.coverage_simplify(geoms[present], tolerance)
+    geoms = shapely.transform(geoms, lambda coords: np.round(coords, precision))
+    features = [
+        {"type": "Feature", "id": str(idx), "geometry": json.loads(geom)}
+        for idx, geom in zip(_geometry.index, shapely.to_geojson(geoms))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def tract_geojson(df, map_config):
+    """Return the cached display GeoJSON for the tracts in *df*."""
+    return _tract_geojson(
+        tuple(df.index),
+        _simplify_tolerance(map_config),
+        map_config.get("coordinate_precision", _DEFAULT_COORDINATE_PRECISION),
+        df.geometry,
+    )
 
 
 def _prepare_base_map(df, col, config):
     """Prepare the base choropleth map with tract data."""
-    projected = df.geometry.to_crs("EPSG:3857")
-    centroids = projected.centroid
-    centroids = gpd.GeoSeries(centroids, crs=projected.crs).to_crs("EPSG:4326")
-
-    df["custom_hover"] = df.apply(map_hovertext, axis=1)
+    if {"centroid_lat", "centroid_lon"}.issubset(df.columns):
+        centroids = gpd.GeoSeries(
+            gpd.points_from_xy(df["centroid_lon"], df["centroid_lat"]),
+            index=df.index,
+            crs="EPSG:4326",
+        )
+    else:
+        projected = df.geometry.to_crs("EPSG:3857")
+        centroids = projected.centroid
+        centroids = gpd.GeoSeries(centroids, crs=projected.crs).to_crs("EPSG:4326")
 
     map_config = config["map_display"]
     map_visualization_options = {
@@ -180,18 +385,20 @@ def _prepare_base_map(df, col, config):
             if config["scale_max"] == "auto"
             else config["scale_max"],
         ),
-        "hover_data": {"custom_hover": True},
     }
 
     fig = px.choropleth_map(
         df,
-        geojson=df.geometry,
+        geojson=tract_geojson(df, map_config),
         locations=df.index,
         color=col,
         **map_visualization_options,
     )
 
-    fig.update_traces(hovertemplate="%{customdata[0]}<extra></extra>")
+    fig.update_traces(
+        customdata=map_hovertext(df)[:, np.newaxis],
+        hovertemplate="%{customdata[0]}<extra></extra>",
+    )
     fig.update_layout(
         hoverlabel=dict(
             bgcolor="black", font_size=16, font_family="Arial", font_color="white"
@@ -231,73 +438,113 @@ def _add_county_seats(fig, config):
 
     return fig
 
-def _map_uploaded_addresses(fig, config):
-    """Add uploaded locations to the map if available."""
-    # Initialize the collection of dataframes if it doesn't exist
-    if "uploaded_dataframes" not in st.session_state:
-        st.session_state["uploaded_dataframes"] = []
-    
-    # Process new coordinates if they exist
-    if st.session_state.get("client_coordinates") is not None:
-        new_df = process_coordinates(st.session_state["client_coordinates"])
-        
-        if new_df is not None:
-            # Check if this file was already uploaded (by filename)
-            existing_files = [df["source_file"].iloc[0] for df in st.session_state["uploaded_dataframes"] 
-                             if not df.empty and "source_file" in df.columns]
-            
-            allowed_columns = {
-                "lat",
-                "lon",
-                "Program Type",
-                "source_file",
-                "Facility",
-                "Name",
-                "Program Name",
-                "Address",
-                "Address Line 2",
-                "City",
-                "Zip",
-                "County",
-            }
-            new_df.drop(
-                columns=[c for c in new_df.columns if c not in allowed_columns],
-                inplace=True,
-                errors="ignore",
-            )
-            if "Program Type" not in new_df.columns:
-                new_df["Program Type"] = "Client"
-                
-            
-            if new_df["source_file"].iloc[0] not in existing_files:
-                # Add the new dataframe to our collection
-                st.session_state["uploaded_dataframes"].append(new_df)
-            else:
-                # Replace the existing dataframe with the new one
-                for i, df in enumerate(st.session_state["uploaded_dataframes"]):
-                    if "source_file" in df.columns and df["source_file"].iloc[0] == new_df["source_file"].iloc[0]:
-                        st.session_state["uploaded_dataframes"][i] = new_df
-                        break
-        
-        # Clear the upload to prevent reprocessing
-        st.session_state["client_coordinates"] = None
-    
-    # If we have no data, return the figure unchanged
-    if not st.session_state["uploaded_dataframes"]:
-        return fig
-    
-    # Combine all dataframes
-    df = pd.concat(st.session_state["uploaded_dataframes"], ignore_index=True)
+def _location_headers(first_rows: pd.DataFrame) -> pd.Series:
+    """Hover header for each location: the address lines, else coordinates."""
 
-    # Save the concatenated dataframe for other components to use
-    st.session_state["mapped_addresses"] = st.session_state.df = df
+    def column(col):
+        if col in first_rows.columns:
+            return clean_text_column(first_rows[col])
+        return pd.Series(None, index=first_rows.index, dtype=object)
+
+    def join(left, right, sep):
+        both = left.notna() & right.notna()
+        return (left + sep + right).where(both, left.where(left.notna(), right))
+
+    lines = ("<b>" + column("Address") + "</b>").where(column("Address").notna(), None)
+    lines = join(lines, column("Address Line 2"), "<br>")
+    lines = join(lines, join(column("City"), column("Zip"), ", "), "<br>")
+
+    coords = "<b>" + _format_coordinates(first_rows) + "</b>"
+    return lines.fillna(coords).fillna("<b>Program Location</b>")
+
+
+def _program_lines(df: pd.DataFrame) -> pd.Series:
+    """One ``- <b>label</b> — type`` hover line per program row."""
+    label = pd.Series(None, index=df.index, dtype=object)
+    for col in ("Program Name", "Facility", "Name"):
+        if col in df.columns:
+            label = label.fillna(clean_text_column(df[col]))
+    label = label.fillna(_format_coordinates(df)).fillna("Program")
+
+    if "Program Type" in df.columns:
+        program_type = clean_text_column(df["Program Type"]).fillna("Unknown Program Type")
+    else:
+        program_type = "Unknown Program Type"
+    return " - <b>" + label + "</b> — " + program_type
+
+
+def aggregate_program_locations(df: pd.DataFrame) -> pd.DataFrame:
+    """Collapse program rows sharing an address into one marker per location.
+
+    Returns mean ``lat``/``lon``, the ``hover`` HTML and the sorted ``program_types``
+    for each address key, ordered by key.
+    """
+    df = df.assign(_address_key=build_address_keys(df), _program_line=_program_lines(df))
+    df = df.dropna(subset=["_address_key"])
+    if df.empty:
+        return pd.DataFrame(columns=["lat", "lon", "hover", "program_types"])
+
+    grouped = df.groupby("_address_key", sort=True)
+    aggregated = grouped.agg(
+        lat=("lat", "mean"),
+        lon=("lon", "mean"),
+        count=("_program_line", "size"),
+        program_lines=("_program_line", "<br>".join),
+    )
+
+    first_rows = df.drop_duplicates("_address_key").set_index("_address_key")
+    headers = _location_headers(first_rows).reindex(aggregated.index)
+    aggregated["hover"] = (
+        headers
+        + "<br><br><b>Programs ("
+        + aggregated["count"].astype(str)
+        + "):</b><br>"
+        + aggregated["program_lines"]
+    )
+
+    types = df[["_address_key", "Program Type"]].dropna().drop_duplicates()
+    types = types.sort_values(["_address_key", "Program Type"])
+    aggregated["program_types"] = (
+        types.groupby("_address_key")["Program Type"].agg(list).reindex(aggregated.index)
+    )
+    aggregated["program_types"] = [
+        value if isinstance(value, list) else [] for value in aggregated["program_types"]
+    ]
+    return aggregated[["lat", "lon", "hover", "program_types"]].reset_index(drop=True)
+
+
+_UPLOAD_COLUMNS = {
+    "lat",
+    "lon",
+    "Program Type",
+    "source_file",
+    "Facility",
+    "Name",
+    "Program Name",
+    "Address",
+    "Address Line 2",
+    "City",
+    "Zip",
+    "County",
+}
+
+
+def _build_upload_layer(dataframes, selected_types, default_color) -> dict:
+    """Combine, filter and aggregate the uploaded frames into marker-layer data."""
+    df = pd.concat(dataframes, ignore_index=True)
+    layer = {
+        "addresses": df,
+        "program_types": [],
+        "selected_types": [],
+        "filtered": pd.DataFrame(),
+        "grouped": pd.DataFrame(),
+        "colors": [],
+    }
 
     # Only rows with coordinates can be shown on the map
     mappable_df = df.dropna(subset=["lat", "lon"]).copy()
     if mappable_df.empty:
-        st.session_state["mapped_addresses_grouped"] = pd.DataFrame()
-        st.session_state["available_program_types"] = []
-        return fig
+        return layer
 
     if "Program Type" not in mappable_df.columns:
         mappable_df["Program Type"] = "Client"
@@ -308,121 +555,115 @@ def _map_uploaded_addresses(fig, config):
     color_map = {
         prog: palette[i % len(palette)] for i, prog in enumerate(program_types)
     }
-    st.session_state["available_program_types"] = program_types
+    layer["program_types"] = program_types
 
-    selected_types = config.get("program_filters") or []
     valid_selected_types = [prog for prog in selected_types if prog in program_types]
-    if selected_types != valid_selected_types:
-        config["program_filters"] = valid_selected_types
-        if "config" in st.session_state:
-            st.session_state["config"]["program_filters"] = valid_selected_types
+    layer["selected_types"] = valid_selected_types
 
     if valid_selected_types:
-        filtered_df = mappable_df[
-            mappable_df["Program Type"].isin(valid_selected_types)
-        ].copy()
+        filtered_df = mappable_df[mappable_df["Program Type"].isin(valid_selected_types)]
     else:
-        filtered_df = mappable_df.copy()
+        filtered_df = mappable_df
+    layer["filtered"] = filtered_df
+    if filtered_df.empty:
+        return layer
 
-    st.session_state["mapped_addresses_filtered"] = filtered_df.copy()
+    aggregated_df = aggregate_program_locations(filtered_df)
+    if aggregated_df.empty:
+        return layer
+
+    layer["grouped"] = aggregated_df
+    layer["colors"] = (
+        aggregated_df["program_types"].str[0].map(color_map).fillna(default_color).tolist()
+    )
+    return layer
 
-    if filtered_df.empty:
-        st.session_state["mapped_addresses_grouped"] = pd.DataFrame()
-        return fig
 
-    def _format_location_header(group):
-        first = group.iloc[0]
-        header_lines = []
-        address = _clean_text(first.get("Address"))
-        address2 = _clean_text(first.get("Address Line 2"))
-        city = _clean_text(first.get("City"))
-        zip_code = _clean_text(first.get("Zip"))
-
-        if address:
-            header_lines.append(f"<b>{address}</b>")
-        if address2:
-            header_lines.append(address2)
-        city_zip_parts = [part for part in [city, zip_code] if part]
-        if city_zip_parts:
-            header_lines.append(", ".join(city_zip_parts))
-
-        if header_lines:
-            return "<br>".join(header_lines)
-
-        lat = first.get("lat")
-        lon = first.get("lon")
-        if pd.notna(lat) and pd.notna(lon):
-            return f"<b>({lat:.4f}, {lon:.4f})</b>"
-        return "<b>Program Location</b>"
-
-    def _format_program_line(row):
-        label = None
-        for col in ("Program Name", "Facility", "Name"):
-            label = _clean_text(row.get(col))
-            if label:
-                break
-        if not label:
-            lat = row.get("lat")
-            lon = row.get("lon")
-            if pd.notna(lat) and pd.notna(lon):
-                label = f"({lat:.4f}, {lon:.4f})"
-            else:
-                label = "Program"
-
-        program_type = _clean_text(row.get("Program Type")) or "Unknown Program Type"
-        line = f" - <b>{label}</b> — {program_type}"
-        return line
-
-    def _build_hover(group):
-        lines = []
-        header = _format_location_header(group)
-        if header:
-            lines.append(header)
-            lines.append("")
-        lines.append(f"<b>Programs ({len(group)}):</b>")
-        for _, row in group.iterrows():
-            lines.append(_format_program_line(row))
-        return "<br>".join(lines)
-
-    filtered_df["_address_key"] = filtered_df.apply(build_address_key, axis=1)
-    filtered_df = filtered_df.dropna(subset=["_address_key"])
-
-    aggregated_points = []
-    for _, group in filtered_df.groupby("_address_key"):
-        aggregated_points.append(
-            {
-                "lat": group["lat"].mean(),
-                "lon": group["lon"].mean(),
-                "hover": _build_hover(group),
-                "program_types": sorted(
-                    {ptype for ptype in group["Program Type"].dropna().unique()}
-                ),
-            }
+def _toast_geocode_summary(summary):
+    """Tell the user how much geocoding an upload needed."""
+    if not summary:
+        return
+    if summary["duplicates"]:
+        st.toast(
+            f"Geocoded {summary['geocoded']} unique addresses "
+            f"({summary['duplicates']} duplicate rows reused)"
         )
+    if summary["cache_hits"]:
+        st.toast(f"Reused {summary['cache_hits']} cached geocodes")
 
-    if not aggregated_points:
-        st.session_state["mapped_addresses_grouped"] = pd.DataFrame()
+
+def _map_uploaded_addresses(fig, config):
+    """Add uploaded locations to the map if available."""
+    # Initialize the upload registry if it doesn't exist
+    if "upload_registry" not in st.session_state:
+        st.session_state["upload_registry"] = UploadRegistry()
+    registry = st.session_state["upload_registry"]
+
+    # Process a new upload only if its contents have not been seen before
+    uploaded_file = st.session_state.get("client_coordinates")
+    if uploaded_file is not None:
+        digest = registry.digest_for(uploaded_file)
+        if digest not in registry:
+            progress_bar = st.empty()
+            new_df = process_coordinates(
+                uploaded_file,
+                progress=lambda fraction, text: progress_bar.progress(fraction, text=text),
+            )
+            progress_bar.empty()
+            if new_df is not None:
+                _toast_geocode_summary(new_df.attrs.pop("geocode_summary", None))
+                new_df.drop(
+                    columns=[c for c in new_df.columns if c not in _UPLOAD_COLUMNS],
+                    inplace=True,
+                    errors="ignore",
+                )
+                if "Program Type" not in new_df.columns:
+                    new_df["Program Type"] = "Client"
+                registry.add(digest, new_df)
+
+        # Clear the upload to prevent reprocessing
+        st.session_state["client_coordinates"] = None
+
+    # If we have no data, return the figure unchanged
+    dataframes = registry.frames()
+    if not dataframes:
         return fig
 
-    aggregated_df = pd.DataFrame(aggregated_points)
-    st.session_state["mapped_addresses_grouped"] = aggregated_df
+    # Reuse the aggregated layer unless the uploads, filters or fallback color changed
+    selected_types = config.get("program_filters") or []
+    default_color = config.get("client_marker", {}).get("color", "#006af5")
+    cache_key = (
+        registry.digests(),
+        tuple(selected_types),
+        default_color,
+    )
+    cached = st.session_state.get("upload_layer_cache")
+    if cached is not None and cached[0] == cache_key:
+        layer = cached[1]
+    else:
+        layer = _build_upload_layer(dataframes, selected_types, default_color)
+        st.session_state["upload_layer_cache"] = (cache_key, layer)
+
+    # Save the concatenated dataframe for other components to use
+    st.session_state["mapped_addresses"] = st.session_state.df = layer["addresses"]
+    st.session_state["available_program_types"] = layer["program_types"]
+    st.session_state["mapped_addresses_filtered"] = layer["filtered"]
+    st.session_state["mapped_addresses_grouped"] = layer["grouped"]
+
+    if layer["selected_types"] != selected_types:
+        config["program_filters"] = layer["selected_types"]
+        if "config" in st.session_state:
+            st.session_state["config"]["program_filters"] = layer["selected_types"]
+
+    aggregated_df = layer["grouped"]
+    if aggregated_df.empty:
+        return fig
 
     marker_config = config["program_marker"].copy()
     marker_config.setdefault("size", config.get("client_marker", {}).get("size", 12))
     marker_config.setdefault("opacity", config.get("program_marker", {}).get("opacity", 0.75))
 
-    colors = []
-    for program_list in aggregated_df["program_types"]:
-        if program_list:
-            colors.append(
-                color_map.get(
-                    program_list[0], config.get("client_marker", {}).get("color", "#006af5")
-                )
-            )
-        else:
-            colors.append(config.get("client_marker", {}).get("color", "#006af5"))
-
-    marker_config["color"] = colors
+    marker_config["color"] = layer["colors"]
 
     fig.add_scattermap(
         below="",
@@ -464,29 +705,28 @@ def make_map(df: pd.DataFrame, col: str, config: dict):
     return fig
 
 # Add a function to remove an uploaded file
-def remove_uploaded_file(filename):
-    """Remove a specific uploaded file from the collection by filename."""
-    if "uploaded_dataframes" in st.session_state and st.session_state["uploaded_dataframes"]:
-        # Filter out the file to remove
-        st.session_state["uploaded_dataframes"] = [
-            df for df in st.session_state["uploaded_dataframes"] 
-            if df["source_file"].iloc[0] != filename
-        ]
-        
-        # Regenerate the combined dataframe if files remain
-        if st.session_state["uploaded_dataframes"]:
-            st.session_state["mapped_addresses"] = st.session_state.df = pd.concat(
-                st.session_state["uploaded_dataframes"], ignore_index=True
-            )
-            st.session_state["mapped_addresses_filtered"] = pd.DataFrame()
-            st.session_state["mapped_addresses_grouped"] = pd.DataFrame()
-            st.session_state["available_program_types"] = []
-        else:
-            # No files left, clear the dataframes
-            st.session_state["mapped_addresses"] = st.session_state.df = pd.DataFrame()
-            st.session_state["mapped_addresses_filtered"] = pd.DataFrame()
-            st.session_state["mapped_addresses_grouped"] = pd.DataFrame()
-            st.session_state["available_program_types"] = []
-
-        return True
-    return False
+def remove_uploaded_file(upload_id):
+    """Remove an uploaded file by content hash, or every upload with that filename."""
+    registry = st.session_state.get("upload_registry")
+    if not registry:
+        return False
+
+    digests = [upload_id] if upload_id in registry else registry.digests_for_name(upload_id)
+    if not digests:
+        return False
+    for digest in digests:
+        registry.remove(digest)
+
+    # Regenerate the combined dataframe if files remain
+    if len(registry):
+        st.session_state["mapped_addresses"] = st.session_state.df = pd.concat(
+            registry.frames(), ignore_index=True
+        )
+    else:
+        # No files left, clear the dataframes
+        st.session_state["mapped_addresses"] = st.session_state.df = pd.DataFrame()
+    st.session_state["mapped_addresses_filtered"] = pd.DataFrame()
+    st.session_state["mapped_addresses_grouped"] = pd.DataFrame()
+    st.session_state["available_program_types"] = []
+
+    return True
@@ -0,0 +1,298 @@
+"""Shared, pooled HTTP clients for the Google Maps web services.
+
+``MapsClient`` is the blocking client used for one-off calls; ``AsyncMapsClient``
+fans out many requests from a single event loop. get_async_maps_client() keeps
+one open AsyncMapsClient per key on a background loop, shared by every batch.
+"""
+
+import asyncio
+import atexit
+import contextlib
+import functools
+import json
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5.0, 30.0)  # (connect, read) seconds
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TOTAL_CONNECTIONS = 100
+
+# Responses worth retrying; Maps requests are read-only, so POSTs are retried too
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+def pooled_session(
+    pool_size: int = DEFAULT_POOL_SIZE, max_retries: Union[Retry, int] = 0
+) -> requests.Session:
+    """A ``requests.Session`` keeping up to *pool_size* connections alive per host.
+
+    *max_retries* is passed to the ``HTTPAdapter``; by default nothing is retried.
+    """
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=max_retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class MapsClient:
+    """A keep-alive ``requests.Session`` with retries, timeouts and the API key attached.
+
+    Connections are pooled per host, so repeated calls skip the TCP and TLS
+    handshake. Connection errors and 429/5xx responses are retried with
+    exponential backoff before the last response is returned to the caller.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: Timeout = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.api_key = api_key or os.getenv("MAPS_API_KEY")
+        if not self.api_key:
+            raise ValueError("MAPS_API_KEY environment variable not found")
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=_RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        self.session = pooled_session(pool_size, retry)
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """GET *url* with the API key added as the ``key`` query parameter."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, params={**(params or {}), "key": self.api_key}, **kwargs)
+
+    def post(
+        self, url: str, json: dict, headers: Optional[dict] = None, **kwargs
+    ) -> requests.Response:
+        """POST a JSON body to *url* with the API key in the ``X-Goog-Api-Key`` header."""
+        kwargs.setdefault("timeout", self.timeout)
+        headers = {"X-Goog-Api-Key": self.api_key, **(headers or {})}
+        return self.session.post(url, json=json, headers=headers, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_client(api_key: Optional[str]) -> MapsClient:
+    return MapsClient(api_key)
+
+
+def get_maps_client(api_key: Optional[str] = None) -> MapsClient:
+    """Return the process-wide client for *api_key* (default: ``MAPS_API_KEY``)."""
+    with _lock:
+        return _shared_client(api_key)
+
+
+@dataclass(slots=True)
+class MapsResponse:
+    """A fully read ``aiohttp`` response, so it can be used after the connection is released."""
+
+    status: int
+    reason: str
+    text: str
+    request_info: aiohttp.RequestInfo
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise aiohttp.ClientResponseError(
+                self.request_info, (), status=self.status, message=self.reason
+            )
+
+
+def _client_timeout(timeout: Timeout) -> aiohttp.ClientTimeout:
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+    return aiohttp.ClientTimeout(total=timeout)
+
+
+class AsyncMapsClient:
+    """``aiohttp`` counterpart of MapsClient for fanning out requests on one event loop.
+
+    Use it as ``async with AsyncMapsClient() as client:``; every request made
+    inside the block shares one ``ClientSession``. At most *max_concurrency*
+    requests are in flight at once and the connector opens at most
+    *limit_per_host* connections to any one host. Retries follow MapsClient:
+    connection errors, timeouts and 429/5xx responses are retried with
+    exponential backoff, without holding a concurrency slot while waiting.
+
+    Cancelling a task cancels its request and frees its connection.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: Timeout = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        max_concurrency: int = DEFAULT_POOL_SIZE,
+        limit_per_host: Optional[int] = None,
+    ):
+        self.api_key = api_key or os.getenv("MAPS_API_KEY")
+        if not self.api_key:
+            raise ValueError("MAPS_API_KEY environment variable not found")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit_per_host = limit_per_host or self.max_concurrency
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncMapsClient":
+        # Sessions belong to the running loop, so they are opened here rather than in __init__
+        connector = aiohttp.TCPConnector(
+            limit=max(DEFAULT_TOTAL_CONNECTIONS, self.limit_per_host),
+            limit_per_host=self.limit_per_host,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=_client_timeout(self.timeout)
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _request(self, method: str, url: str, **kwargs) -> MapsResponse:
+        if self.session is None:
+            raise RuntimeError("AsyncMapsClient must be used inside 'async with'")
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        result = MapsResponse(
+                            response.status,
+                            response.reason or "",
+                            await response.text(),
+                            response.request_info,
+                        )
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+            else:
+                if result.status not in _RETRY_STATUSES or last_attempt:
+                    return result
+            await asyncio.sleep(self.backoff_factor * 2**attempt)
+
+    async def get(self, url: str, params: Optional[dict] = None) -> MapsResponse:
+        """GET *url* with the API key added as the ``key`` query parameter."""
+        return await self._request("GET", url, params={**(params or {}), "key": self.api_key})
+
+    async def post(self, url: str, json: dict, headers: Optional[dict] = None) -> MapsResponse:
+        """POST a JSON body to *url* with the API key in the ``X-Goog-Api-Key`` header."""
+        headers = {"X-Goog-Api-Key": self.api_key, **(headers or {})}
+        return await self._request("POST", url, json=json, headers=headers)
+
+
+# Shared async clients live on one background event loop, so their sessions and
+# connection pools outlast a single batch
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_clients: Dict[Tuple[Optional[str], int], AsyncMapsClient] = {}
+
+
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        threading.Thread(target=_loop.run_forever, name="maps-event-loop", daemon=True).start()
+        atexit.register(_close_async_clients)
+    return _loop
+
+
+def _close_async_clients() -> None:
+    for client in _async_clients.values():
+        asyncio.run_coroutine_threadsafe(client.close(), _loop).result(timeout=5)
+    _async_clients.clear()
+
+
+def get_async_maps_client(
+    api_key: Optional[str] = None, max_concurrency: int = DEFAULT_POOL_SIZE
+) -> AsyncMapsClient:
+    """Return the process-wide, already open AsyncMapsClient for *api_key*.
+
+    The client lives on a background event loop and is never closed by a
+    batch; use it through run_with_maps_client().
+    """
+    with _lock:
+        loop = _shared_loop()
+        key = (api_key or os.getenv("MAPS_API_KEY"), max_concurrency)
+        if key not in _async_clients:
+            client = AsyncMapsClient(key[0], max_concurrency=max_concurrency)
+            asyncio.run_coroutine_threadsafe(client.__aenter__(), loop).result()
+            _async_clients[key] = client
+        return _async_clients[key]
+
+
+def run_with_maps_client(
+    make_items: Callable[[AsyncMapsClient], AsyncIterator],
+    api_key: Optional[str] = None,
+    max_concurrency: int = DEFAULT_POOL_SIZE,
+) -> Iterator:
+    """Drive the async iterator ``make_items(client)`` on the shared event loop.
+
+    *client* is the shared client from get_async_maps_client(), so every batch
+    reuses one session and its open connections. Items are yielded in the
+    calling thread, where Streamlit calls are allowed. Closing the returned
+    iterator early cancels the async iterator and the requests it has in flight.
+    """
+    client = get_async_maps_client(api_key, max_concurrency)
+    items: queue.Queue = queue.Queue()
+    finished = object()
+
+    async def pump():
+        try:
+            async with contextlib.aclosing(make_items(client)) as results:
+                async for item in results:
+                    items.put((item, None))
+        except Exception as e:
+            items.put((None, e))
+        finally:
+            items.put(finished)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _loop)
+    try:
+        while (entry := items.get()) is not finished:
+            item, error = entry
+            if error is not None:
+                raise error
+            yield item
+    finally:
+        future.cancel()
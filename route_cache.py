@@ -0,0 +1,131 @@
+"""Two-level cache for transit route lookups: an in-memory LRU over SQLite."""
+
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional
+
+from cache import MISSING, PersistentCache
+
+DEFAULT_CACHE_PATH = "data/route_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_BUCKET_MINUTES = 15
+COORDINATE_DECIMALS = 4  # about 11 m, closer than transit stops are spaced
+
+
+def normalize_address(address: str) -> str:
+    """Collapse whitespace and case so trivially different spellings share a key."""
+    return re.sub(r"\s+", " ", address).strip().casefold()
+
+
+def departure_bucket(departure: datetime, minutes: int = DEFAULT_BUCKET_MINUTES) -> str:
+    """Floor *departure* to a *minutes*-wide slot, e.g. ``2024-05-01T09:45``."""
+    floored = departure.replace(
+        minute=departure.minute - departure.minute % minutes, second=0, microsecond=0
+    )
+    return floored.strftime("%Y-%m-%dT%H:%M")
+
+
+def _endpoint_key(address: Optional[str], lat: Optional[float], lng: Optional[float]) -> str:
+    if address:
+        return "a:" + normalize_address(address)
+    return f"c:{lat:.{COORDINATE_DECIMALS}f},{lng:.{COORDINATE_DECIMALS}f}"
+
+
+class RouteCache:
+    """Transit routes keyed by origin, destination, preferences and departure slot.
+
+    Recent entries are held in an LRU of at most *max_entries*; everything is
+    also written to a :class:`PersistentCache` so results survive restarts.
+    Both levels expire entries after *ttl* seconds.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        bucket_minutes: int = DEFAULT_BUCKET_MINUTES,
+    ):
+        self.store = PersistentCache(path, namespace="routes") if path else None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bucket_minutes = bucket_minutes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        departure: datetime,
+        preferences: str,
+        start_address: Optional[str] = None,
+        end_address: Optional[str] = None,
+        start_lat: Optional[float] = None,
+        start_lng: Optional[float] = None,
+        end_lat: Optional[float] = None,
+        end_lng: Optional[float] = None,
+    ) -> str:
+        """Build the cache key for one route request."""
+        origin = _endpoint_key(start_address, start_lat, start_lng)
+        destination = _endpoint_key(end_address, end_lat, end_lng)
+        slot = departure_bucket(departure, self.bucket_minutes)
+        return "|".join([origin, destination, preferences, slot])
+
+    def get(self, key: str) -> Any:
+        """Return the cached route legs for *key*, or MISSING."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+        entry = self.store.get_with_expiry(key) if self.store is not None else MISSING
+        with self._lock:
+            if entry is MISSING:
+                self.misses += 1
+                return MISSING
+            self.disk_hits += 1
+            value, expires_at = entry
+            self._remember(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store JSON-serializable route legs under *key*."""
+        with self._lock:
+            self._remember(key, value, time.time() + self.ttl)
+        if self.store is not None:
+            self.store.set(key, value, self.ttl)
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_route_cache(path: str = DEFAULT_CACHE_PATH) -> RouteCache:
+    """Return the process-wide route cache stored at *path*."""
+    return RouteCache(path)
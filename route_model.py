@@ -0,0 +1,210 @@
+"""Compact transit route representation parsed from Routes API responses.
+
+Each step keeps only the fields the tool displays, and each leg's walking
+metrics are computed once while it is parsed, so formatting and re-sorting
+results never walk the raw response again.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+LatLng = Tuple[float, float]
+
+
+def _seconds(duration: Optional[str]) -> int:
+    """Convert a Routes API duration like '123s' to whole seconds."""
+    if duration and duration.endswith("s"):
+        return int(float(duration[:-1]))
+    return 0
+
+
+def _lat_lng(location: Optional[Dict]) -> Optional[LatLng]:
+    lat_lng = (location or {}).get("latLng")
+    if not lat_lng:
+        return None
+    return lat_lng.get("latitude"), lat_lng.get("longitude")
+
+
+@dataclass(slots=True)
+class RouteStep:
+    """One walking or transit step; transit fields are empty for walking steps."""
+
+    step_index: int
+    travel_mode: str
+    distance_meters: int
+    duration_s: int
+    instructions: str = ""
+    start_location: Optional[LatLng] = None
+    end_location: Optional[LatLng] = None
+    line_name: str = ""
+    departure_stop: str = ""
+    arrival_stop: str = ""
+    departure_time: Optional[str] = None
+    arrival_time: Optional[str] = None
+    headsign: str = ""
+    stop_count: int = 0
+
+    @property
+    def is_transit(self) -> bool:
+        return self.travel_mode == "TRANSIT"
+
+    @property
+    def duration(self) -> str:
+        return f"{self.duration_s}s"
+
+    @classmethod
+    def from_api(cls, step_index: int, step: Dict) -> "RouteStep":
+        transit = step.get("transitDetails")
+        parsed = cls(
+            step_index=step_index,
+            travel_mode=step.get("travelMode", "UNKNOWN"),
+            distance_meters=step.get("distanceMeters", 0),
+            duration_s=_seconds(step.get("duration", step.get("staticDuration", "0s"))),
+            instructions=step.get("navigationInstruction", {}).get("instructions", ""),
+            start_location=_lat_lng(step.get("startLocation")),
+            end_location=_lat_lng(step.get("endLocation")),
+        )
+        if transit:
+            line = transit.get("transitLine", {})
+            stops = transit.get("stopDetails", {})
+            parsed.line_name = line.get("nameShort") or line.get("name") or ""
+            parsed.departure_stop = stops.get("departureStop", {}).get("name", "")
+            parsed.arrival_stop = stops.get("arrivalStop", {}).get("name", "")
+            parsed.departure_time = stops.get("departureTime") or transit.get("departureTime")
+            parsed.arrival_time = stops.get("arrivalTime") or transit.get("arrivalTime")
+            parsed.headsign = transit.get("headsign", "")
+            parsed.stop_count = transit.get("stopCount", 0)
+        return parsed
+
+
+@dataclass(slots=True)
+class RouteLeg:
+    """A route leg with its walking metrics precomputed from its steps.
+
+    Walking time is split into the walk before the first non-walking step, the
+    segments between non-walking steps, and the walk after the last one, so
+    consecutive legs can merge their walks without revisiting steps.
+    """
+
+    route_index: int
+    leg_index: int
+    distance_meters: int
+    duration_s: int
+    steps: List[RouteStep]
+    start_location: Optional[LatLng] = None
+    end_location: Optional[LatLng] = None
+    walk_time_s: int = field(init=False, default=0)
+    walk_distance_m: int = field(init=False, default=0)
+    walk_before_s: int = field(init=False, default=0)
+    walk_between_s: Tuple[int, ...] = field(init=False, default=())
+    walk_after_s: int = field(init=False, default=0)
+    has_non_walk_step: bool = field(init=False, default=False)
+
+    def __post_init__(self):
+        between = []
+        current = 0
+        for step in self.steps:
+            if step.travel_mode == "WALK":
+                self.walk_time_s += step.duration_s
+                self.walk_distance_m += step.distance_meters
+                current += step.duration_s
+                continue
+            if not self.has_non_walk_step:
+                self.walk_before_s = current
+                self.has_non_walk_step = True
+            elif current > 0:
+                between.append(current)
+            current = 0
+        if self.has_non_walk_step:
+            self.walk_after_s = current
+        else:
+            self.walk_before_s = current
+        self.walk_between_s = tuple(between)
+
+    @property
+    def duration(self) -> str:
+        return f"{self.duration_s}s"
+
+    @classmethod
+    def from_api(cls, route_index: int, leg_index: int, leg: Dict) -> "RouteLeg":
+        return cls(
+            route_index=route_index,
+            leg_index=leg_index,
+            distance_meters=leg.get("distanceMeters", 0),
+            duration_s=_seconds(leg.get("duration", "0s")),
+            steps=[RouteStep.from_api(i, step) for i, step in enumerate(leg.get("steps", []))],
+            start_location=_lat_lng(leg.get("startLocation")),
+            end_location=_lat_lng(leg.get("endLocation")),
+        )
+
+    def to_json(self) -> Dict:
+        """Serialize the leg's parsed fields; derived metrics are rebuilt on load."""
+        return {
+            "route_index": self.route_index,
+            "leg_index": self.leg_index,
+            "distance_meters": self.distance_meters,
+            "duration_s": self.duration_s,
+            "start_location": self.start_location,
+            "end_location": self.end_location,
+            "steps": [
+                [getattr(step, name) for name in RouteStep.__dataclass_fields__]
+                for step in self.steps
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "RouteLeg":
+        def location(value):
+            return tuple(value) if value is not None else None
+
+        steps = []
+        for values in data["steps"]:
+            step = RouteStep(*values)
+            step.start_location = location(step.start_location)
+            step.end_location = location(step.end_location)
+            steps.append(step)
+        return cls(
+            route_index=data["route_index"],
+            leg_index=data["leg_index"],
+            distance_meters=data["distance_meters"],
+            duration_s=data["duration_s"],
+            steps=steps,
+            start_location=location(data["start_location"]),
+            end_location=location(data["end_location"]),
+        )
+
+
+def parse_routes(data: Dict) -> List[RouteLeg]:
+    """Parse a computeRoutes response into legs, in route then leg order."""
+    return [
+        RouteLeg.from_api(route_index, leg_index, leg)
+        for route_index, route in enumerate(data.get("routes", []))
+        for leg_index, leg in enumerate(route.get("legs", []))
+    ]
+
+
+def walking_segments(legs: List[RouteLeg]) -> List[int]:
+    """Consecutive walking durations across *legs*, merging walks that span legs."""
+    segments = []
+    current = 0
+    for leg in legs:
+        current += leg.walk_before_s
+        if not leg.has_non_walk_step:
+            continue
+        if current > 0:
+            segments.append(current)
+        segments.extend(leg.walk_between_s)
+        current = leg.walk_after_s
+    if current > 0:
+        segments.append(current)
+    return segments
+
+
+def route_metrics(legs: List[RouteLeg]) -> Dict[str, int]:
+    """Total walk time and distance plus total travel time and distance for *legs*."""
+    return {
+        "total_walk_time_s": sum(leg.walk_time_s for leg in legs),
+        "total_walk_distance_m": sum(leg.walk_distance_m for leg in legs),
+        "total_duration_s": sum(leg.duration_s for leg in legs),
+        "total_distance_m": sum(leg.distance_meters for leg in legs),
+    }
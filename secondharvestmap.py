@@ -4,10 +4,13 @@ import plotly.express as px
 
 from map_utils import make_map
 from utils import (
+    ACCESS_FACTOR_COLUMN,
     load_config,
     get_missing_defaults,
-    load_and_process_data,
-    post_process_data,
+    load_shared_tracts,
+    compute_scores,
+    attach_scores,
+    ScoreCache,
 )
 
 
@@ -46,6 +49,7 @@ with info.popover("", icon=":material/question_mark:", use_container_width=False
         - **Food Insecurity Weight**: Affects the impact of food insecurity rates in the combined score
         - **Poverty Weight**: Affects the impact of poverty rates in the combined score
         - **Vehicle Access Weight**: Affects the impact of lacking vehicle access in the combined score
+        - **Transit Access Weight**: Affects the impact of long transit trips to the nearest facilities (shown once the transit access data has been built)
         
         #### Normalize Scores
         When enabled, this option equalizes the range of each factor before combining them. This prevents factors with naturally larger numeric ranges from dominating the calculation.
@@ -83,6 +87,14 @@ with info.popover("", icon=":material/question_mark:", use_container_width=False
         todo.checkbox("Public Transit Overlay", value=False, disabled=True)
         todo.checkbox("Program Impact Overlay", value=False, disabled=True)
 
+# Geometry and base ACS columns are shared by every session; only scores live in session state
+tracts, factor_columns = load_shared_tracts(config["file_paths"])
+if (
+    "score_cache" not in st.session_state
+    or st.session_state["score_cache"].index is not factor_columns.index
+):
+    st.session_state["score_cache"] = ScoreCache(factor_columns)
+
 with st.sidebar:
     with st.expander("Address Overlay", icon=":material/home:"):
        
@@ -195,6 +207,17 @@ with st.sidebar:
             key="vw",
             help="The weight of not having a vehicle in the calculation.",
         )
+        transit_weight = 0.0
+        if ACCESS_FACTOR_COLUMN in factor_columns:
+            transit_weight = sliders.slider(
+                "Transit Access Weight",
+                slider_config["min"],
+                slider_config["max"],
+                config.get("transit_weight", 0.0),
+                step=slider_config["step"],
+                key="tw",
+                help="The weight of transit travel time to the nearest facilities in the calculation.",
+            )
         vehicle_num_toggle = st.checkbox(
             "Include Households with Fewer Vehicles than Members",
             key="vnt",
@@ -206,7 +229,7 @@ with st.sidebar:
         st.write("### Map Color Scale")
         if config["scale_max"] == "auto":
             default_scale_max = float(
-                st.session_state["tracts"].combined_pct.quantile(0.90)
+                st.session_state["tract_scores"].combined_pct.quantile(0.90)
             )
         else:
             default_scale_max = (
@@ -285,8 +308,6 @@ with st.sidebar:
             },
         )
         st.session_state["config"] = config
-if "tracts" not in st.session_state:
-    st.session_state["tracts"] = load_and_process_data(config)
 
 config = update_config(
     config,
@@ -298,21 +319,25 @@ config = update_config(
     poverty_weight=poverty_weight,
     food_weight=food_weight,
     vehicle_weight=vehicle_weight,
+    transit_weight=transit_weight,
     vehicle_num_toggle=vehicle_num_toggle,
     show_settings=False,
     map_type=st.session_state["map_type"],
 )
 st.session_state["config"] = config
 
-st.session_state["tracts"] = post_process_data(
-    st.session_state["tracts"],
+st.session_state["tract_scores"] = compute_scores(
+    st.session_state["score_cache"],
     vehicle_num_toggle,
     poverty_weight,
     vehicle_weight,
     food_weight,
+    transit_weight,
 )
 try:
-    fig = make_map(st.session_state["tracts"], "combined_pct", config)
+    fig = make_map(
+        attach_scores(tracts, st.session_state["tract_scores"]), "combined_pct", config
+    )
     st.plotly_chart(fig, use_container_width=True)
 except Exception as e:
     st.error(f"Error processing data: {str(e)}")
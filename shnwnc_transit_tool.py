@@ -2,11 +2,11 @@ from datetime import datetime
 import streamlit as st
 import pandas as pd
 import numpy as np
-from math import radians, cos, sin, asin, sqrt
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import os
 from transit import (
     get_transit_routes,
+    get_transit_routes_batch,
     get_walking_summary,
     duration_to_seconds,
     format_duration,
@@ -15,6 +15,15 @@ from transit import (
 )
 import requests
 import pytz
+from cache import MISSING
+from distance import WALK_SPEED_MPS
+from facility_index import FacilityIndex
+from facility_stops import FacilityStopIndex
+from geocoding import GEOCODE_URL, build_address_key, get_geocode_cache
+from gtfs_router import GTFSRouter
+from maps_client import get_maps_client
+from route_cache import get_route_cache
+from route_model import RouteLeg, route_metrics
 from io import BytesIO  # NEW: for in-memory Excel export
 
 
@@ -29,6 +38,8 @@ st.set_page_config(
 def geocode_address(address: str) -> Tuple[float, float]:
     """
     Convert an address to latitude and longitude using Google Maps Geocoding API.
+    Results (including addresses that could not be found) are kept in the
+    persistent geocode cache.
 
     Args:
         address: The address to geocode
@@ -36,44 +47,43 @@ def geocode_address(address: str) -> Tuple[float, float]:
     Returns:
         Tuple of (latitude, longitude)
     """
-    api_key = os.getenv("MAPS_API_KEY")
-    if not api_key:
-        raise ValueError("MAPS_API_KEY environment variable not found")
-
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"address": address, "key": api_key}
-
-    response = requests.get(url, params=params)
+    cache = get_geocode_cache()
+    key = build_address_key(pd.Series({"Address": address}))
+    if key:
+        cached = cache.get(key)
+        if cached is not MISSING:
+            if cached is None:
+                raise ValueError(f"Could not geocode address: {address}")
+            return cached
+
+    response = get_maps_client().get(GEOCODE_URL, params={"address": address})
     response.raise_for_status()
 
     data = response.json()
 
+    if data["status"] == "ZERO_RESULTS":
+        if key:
+            cache.set(key, None)
+        raise ValueError(f"Could not geocode address: {address}")
     if data["status"] != "OK" or not data["results"]:
         raise ValueError(f"Could not geocode address: {address}")
 
     location = data["results"][0]["geometry"]["location"]
+    if key:
+        cache.set(key, (location["lat"], location["lng"]))
     return location["lat"], location["lng"]
 
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calculate the great circle distance between two points
-    on the earth (specified in decimal degrees)
-    Returns distance in kilometers
-    """
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    r = 6371
-    return c * r
+FACILITIES_PATH = "data/shnwnc_facilities.csv"
+
+# Transit route requests sent at once when routing to the closest facilities
+MAX_CONCURRENT_ROUTE_REQUESTS = 6
 
 
-def load_facilities_data() -> pd.DataFrame:
+def load_facilities_data(path: str = FACILITIES_PATH) -> pd.DataFrame:
     """Load facilities data from CSV file."""
     try:
-        df = pd.read_csv("data/shnwnc_facilities.csv")
+        df = pd.read_csv(path)
         required_cols = ["Facility", "Address", "City", "Program Type", "lat", "lon"]
         missing_cols = [col for col in required_cols if col not in df.columns]
         if missing_cols:
@@ -90,45 +100,79 @@ def load_facilities_data() -> pd.DataFrame:
         return None
 
 
-def find_closest_facilities(
-    start_lat: float, start_lon: float, facilities_df: pd.DataFrame, n: int = 5
-) -> pd.DataFrame:
-    """Find the N closest facilities to the starting point."""
-    facilities_df = facilities_df.copy()
-    facilities_df["distance_km"] = facilities_df.apply(
-        lambda row: haversine_distance(start_lat, start_lon, row["lat"], row["lon"]),
-        axis=1,
-    )
-    return facilities_df.nsmallest(n, "distance_km")
+# Optional table of transit stops near each facility (data/build_facility_stops.py)
+FACILITY_STOPS_PATH = "data/facility_stops.parquet"
+DEFAULT_MAX_STOP_WALK_MIN = 10
 
 
-def get_route_metrics(legs: List[Dict]) -> Dict:
-    """Calculate route metrics from transit route legs."""
-    total_distance_m = 0
-    total_duration_s = 0
+@st.cache_resource
+def _load_facility_stop_index(
+    path: str, facilities_path: str, stops_mtime: float, facilities_mtime: float
+) -> FacilityStopIndex:
+    """Load the facility-stop walk table once per version of both files."""
+    index = FacilityStopIndex.load(path, facilities_path)
+    if index is None:
+        # Raised rather than returned so the miss is not cached
+        raise ValueError(f"{path} was built from another facilities file")
+    return index
 
-    for leg in legs:
-        total_distance_m += leg.get("distance_meters", 0)
-        total_duration_s += duration_to_seconds(leg.get("duration", "0s"))
 
-    walking_segments = get_walking_summary(legs)
-    total_walk_time_s = sum(walking_segments)
+def get_facility_stop_index(path: str, facilities_path: str) -> Optional[FacilityStopIndex]:
+    """The facility-stop walk table; None if it is missing or out of date."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return _load_facility_stop_index(
+            path, facilities_path, os.path.getmtime(path), os.path.getmtime(facilities_path)
+        )
+    except ValueError:
+        return None
 
-    total_walk_distance_m = 0
-    for leg in legs:
-        for step in leg.get("steps", []):
-            if step.get("travel_mode") == "WALK":
-                total_walk_distance_m += step.get("distance_meters", 0)
 
-    return {
-        "total_walk_time_s": total_walk_time_s,
-        "total_walk_distance_m": total_walk_distance_m,
-        "total_duration_s": total_duration_s,
-        "total_distance_m": total_distance_m,
-    }
+def format_stop_walk(walk_s: float, max_walk_s: float) -> str:
+    """Label for the "Transit Reachable" column from the walk to a facility's nearest stop."""
+    if not np.isfinite(walk_s):
+        return "No stop nearby"
+    walk = f"{format_duration(f'{int(walk_s)}s')} from a stop"
+    return f"Yes ({walk})" if walk_s <= max_walk_s else f"No ({walk})"
 
 
-def format_route_directions(legs: List[Dict]) -> List[Dict]:
+# Optional GTFS feed (directory or zip) for routing offline instead of via the Routes API
+GTFS_FEED_PATH = "data/gtfs.zip"
+
+
+@st.cache_resource
+def get_gtfs_router(path: str) -> GTFSRouter:
+    """Load the GTFS feed at *path* into an offline router once per process."""
+    return GTFSRouter.load(path)
+
+
+@st.cache_resource
+def get_facility_index(path: str, _facilities_df: pd.DataFrame) -> FacilityIndex:
+    """Build the nearest-facility index for the facilities file once per process."""
+    return FacilityIndex(_facilities_df)
+
+
+def find_closest_facilities(
+    start_lat: float,
+    start_lon: float,
+    facilities_df: pd.DataFrame,
+    n: int = 5,
+    program_types: List[str] = None,
+    index: FacilityIndex = None,
+) -> pd.DataFrame:
+    """Find the N closest facilities to the starting point, optionally of the given program types."""
+    if index is None:
+        index = FacilityIndex(facilities_df)
+    return index.nearest(start_lat, start_lon, n, program_types=program_types)
+
+
+def get_route_metrics(legs: List[RouteLeg]) -> Dict:
+    """Calculate route metrics from transit route legs (precomputed while parsing)."""
+    return route_metrics(legs)
+
+
+def format_route_directions(legs: List[RouteLeg]) -> List[Dict]:
     """Format route directions into structured data for table display."""
     if not legs:
         return []
@@ -136,17 +180,15 @@ def format_route_directions(legs: List[Dict]) -> List[Dict]:
     steps_data = []
     step_num = 1
 
-    for leg_idx, leg in enumerate(legs):
-        for step in leg.get("steps", []):
-            travel_mode = step.get("travel_mode", "UNKNOWN")
-            distance = format_distance(step.get("distance_meters", 0))
-            duration = format_duration(step.get("duration", "0s"))
-            instructions = step.get("instructions", "")
+    for leg in legs:
+        for step in leg.steps:
+            distance = format_distance(step.distance_meters)
+            duration = format_duration(step.duration)
 
-            if travel_mode == "WALK":
+            if step.travel_mode == "WALK":
                 # Clean up HTML tags from instructions
                 clean_instructions = (
-                    instructions.replace("<b>", "")
+                    step.instructions.replace("<b>", "")
                     .replace("</b>", "")
                     .replace("<div>", " ")
                     .replace("</div>", "")
@@ -161,23 +203,11 @@ def format_route_directions(legs: List[Dict]) -> List[Dict]:
                         "Duration": duration,
                     }
                 )
-            elif travel_mode == "TRANSIT":
-                transit_details = step.get("transit_details", {})
-                line_info = transit_details.get("transit_line", {})
-                line_name = (
-                    line_info.get("nameShort") or line_info.get("name") or "Transit"
-                )
-
-                stop_details = transit_details.get("stop_details", {})
-                dep_stop = stop_details.get("departureStop", {}).get(
-                    "name", "Unknown Stop"
-                )
-                arr_stop = stop_details.get("arrivalStop", {}).get(
-                    "name", "Unknown Stop"
-                )
-
-                stop_count = transit_details.get("stop_count", "")
-                stop_text = f" ({stop_count} stops)" if stop_count else ""
+            elif step.is_transit:
+                line_name = step.line_name or "Transit"
+                dep_stop = step.departure_stop or "Unknown Stop"
+                arr_stop = step.arrival_stop or "Unknown Stop"
+                stop_text = f" ({step.stop_count} stops)" if step.stop_count else ""
 
                 instructions_text = (
                     f"Take {line_name} from {dep_stop} to {arr_stop}{stop_text}"
@@ -248,6 +278,7 @@ def main():
     facilities_df = load_facilities_data()
     if facilities_df is None:
         st.stop()
+    facility_index = get_facility_index(FACILITIES_PATH, facilities_df)
 
     # Create two-column layout for compact design
     left_col, right_col = st.columns([1, 2])
@@ -284,6 +315,38 @@ def main():
         )
         departure_time = departure_time_dt.strftime("%Y-%m-%d %H:%M:%S %Z")
 
+        routing_backend = None
+        if os.path.exists(GTFS_FEED_PATH):
+            routing_source = st.radio(
+                "Routing",
+                ["Google Maps", "Offline timetable"],
+                key="routing_source",
+                help="The offline timetable routes from the local GTFS feed without API calls.",
+            )
+            if routing_source == "Offline timetable":
+                routing_backend = get_gtfs_router(GTFS_FEED_PATH)
+
+        # Last-mile walk check from the precomputed stop table, before any routing
+        stop_index = get_facility_stop_index(FACILITY_STOPS_PATH, FACILITIES_PATH)
+        max_stop_walk_s = None
+        only_reachable = False
+        if stop_index is not None:
+            longest_walk_min = max(1, int(stop_index.max_walk_m / WALK_SPEED_MPS // 60))
+            max_stop_walk_s = 60 * st.slider(
+                "Max walk from a stop (minutes)",
+                min_value=1,
+                max_value=longest_walk_min,
+                value=min(DEFAULT_MAX_STOP_WALK_MIN, longest_walk_min),
+                key="max_stop_walk",
+                help="Facilities farther than this from every transit stop are not routed.",
+            )
+            only_reachable = st.checkbox(
+                "Only transit-reachable facilities",
+                value=True,
+                key="only_reachable",
+                help="Skip facilities without a stop in walking distance when picking the closest ones.",
+            )
+
     with left_col:
         # Location input
         st.markdown("#### Starting Location")
@@ -339,6 +402,9 @@ def main():
             "departure_time": departure_time,
             "selected_types": selected_types,
             "location_display": location_display,
+            "offline_routing": routing_backend is not None,
+            "max_stop_walk_s": max_stop_walk_s,
+            "only_reachable": only_reachable,
         }
 
         if st.session_state.search_params != current_params:
@@ -372,37 +438,98 @@ def main():
 
             with st.spinner("Finding closest facilities..."):
                 closest_facilities = find_closest_facilities(
-                    start_lat, start_lon, filtered_facilities, n_facilities
+                    start_lat,
+                    start_lon,
+                    facilities_df,
+                    len(facility_index) if only_reachable else n_facilities,
+                    program_types=selected_types,
+                    index=facility_index,
+                )
+                stop_walks = None
+                reachable = np.ones(len(closest_facilities), dtype=bool)
+                if stop_index is not None:
+                    stop_walks = stop_index.nearest_walk_s(
+                        facilities_df.index.get_indexer(closest_facilities.index)
+                    )
+                    reachable = stop_walks <= max_stop_walk_s
+                    if only_reachable:
+                        closest_facilities = closest_facilities[reachable].head(n_facilities)
+                        stop_walks = stop_walks[reachable][:n_facilities]
+                        reachable = reachable[reachable][:n_facilities]
+
+            if only_reachable and closest_facilities.empty:
+                st.info(
+                    f"No facility is within a {max_stop_walk_s // 60}-minute walk of a transit stop. "
+                    "Raise the walk limit or uncheck \"Only transit-reachable facilities\"."
                 )
+                return
 
             st.markdown("### Transit Routes")
             route_results = []
             route_details = {}
             progress_bar = st.progress(0)
 
+            route_cache = get_route_cache()
+            route_requests = []
+            request_rows = []
             for idx, (_, facility) in enumerate(closest_facilities.iterrows()):
-                progress_bar.progress((idx + 1) / len(closest_facilities))
+                # Facilities too far from any stop are not worth a route request
+                if not reachable[idx]:
+                    continue
+                request_rows.append(idx)
+                if routing_backend is not None:
+                    # The timetable is in local time, so the chosen departure is used as is
+                    route_requests.append(
+                        {
+                            "start_lat": start_lat,
+                            "start_lng": start_lon,
+                            "end_lat": facility["lat"],
+                            "end_lng": facility["lon"],
+                            "departure_time": departure_time_dt.strftime("%Y-%m-%d %H:%M:%S"),
+                            "backend": routing_backend,
+                        }
+                    )
+                elif start_address:
+                    route_requests.append(
+                        {
+                            "start_address": start_address,
+                            "end_address": f"{facility['Address']}, {facility['City']}",
+                            "departure_time": departure_time,
+                            "alternative_routes": False,
+                            "cache": route_cache,
+                        }
+                    )
+                else:
+                    route_requests.append(
+                        {
+                            "start_lat": start_lat,
+                            "start_lng": start_lon,
+                            "end_lat": facility["lat"],
+                            "end_lng": facility["lon"],
+                            "departure_time": departure_time,
+                            "alternative_routes": False,
+                            "cache": route_cache,
+                        }
+                    )
+
+            # Fetch every route concurrently; the bar fills as responses arrive. A rerun
+            # (e.g. Clear Results) stops the script at the next progress update,
+            # which cancels the requests still in flight.
+            with st.spinner(f"Finding routes to {len(route_requests)} facilities..."):
+                batch = get_transit_routes_batch(
+                    route_requests,
+                    max_concurrency=MAX_CONCURRENT_ROUTE_REQUESTS,
+                    progress=lambda done, total: progress_bar.progress(
+                        done / total, text=f"Routed {done} of {total} facilities"
+                    ),
+                )
+            fetched = dict(zip(request_rows, batch))
 
+            for idx, (_, facility) in enumerate(closest_facilities.iterrows()):
                 try:
-                    with st.spinner(f"Processing {facility['Facility']}..."):
-                        end_address = f"{facility['Address']}, {facility['City']}"
-
-                        if start_address:
-                            routes = get_transit_routes(
-                                start_address=start_address,
-                                end_address=end_address,
-                                departure_time=departure_time,
-                                alternative_routes=False,
-                            )
-                        else:
-                            routes = get_transit_routes(
-                                start_lat=start_lat,
-                                start_lng=start_lon,
-                                end_lat=facility["lat"],
-                                end_lng=facility["lon"],
-                                departure_time=departure_time,
-                                alternative_routes=False,
-                            )
+                    routes, error = fetched.get(idx, (None, None))
+                    if error is not None:
+                        raise error
 
                     if routes:
                         metrics = get_route_metrics(routes)
@@ -481,7 +608,20 @@ def main():
                         }
                     )
 
+            if stop_walks is not None:
+                for result, walk_s in zip(route_results, stop_walks):
+                    result["Transit Reachable"] = format_stop_walk(walk_s, max_stop_walk_s)
+
             progress_bar.empty()
+            if routing_backend is not None:
+                st.caption("Routed offline from the GTFS timetable")
+            else:
+                # The route cache is shared by every user of this server process
+                cache_stats = route_cache.stats()
+                st.caption(
+                    f"Route cache hit rate since server start: {cache_stats['hit_rate']:.0%} "
+                    f"({cache_stats['misses']} routes fetched from the API)"
+                )
             st.session_state.route_results = route_results
             st.session_state.route_details = route_details
             st.session_state.search_completed = True
@@ -531,6 +671,8 @@ def main():
                 "Walk Time",
                 "Travel Time",
             ]
+            if "Transit Reachable" in sorted_df:
+                display_cols.append("Transit Reachable")
 
             st.dataframe(
                 sorted_df[display_cols],
@@ -0,0 +1,117 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+GEOCODE_PATH = "/maps/api/geocode/json"
+
+
+class FakeMapsServer:
+    """Local HTTP stand-in for the Google Maps endpoints.
+
+    Register ``handlers[path] = fn(params, body) -> (status, payload)``; every
+    request is recorded in ``requests`` as ``(method, path, params, body)``.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with server._lock:
+                    server.requests.append((method, parsed.path, params, body))
+                handler = server.handlers.get(parsed.path)
+                status, payload = handler(params, body) if handler else (404, {})
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def fake_maps_server():
+    server = FakeMapsServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def fake_geocoder(fake_maps_server):
+    """The fake Maps server, answering geocode requests.
+
+    Each address geocodes to ``(len(address), -len(address))``, except that
+    "nowhere" is not found and "busy" is over quota on its first request.
+    Requests per address are counted in ``geocode_calls``.
+    """
+    calls = {}
+
+    def handle(params, body):
+        address = params["address"]
+        calls[address] = calls.get(address, 0) + 1
+        if address == "busy" and calls[address] == 1:
+            return 200, {"status": "OVER_QUERY_LIMIT", "results": []}
+        if address == "nowhere":
+            return 200, {"status": "ZERO_RESULTS", "results": []}
+        lat = float(len(address))
+        return 200, {
+            "status": "OK",
+            "results": [{"geometry": {"location": {"lat": lat, "lng": -lat}}}],
+        }
+
+    fake_maps_server.handlers[GEOCODE_PATH] = handle
+    fake_maps_server.geocode_calls = calls
+    return fake_maps_server
+
+
+@pytest.fixture
+def facilities():
+    """Four Forsyth County facilities; "Unmapped" has no coordinates."""
+    return pd.DataFrame(
+        {
+            "Facility": ["North", "Middle", "Unmapped", "South"],
+            "Program Type": ["PANTRY", "SHELTER", "PANTRY", "KITCHEN"],
+            "lat": [36.31, 36.19, np.nan, 36.09],
+            "lon": [-80.41, -80.29, np.nan, -80.19],
+        }
+    )
+
+
+@pytest.fixture
+def facilities_csv(tmp_path, facilities):
+    """The ``facilities`` frame written to a CSV file, as artifacts are hashed against."""
+    path = tmp_path / "facilities.csv"
+    facilities.to_csv(path, index=False)
+    return path
@@ -0,0 +1,143 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from accessibility import (
+    CheckpointMismatch,
+    attach_transit_access,
+    compute_transit_access,
+    read_transit_access_metadata,
+    transit_access_is_current,
+    write_transit_access,
+)
+from route_model import RouteLeg, RouteStep
+from transit import NoRoutesFound
+from utils import ACCESS_FACTOR_COLUMN, FactorColumns, ScoreCache, file_hash
+
+
+@pytest.fixture
+def tracts():
+    return pd.DataFrame(
+        {
+            "County": ["Forsyth County"] * 3,
+            "tract": ["1.00", "2.00", "3.00"],
+            "centroid_lat": [36.10, 36.20, 36.30],
+            "centroid_lon": [-80.20, -80.30, -80.40],
+            "pct_poverty": [10.0, 20.0, 30.0],
+        },
+        index=[5, 6, 7],
+    )
+
+
+def _legs(minutes):
+    walk = RouteStep(0, "WALK", 400, 300)
+    bus = RouteStep(1, "TRANSIT", 5000, minutes * 60 - 300)
+    return [RouteLeg(0, 0, 5400, minutes * 60, [walk, bus])]
+
+
+def test_transit_access_resumes_from_checkpoint(tmp_path, tracts, facilities):
+    checkpoint = tmp_path / "access.checkpoint.jsonl"
+    calls = []
+
+    def flaky(**kwargs):
+        calls.append(kwargs)
+        if kwargs["end_lat"] == 36.19 and kwargs["start_lat"] == 36.10:
+            raise NoRoutesFound("No routes found")
+        if kwargs["end_lat"] == 36.19 and kwargs["start_lat"] == 36.30:
+            raise TimeoutError("network down")
+        return _legs(round(kwargs["end_lat"] * 100) - 3600)
+
+    first = compute_transit_access(
+        tracts, facilities, k=2, checkpoint_path=str(checkpoint), fetch=flaky
+    )
+    assert len(calls) == 6
+    assert first["travel_time_s"].isna().sum() == 2
+    # Simulate a run killed mid-write
+    with checkpoint.open("a") as f:
+        f.write('{"County": "Forsyth')
+
+    calls.clear()
+    resumed = compute_transit_access(
+        tracts, facilities, k=2, checkpoint_path=str(checkpoint), fetch=flaky
+    )
+
+    # Only the transient failure is retried; the "no route" answer is kept
+    assert [(c["start_lat"], c["end_lat"]) for c in calls] == [(36.30, 36.19)]
+    assert resumed["travel_time_s"].isna().sum() == 2
+    assert resumed[["County", "tract", "rank", "facility"]].equals(
+        first[["County", "tract", "rank", "facility"]]
+    )
+    nearest = resumed[resumed["rank"] == 1].set_index("tract")
+    assert nearest.loc["2.00", "facility"] == 1
+    assert nearest.loc["2.00", "travel_time_s"] == 19 * 60
+    assert nearest.loc["2.00", "walk_time_s"] == 300
+
+
+def test_checkpoint_from_a_run_with_other_parameters_is_refused(tmp_path, tracts, facilities):
+    checkpoint = str(tmp_path / "access.checkpoint.jsonl")
+    compute_transit_access(
+        tracts,
+        facilities,
+        k=2,
+        departure_time="2025-03-05 10:00:00",
+        checkpoint_path=checkpoint,
+        checkpoint_params={"routing": "routes_api", "facilities_hash": "a"},
+        fetch=lambda **kw: _legs(10),
+    )
+
+    for k, departure, params in (
+        (3, "2025-03-05 10:00:00", {"routing": "routes_api", "facilities_hash": "a"}),
+        (2, "2025-03-06 10:00:00", {"routing": "routes_api", "facilities_hash": "a"}),
+        (2, "2025-03-05 10:00:00", {"routing": "gtfs:gtfs.zip", "facilities_hash": "a"}),
+        (2, "2025-03-05 10:00:00", {"routing": "routes_api", "facilities_hash": "b"}),
+    ):
+        with pytest.raises(CheckpointMismatch):
+            compute_transit_access(
+                tracts,
+                facilities,
+                k=k,
+                departure_time=departure,
+                checkpoint_path=checkpoint,
+                checkpoint_params=params,
+                fetch=lambda **kw: _legs(10),
+            )
+
+
+def test_transit_access_artifact_becomes_a_score_factor(tmp_path, tracts, facilities):
+    access = compute_transit_access(
+        tracts, facilities, k=2, fetch=lambda **kw: _legs(10 if kw["start_lat"] < 36.2 else 40)
+    )
+    access.loc[access["tract"] == "3.00", "travel_time_s"] = np.nan
+    path = tmp_path / "transit_access.parquet"
+    write_transit_access(access, str(path), {"k": 2})
+
+    tract = attach_transit_access(tracts, str(path))
+
+    assert read_transit_access_metadata(str(path)) == {"k": 2}
+    assert tract.index.tolist() == [5, 6, 7]
+    # Tracts with no reachable facility score as the worst observed access
+    assert tract[ACCESS_FACTOR_COLUMN].tolist() == [10.0, 40.0, 40.0]
+    factor_columns = FactorColumns(tract, ("pct_poverty", ACCESS_FACTOR_COLUMN))
+    assert ACCESS_FACTOR_COLUMN in factor_columns
+    cache = ScoreCache(factor_columns)
+    cache.factors({"pct_poverty": "pct_poverty", "access": ACCESS_FACTOR_COLUMN}, False)
+    np.testing.assert_allclose(cache.scores({"pct_poverty": 1.0, "access": 1.0}), [10.0, 30.0, 35.0])
+
+
+def test_artifact_from_other_facilities_is_not_current(
+    tmp_path, tracts, facilities, facilities_csv
+):
+    path = str(tmp_path / "transit_access.parquet")
+    access = compute_transit_access(tracts, facilities, k=1, fetch=lambda **kw: _legs(10))
+    write_transit_access(access, path, {"k": 1, "facilities_hash": file_hash(facilities_csv)})
+
+    assert transit_access_is_current(path, str(facilities_csv))
+    assert transit_access_is_current(path, str(tmp_path / "not_deployed.csv"))
+    facilities_csv.write_text("Facility,lat,lon\nMoved,36.0,-80.0\n")
+    assert not transit_access_is_current(path, str(facilities_csv))
@@ -0,0 +1,81 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from census.core import CensusException
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "data"))
+
+from cache import PersistentCache
+from census_data import fetch_acs_tables
+
+VARIABLES = {
+    "B08201": {"B08201_001E": "Total Households", "B08201_002E": "Total Households with No Vehicle Available"},
+    "B17020": {"B17020_001E": "Total Population"},
+}
+COUNTIES = {"Alamance County": "001", "Alexander County": "003", "Guilford County": "081"}
+
+
+class StubACS:
+    """Stands in for ``Census(...).acs5``: two tracts per county, optional failures."""
+
+    default_year = 2023
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, fields, geo):
+        fips = geo["in"].split("county:")[1]
+        with self._lock:
+            self.calls.append((fields[1].split("_")[0], fips))
+        if fips in self.failing:
+            raise CensusException("service unavailable")
+        county = {v: k for k, v in COUNTIES.items()}[fips]
+        return [
+            {
+                "NAME": f"Census Tract {tract}; {county}; North Carolina",
+                **{field: float(int(fips) + i) for i, field in enumerate(fields[1:])},
+                "state": "37",
+                "county": fips,
+                "tract": tract.replace(".", "").ljust(6, "0"),
+            }
+            for tract in ("201", "202.01")
+        ]
+
+
+class StubCensus:
+    def __init__(self, failing=()):
+        self.acs5 = StubACS(failing)
+
+
+def test_acs_fetch_resumes_from_cached_responses(tmp_path):
+    cache = PersistentCache(str(tmp_path / "census.sqlite"), namespace="census")
+    flaky = StubCensus(failing={"003"})
+
+    with pytest.raises(RuntimeError, match="003"):
+        fetch_acs_tables(flaky, VARIABLES, COUNTIES, cache=cache, max_retries=1, backoff_seconds=0)
+    # Each table's request for the failing county was retried once
+    assert sorted(flaky.acs5.calls).count(("B08201", "003")) == 2
+    assert len(flaky.acs5.calls) == 8
+
+    resumed = StubCensus()
+    progress = []
+    tables = fetch_acs_tables(
+        resumed, VARIABLES, COUNTIES, cache=cache, progress=lambda done, total: progress.append(done)
+    )
+
+    assert sorted(resumed.acs5.calls) == [("B08201", "003"), ("B17020", "003")]
+    assert progress == [4, 5, 6]
+    vehicle = tables["B08201"]
+    assert vehicle["County"].tolist() == [c for c in COUNTIES for _ in range(2)]
+    assert vehicle["tract"].tolist() == ["201", "202.01"] * 3
+    assert vehicle["Total Households"].tolist() == [1.0, 1.0, 3.0, 3.0, 81.0, 81.0]
+    assert tables["B17020"]["Total Population"].iat[-1] == 81.0
+
+    refreshed = StubCensus()
+    fetch_acs_tables(refreshed, VARIABLES, COUNTIES, cache=cache, refresh=True)
+    assert len(refreshed.acs5.calls) == 6
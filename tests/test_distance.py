@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from distance import (
+    haversine_distance,
+    haversine_matrix,
+    haversine_one_to_many,
+    haversine_pairwise,
+    iter_haversine_chunks,
+)
+
+
+def _points(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(33.8, 36.6, size=n), rng.uniform(-84.3, -75.5, size=n)
+
+
+def test_one_to_many_matches_scalar():
+    lats, lons = _points(50, 1)
+    expected = [haversine_distance(35.2, -80.8, lat, lon) for lat, lon in zip(lats, lons)]
+
+    np.testing.assert_allclose(haversine_one_to_many(35.2, -80.8, lats, lons), expected, rtol=1e-12)
+    np.testing.assert_allclose(
+        haversine_one_to_many(35.2, -80.8, lats, lons, dtype=np.float32), expected, rtol=1e-4
+    )
+    assert haversine_one_to_many(35.2, -80.8, lats, lons, dtype=np.float32).dtype == np.float32
+
+
+def test_scalar_points_give_a_scalar_distance():
+    expected = haversine_distance(35.0, -80.0, 36.0, -79.0)
+
+    assert np.ndim(haversine_pairwise(35.0, -80.0, 36.0, -79.0)) == 0
+    assert haversine_pairwise(35, -80, 36, -79) == pytest.approx(expected, rel=1e-12)
+    assert haversine_one_to_many(35, -80, 36, -79) == pytest.approx(expected, rel=1e-12)
+    np.testing.assert_allclose(
+        haversine_pairwise([35.0, 36.0], [-80.0, -79.0], [36.0, 36.0], [-79.0, -79.0]), [expected, 0.0]
+    )
+
+
+def test_matrix_chunked_matches_full():
+    lats1, lons1 = _points(23, 2)
+    lats2, lons2 = _points(11, 3)
+
+    full = haversine_matrix(lats1, lons1, lats2, lons2)
+    chunked = haversine_matrix(lats1, lons1, lats2, lons2, chunk_rows=5)
+
+    assert full.shape == (23, 11)
+    assert np.isclose(full[4, 7], haversine_distance(lats1[4], lons1[4], lats2[7], lons2[7]), rtol=1e-12)
+    np.testing.assert_array_equal(full, chunked)
+    assert [start for start, _ in iter_haversine_chunks(lats1, lons1, lats2, lons2, chunk_rows=10)] == [0, 10, 20]
+    assert haversine_matrix(lats1[:0], lons1[:0], lats2, lons2).shape == (0, 11)
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from distance import haversine_distance
+from facility_index import FacilityIndex
+from shnwnc_transit_tool import find_closest_facilities
+
+
+@pytest.fixture
+def many_facilities():
+    rng = np.random.default_rng(7)
+    n = 200
+    return pd.DataFrame(
+        {
+            "Facility": [f"Facility {i}" for i in range(n)],
+            "Program Type": rng.choice(["PANTRY", "SHELTER", "KITCHEN"], size=n),
+            "lat": rng.uniform(34.5, 36.5, size=n),
+            "lon": rng.uniform(-82.0, -79.0, size=n),
+        },
+        index=np.arange(1000, 1000 + n),
+    )
+
+
+def test_nearest_matches_scalar_haversine(many_facilities):
+    expected = many_facilities.assign(
+        distance_km=[
+            haversine_distance(35.6, -80.4, lat, lon)
+            for lat, lon in zip(many_facilities["lat"], many_facilities["lon"])
+        ]
+    ).nsmallest(7, "distance_km")
+
+    result = FacilityIndex(many_facilities).nearest(35.6, -80.4, k=7)
+
+    assert result.index.tolist() == expected.index.tolist()
+    np.testing.assert_allclose(result["distance_km"], expected["distance_km"], rtol=1e-9)
+
+
+def test_program_type_filter_and_radius(many_facilities):
+    many_facilities.loc[1003, ["lat", "lon"]] = np.nan
+    index = FacilityIndex(many_facilities)
+
+    shelters = index.nearest(35.6, -80.4, k=500, program_types=["SHELTER"])
+    assert len(shelters) == (many_facilities["Program Type"] == "SHELTER").sum() - (
+        many_facilities.loc[1003, "Program Type"] == "SHELTER"
+    )
+    assert (shelters["Program Type"] == "SHELTER").all()
+    assert shelters["distance_km"].is_monotonic_increasing
+    assert index.nearest(35.6, -80.4, k=3, program_types=["UNKNOWN"]).empty
+
+    nearby = index.within(35.6, -80.4, 40.0)
+    assert (nearby["distance_km"] <= 40.0).all()
+    assert len(nearby) == (index.nearest(35.6, -80.4, k=500)["distance_km"] <= 40.0).sum()
+
+
+def test_find_closest_facilities_without_prebuilt_index(many_facilities):
+    index = FacilityIndex(many_facilities)
+
+    result = find_closest_facilities(35.6, -80.4, many_facilities, n=4, program_types=["PANTRY"])
+
+    pd.testing.assert_frame_equal(
+        result, index.nearest(35.6, -80.4, k=4, program_types=["PANTRY"])
+    )
@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from distance import haversine_distance, walk_meters
+from facility_stops import (
+    FacilityStopIndex,
+    build_facility_stops,
+    write_facility_stops,
+)
+from utils import file_hash
+
+
+@pytest.fixture
+def stops():
+    # Two stops near North and two near South; none within a walk of Middle
+    return pd.DataFrame(
+        {
+            "stop_id": ["S1", "S2", "S3", "S4"],
+            "stop_name": ["Depot", "Elm St", "Market St", "Oak St"],
+            "stop_lat": [36.3105, 36.3160, 36.0920, 36.0855],
+            "stop_lon": [-80.4100, -80.4100, -80.1900, -80.1900],
+        }
+    )
+
+
+def test_facility_stop_table_lists_nearby_stops_nearest_first(facilities, stops):
+    table = build_facility_stops(facilities, stops, max_walk_m=1000)
+
+    assert table["facility"].tolist() == [0, 0, 3, 3]
+    assert table["stop_id"].astype(str).tolist() == ["S1", "S2", "S3", "S4"]
+    expected = walk_meters(haversine_distance(36.3100, -80.4100, 36.3105, -80.4100))
+    assert abs(table["walk_m"].iat[0] - expected) < 0.01
+    assert (np.diff(table["walk_s"].to_numpy()[:2]) > 0).all()
+
+
+def test_stop_index_flags_reachable_facilities_and_detects_stale_tables(
+    tmp_path, facilities, facilities_csv, stops
+):
+    table_path = str(tmp_path / "facility_stops.parquet")
+    write_facility_stops(
+        build_facility_stops(facilities, stops, max_walk_m=1000),
+        table_path,
+        {
+            "max_walk_m": 1000,
+            "n_facilities": 4,
+            "facilities_hash": file_hash(facilities_csv),
+        },
+    )
+
+    index = FacilityStopIndex.load(table_path, str(facilities_csv))
+    walks = index.nearest_walk_s([0, 1, 2, 3])
+    assert walks[0] < 120 < walks[3] < 600
+    assert np.isinf(walks[1]) and np.isinf(walks[2])
+    assert index.reachable([0, 1, 2, 3], 120).tolist() == [True, False, False, False]
+    assert index.reachable([0, 1, 2, 3], 600).tolist() == [True, False, False, True]
+
+    facilities_csv.write_text("Facility,lat,lon\nMoved,36.0,-80.0\n")
+    assert FacilityStopIndex.load(table_path, str(facilities_csv)) is None
@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import asyncio
+import time
+
+import geocoding
+from cache import MISSING
+from geocoding import (
+    BatchGeocoder,
+    GeocodeCache,
+    TokenBucket,
+    geocode_addresses,
+    geocode_addresses_async,
+    make_maps_client,
+)
+from maps_client import AsyncMapsClient, get_async_maps_client
+
+GEOCODE_PATH = "/maps/api/geocode/json"
+
+
+def test_batch_geocoder_retries_quota_errors_and_keeps_order(fake_geocoder):
+    client = make_maps_client("AIzaFakeKey", base_url=fake_geocoder.url)
+    geocoder = BatchGeocoder(
+        client, max_workers=4, queries_per_second=500, backoff_seconds=0.01
+    )
+    progress = []
+
+    results = geocoder.geocode(
+        ["a", "busy", "nowhere", "abcd"], progress=lambda done, total: progress.append(done)
+    )
+
+    assert results == [(1.0, -1.0), (4.0, -4.0), None, (4.0, -4.0)]
+    assert fake_geocoder.geocode_calls["busy"] == 2
+    assert progress == [1, 2, 3, 4]
+
+
+def test_batch_geocoder_gives_up_after_max_retries(fake_maps_server):
+    fake_maps_server.handlers[GEOCODE_PATH] = lambda params, body: (
+        200,
+        {"status": "OVER_QUERY_LIMIT", "results": []},
+    )
+    client = make_maps_client("AIzaFakeKey", base_url=fake_maps_server.url)
+    geocoder = BatchGeocoder(client, max_retries=2, queries_per_second=500, backoff_seconds=0.01)
+
+    assert geocoder.geocode(["x"]) == [None]
+    assert len(fake_maps_server.requests) == 3
+
+
+def test_server_errors_are_retried_only_by_the_batch_geocoder(fake_maps_server):
+    # googlemaps does not retry a 502 itself, so each request is one attempt
+    fake_maps_server.handlers[GEOCODE_PATH] = lambda params, body: (502, {})
+    client = make_maps_client("AIzaFakeKey", base_url=fake_maps_server.url)
+    geocoder = BatchGeocoder(client, max_retries=1, queries_per_second=500, backoff_seconds=0.01)
+
+    assert geocoder.geocode(["x"]) == [None]
+    assert len(fake_maps_server.requests) == 2
+
+
+def test_batch_geocoder_uses_persistent_cache(fake_geocoder, tmp_path):
+    client = make_maps_client("AIzaFakeKey", base_url=fake_geocoder.url)
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    geocoder = BatchGeocoder(client, queries_per_second=500, cache=cache)
+
+    first = geocoder.geocode(["ab", "nowhere", "xyz"], keys=["ab", "nowhere", None])
+    second = geocoder.geocode(["ab", "nowhere", "xyz"], keys=["ab", "nowhere", None])
+
+    assert first == second == [(2.0, -2.0), None, (3.0, -3.0)]
+    assert fake_geocoder.geocode_calls == {"ab": 1, "nowhere": 1, "xyz": 2}
+    assert cache.hits == 2
+
+    reopened = GeocodeCache(str(tmp_path / "geocode.sqlite"), negative_ttl=0)
+    assert reopened.get("ab") == (2.0, -2.0)
+    reopened.set("nowhere", None)
+    assert reopened.get("nowhere") is MISSING
+
+
+def test_async_geocoding_matches_batch_geocoder_on_a_shared_session(
+    monkeypatch, fake_geocoder, tmp_path
+):
+    monkeypatch.setattr(geocoding, "GEOCODE_URL", fake_geocoder.url + GEOCODE_PATH)
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    addresses = ["a", "busy", "nowhere", "abcd"]
+    progress = []
+
+    results = geocode_addresses(
+        addresses,
+        keys=addresses,
+        cache=cache,
+        progress=lambda done, total: progress.append(done),
+        api_key="AIzaFakeKey",
+    )
+    session = get_async_maps_client("AIzaFakeKey").session
+    again = geocode_addresses(["a", "abcdef"], api_key="AIzaFakeKey")
+
+    assert results == [(1.0, -1.0), (4.0, -4.0), None, (4.0, -4.0)]
+    assert again == [(1.0, -1.0), (6.0, -6.0)]
+    assert fake_geocoder.geocode_calls == {"a": 2, "busy": 2, "nowhere": 1, "abcd": 1, "abcdef": 1}
+    assert progress == [1, 2, 3, 4]
+    assert fake_geocoder.requests[0][2]["key"] == "AIzaFakeKey"
+    # Batches share one open session
+    assert get_async_maps_client("AIzaFakeKey").session is session
+    assert not session.closed
+
+
+def test_async_geocoding_is_rate_limited(monkeypatch, fake_geocoder):
+    monkeypatch.setattr(geocoding, "GEOCODE_URL", fake_geocoder.url + GEOCODE_PATH)
+
+    async def run():
+        async with AsyncMapsClient("AIzaFakeKey", max_concurrency=8) as client:
+            return await geocode_addresses_async(
+                client, ["a", "bb", "ccc", "dddd", "eeeee"], rate_limiter=TokenBucket(20, 1)
+            )
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+
+    assert results == [(float(n), -float(n)) for n in range(1, 6)]
+    # One token up front, then one every 50 ms
+    assert time.monotonic() - started >= 0.2
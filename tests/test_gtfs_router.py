@@ -0,0 +1,125 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from gtfs_router import GTFSRouter
+from route_model import route_metrics
+from transit import NoRoutesFound, get_transit_routes, get_walking_summary
+
+FEED = {
+    "stops": [
+        "stop_id,stop_name,stop_lat,stop_lon",
+        "S1,Depot,36.0700,-79.7900",
+        "S2,Elm St,36.0800,-79.7900",
+        "S3,Elm St Transfer,36.0810,-79.7900",
+        "S4,Market St,36.1000,-79.7900",
+    ],
+    "routes": [
+        "route_id,route_short_name,route_long_name",
+        "A,7,Depot - Elm",
+        "B,,Elm Crosstown",
+        "C,11,Depot - Market Local",
+    ],
+    "trips": [
+        "route_id,service_id,trip_id,trip_headsign",
+        "A,WEEKDAY,A1,Elm St",
+        "B,WEEKDAY,B1,Market St",
+        "C,WEEKDAY,C1,Market St",
+        "C,WEEKEND,C2,Market St",
+    ],
+    "stop_times": [
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence",
+        "A1,08:05:00,08:05:00,S1,1",
+        "A1,08:15:00,08:15:00,S2,2",
+        "B1,08:20:00,08:20:00,S3,1",
+        "B1,08:35:00,08:35:00,S4,2",
+        "C1,08:10:00,08:10:00,S1,1",
+        "C1,08:30:00,08:30:00,S2,2",
+        "C1,09:00:00,09:00:00,S4,3",
+        "C2,08:01:00,08:01:00,S1,1",
+        "C2,08:10:00,08:10:00,S2,2",
+        "C2,08:20:00,08:20:00,S4,3",
+    ],
+    "calendar": [
+        "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date",
+        "WEEKDAY,1,1,1,1,1,0,0,20250101,20251231",
+        "WEEKEND,0,0,0,0,0,1,1,20250101,20251231",
+    ],
+    "calendar_dates": [
+        "service_id,date,exception_type",
+        "WEEKEND,20250305,1",
+    ],
+}
+
+ORIGIN = (36.0695, -79.7900)
+DESTINATION = (36.1005, -79.7900)
+
+
+@pytest.fixture
+def router(tmp_path):
+    for name, lines in FEED.items():
+        (tmp_path / f"{name}.txt").write_text("\n".join(lines) + "\n")
+    return GTFSRouter.load(str(tmp_path))
+
+
+def test_earliest_arrival_transfers_on_foot_between_stops(router):
+    legs = router.routes(*ORIGIN, *DESTINATION, datetime(2025, 3, 4, 8, 0))
+
+    steps = legs[0].steps
+    assert [step.travel_mode for step in steps] == ["WALK", "TRANSIT", "WALK", "TRANSIT", "WALK"]
+    assert [step.line_name for step in steps if step.is_transit] == ["7", "Elm Crosstown"]
+    assert steps[1].departure_stop == "Depot" and steps[3].arrival_stop == "Market St"
+    assert steps[3].departure_time == "2025-03-04T08:20:00"
+    assert [step.step_index for step in steps] == list(range(5))
+    # Arrival at 08:35 plus the walk from the last stop, counted from 08:00
+    metrics = route_metrics(legs)
+    assert metrics["total_duration_s"] == 35 * 60 + steps[-1].duration_s
+    assert len(get_walking_summary(legs)) == 3
+    assert 1000 < steps[1].distance_meters < 1200
+
+
+def test_calendar_selects_the_services_running_that_day(router):
+    saturday = router.routes(*ORIGIN, *DESTINATION, datetime(2025, 3, 8, 8, 0))
+    # calendar_dates adds the weekend service on this Wednesday
+    added = router.routes(*ORIGIN, *DESTINATION, datetime(2025, 3, 5, 8, 0))
+
+    for legs in (saturday, added):
+        rides = [step for step in legs[0].steps if step.is_transit]
+        assert [(ride.line_name, ride.stop_count) for ride in rides] == [("11", 2)]
+        assert rides[0].arrival_time.endswith("T08:20:00")
+
+
+def test_routes_from_many_threads_share_the_day_cache(router):
+    # More distinct days than the cache holds, so threads evict each other's days
+    departures = [datetime(2025, 3, 3, 8, 0) + timedelta(days=d) for d in range(12)] * 4
+    expected = {
+        departure.date(): route_metrics(router.routes(*ORIGIN, *DESTINATION, departure))
+        for departure in departures[:12]
+    }
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(
+            pool.map(lambda departure: router.routes(*ORIGIN, *DESTINATION, departure), departures)
+        )
+
+    for departure, legs in zip(departures, results):
+        assert route_metrics(legs) == expected[departure.date()]
+
+
+def test_get_transit_routes_uses_the_backend(router, monkeypatch):
+    monkeypatch.delenv("MAPS_API_KEY", raising=False)
+
+    legs = get_transit_routes(
+        *ORIGIN, *DESTINATION, departure_time="2025-03-04 08:00:00", backend=router
+    )
+    assert sum(step.is_transit for step in legs[0].steps) == 2
+
+    with pytest.raises(NoRoutesFound):
+        get_transit_routes(36.5, -80.5, *DESTINATION, backend=router)
+    with pytest.raises(ValueError):
+        get_transit_routes(start_address="1 Start Pl", end_address="2 End St", backend=router)
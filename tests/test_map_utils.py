@@ -1,11 +1,30 @@
 import sys
 from pathlib import Path
 
+import geopandas as gpd
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
+import pytest
+from streamlit.proto.Common_pb2 import FileURLs as FileURLsProto
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+from shapely.geometry import Polygon
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from map_utils import build_address_key, process_coordinates, _clean_text
+import map_utils
+from geocoding import GeocodeCache, make_maps_client
+from uploads import UploadRegistry
+from utils import add_tract_extents
+from map_utils import (
+    aggregate_program_locations,
+    build_address_key,
+    build_address_keys,
+    process_coordinates,
+    tract_geojson,
+    _clean_text,
+    _simplify_tolerance,
+)
 
 
 def test_process_coordinates_trims_column_whitespace(tmp_path):
@@ -59,3 +78,299 @@ def test_build_address_key_uses_cleaned_components():
     )
 
     assert build_address_key(row_a) == build_address_key(row_b)
+
+
+def test_tract_geojson_quantizes_and_keeps_index_ids():
+    geometry = gpd.GeoSeries(
+        [Polygon([(0.1234567, 0), (1, 0), (1, 1), (0, 1)])], index=[42]
+    )
+    df = gpd.GeoDataFrame({"tract": ["1.00"]}, geometry=geometry, index=[42])
+
+    geojson = tract_geojson(df, {"zoom": 8, "coordinate_precision": 3})
+
+    (feature,) = geojson["features"]
+    assert feature["id"] == "42"
+    assert feature["geometry"]["coordinates"][0][0] == [0.123, 0.0]
+    assert _simplify_tolerance({"zoom": 9, "simplify_tolerances": {"0": 0.1, "8": 0.01, "10": 0}}) == 0.01
+
+
+def test_tract_geojson_simplifies_shared_borders_without_gaps():
+    border = [(1 + 0.01 * (i % 2), i / 10) for i in range(11)]
+    geometry = gpd.GeoSeries(
+        [
+            Polygon([(0, 0), *border, (0, 1)]),
+            Polygon([*border, (2, 1), (2, 0)]),
+        ],
+        index=[1, 2],
+    )
+    df = gpd.GeoDataFrame({"tract": ["1.00", "2.00"]}, geometry=geometry, index=[1, 2])
+
+    geojson = tract_geojson(df, {"zoom": 0, "simplify_tolerances": {"0": 0.05}})
+
+    simplified = gpd.GeoDataFrame.from_features(geojson["features"]).geometry
+    assert simplified.count_coordinates().sum() < geometry.count_coordinates().sum()
+    assert simplified.union_all().area == pytest.approx(simplified.area.sum())
+    assert simplified.union_all().area == pytest.approx(2.0)
+
+
+def test_base_map_centers_on_precomputed_centroids():
+    geometry = gpd.GeoSeries(
+        [
+            Polygon([(-80.0, 35.0), (-79.9, 35.0), (-79.9, 35.1), (-80.0, 35.1)]),
+            Polygon([(-79.5, 36.0), (-79.3, 36.0), (-79.3, 36.3), (-79.5, 36.3)]),
+        ],
+        index=[61, 62],
+        crs="EPSG:4326",
+    )
+    df = gpd.GeoDataFrame(
+        {"tract": ["101.00", "102.00"], "County": ["Alamance County"] * 2, "combined_pct": [10.0, 20.0]},
+        geometry=geometry,
+        index=geometry.index,
+    )
+    config = {
+        "map_display": {"height": 600, "map_style": "carto-positron", "zoom": 8, "opacity": 0.5},
+        "scale_max": 100,
+    }
+
+    with_extents = add_tract_extents(df)
+    _, reprojected = map_utils._prepare_base_map(df, "combined_pct", config)
+    _, precomputed = map_utils._prepare_base_map(with_extents, "combined_pct", config)
+
+    pd.testing.assert_series_equal(precomputed.x, reprojected.x)
+    pd.testing.assert_series_equal(precomputed.y, reprojected.y)
+    assert with_extents[["min_lon", "max_lat"]].loc[62].tolist() == pytest.approx([-79.5, 36.3])
+
+
+def _row_hovertext(row):
+    """The row-wise hover text map_hovertext replaced, kept as a reference."""
+    s = f"<b>Census Tract {row['tract']}</b><br>"
+    s += f"<i>{row['County']}</i><br>"
+    s += "-------------------<br>"
+    s += f"<b style='color:#00FFFF'>Combined Score:</b> {row['combined_pct']:.2f}<br>"
+    if any(row.get(col, 0) > 0 for col in ["pct_poverty", "pct_food_insecure", "pct_vehicle"]):
+        s += "<br>"
+        if row.get("pct_poverty", 0) > 0:
+            s += f"<b style='color:#FFFF00'>Poverty:</b> {row['pct_poverty']:.2f}<br>"
+        if row.get("pct_food_insecure", 0) > 0:
+            s += f"<b style='color:#FFFF00'>Food Insecurity:</b> {row['pct_food_insecure']:.2f}<br>"
+        if row.get("pct_vehicle", 0) > 0:
+            s += f"<b style='color:#FFFF00'>Lack of Vehicles:</b> {row['pct_vehicle']:.2f}"
+    return s
+
+
+def test_map_hovertext_matches_row_wise_hover_text():
+    df = pd.DataFrame(
+        {
+            "tract": ["101.00", "102.01", "103.00", "104.00"],
+            "County": ["Alamance County", "Guilford County", "Guilford County", "Rowan County"],
+            "combined_pct": [12.345, 0.0, 7.5, 3.0],
+            "pct_poverty": [20.0, 0.0, np.nan, 4.25],
+            "pct_food_insecure": [np.nan, 0.0, 15.0, 0.0],
+            "pct_vehicle": [5.5, np.nan, 0.0, 8.0],
+        },
+        index=[71, 72, 73, 74],
+    )
+
+    expected = [_row_hovertext(row) for _, row in df.iterrows()]
+    assert map_utils.map_hovertext(df).tolist() == expected
+    # Factors missing from the frame are skipped like zero values
+    partial = df.drop(columns="pct_food_insecure").rename(index=lambda i: i + 10)
+    expected = [_row_hovertext(row) for _, row in partial.iterrows()]
+    assert map_utils.map_hovertext(partial).tolist() == expected
+
+
+@pytest.fixture
+def upload_geocoder(tmp_path, monkeypatch, fake_geocoder):
+    """Point upload geocoding at the fake geocoder, with a fresh cache."""
+    monkeypatch.setattr(map_utils.st, "secrets", {"MAPS_API_KEY": "AIzaFakeKey"})
+    monkeypatch.setattr(
+        map_utils,
+        "make_maps_client",
+        lambda key: make_maps_client(key, base_url=fake_geocoder.url),
+    )
+    monkeypatch.setattr(
+        map_utils, "get_geocode_cache", lambda: GeocodeCache(str(tmp_path / "geocode.sqlite"))
+    )
+    return fake_geocoder
+
+
+def test_process_coordinates_geocodes_each_address_once(tmp_path, upload_geocoder):
+    csv_content = (
+        "Address,City,Zip\n"
+        "1 Dedupe Way,Greensboro,27401\n"
+        "1  dedupe way ,Greensboro,27401\n"
+        "9 Other Rd,Greensboro,27401\n"
+    )
+    file_path = tmp_path / "households.csv"
+    file_path.write_text(csv_content)
+
+    progress = []
+    with file_path.open("r") as uploaded_file:
+        df = process_coordinates(uploaded_file, progress=lambda *update: progress.append(update))
+
+    assert len(upload_geocoder.requests) == 2
+    assert df["lat"].tolist()[0] == df["lat"].tolist()[1]
+    assert df["lat"].notna().all()
+    assert progress[0] == (0.0, "Geocoding addresses...")
+    assert df.attrs["geocode_summary"] == {"geocoded": 2, "duplicates": 1, "cache_hits": 0}
+
+
+@pytest.mark.parametrize("header", ["lat,lon,Program Type", "Address,City,Zip"])
+def test_process_coordinates_returns_empty_frame_for_header_only_upload(
+    tmp_path, monkeypatch, header
+):
+    # Nothing needs geocoding, so no Maps client (or API key) is required
+    monkeypatch.setattr(map_utils.st, "secrets", {})
+    file_path = tmp_path / "empty.csv"
+    file_path.write_text(header + "\n")
+
+    with file_path.open("r") as uploaded_file:
+        df = process_coordinates(uploaded_file)
+
+    assert df.empty
+    assert {"lat", "lon", "source_file"}.issubset(df.columns)
+
+
+def test_process_coordinates_streams_chunks_and_dedupes_across_them(tmp_path, upload_geocoder):
+    rows = [
+        ("1 Dedupe Way", "Greensboro", "27401", "Pantry"),
+        ("9 Other Rd", "Greensboro", "27401", ""),
+        ("1 DEDUPE WAY", "Greensboro", "27401", "Client"),
+        ("9 Other Rd", "Greensboro", "27401", "Pantry"),
+        ("22 Third St", "Greensboro", "27401", "Pantry"),
+    ]
+    file_path = tmp_path / "households.xlsx"
+    pd.DataFrame(
+        rows, columns=[" address ", "CITY", "Zip", "Program Type"]
+    ).assign(Notes="unused").to_excel(file_path, index=False)
+
+    with file_path.open("rb") as uploaded_file:
+        df = process_coordinates(uploaded_file, chunksize=2)
+
+    assert len(upload_geocoder.requests) == 3
+    assert len(df) == 5
+    assert "Notes" not in df.columns
+    assert df["lat"].tolist()[0] == df["lat"].tolist()[2]
+    assert df["Program Type"].tolist()[1] == "Client"
+    assert df["source_file"].eq(uploaded_file.name).all()
+
+
+def test_build_address_keys_matches_row_wise_keys():
+    df = pd.DataFrame(
+        {
+            "Address": ["123   Main St", None, None, "9 Elm"],
+            "City": ["  Charlotte ", None, "Greensboro", "   "],
+            "Zip": ["28202", None, None, "27401"],
+            "lat": [35.0, 35.25, None, 36.0],
+            "lon": [-80.0, -80.5, None, -79.0],
+        }
+    )
+
+    expected = [build_address_key(row) for _, row in df.iterrows()]
+
+    assert build_address_keys(df).tolist() == expected
+
+
+def test_aggregate_program_locations_groups_by_address():
+    df = pd.DataFrame(
+        {
+            "Address": ["1 Main St", "1  main st", "5 Oak Ave"],
+            "City": ["Burlington", "Burlington", "Graham"],
+            "Facility": ["Pantry A", None, "Shelter B"],
+            "Program Type": ["PANTRY", "MEAL", "SHELTER"],
+            "lat": [36.0, 36.2, 35.0],
+            "lon": [-79.0, -79.2, -80.0],
+        }
+    )
+
+    aggregated = aggregate_program_locations(df)
+
+    assert len(aggregated) == 2
+    first = aggregated.iloc[0]
+    assert first["lat"] == pytest.approx(36.1)
+    assert first["program_types"] == ["MEAL", "PANTRY"]
+    assert first["hover"] == (
+        "<b>1 Main St</b><br>Burlington<br><br><b>Programs (2):</b><br>"
+        " - <b>Pantry A</b> — PANTRY<br> - <b>(36.2000, -79.2000)</b> — MEAL"
+    )
+
+
+def test_upload_layer_is_reused_until_uploads_or_filters_change(monkeypatch):
+    calls = []
+    original = map_utils._build_upload_layer
+
+    def counting_build(*args):
+        calls.append(args[1])
+        return original(*args)
+
+    monkeypatch.setattr(map_utils, "_build_upload_layer", counting_build)
+    uploads = pd.DataFrame(
+        {
+            "Address": ["1 Main St", "5 Oak Ave"],
+            "City": ["Burlington", "Graham"],
+            "Program Type": ["PANTRY", "SHELTER"],
+            "lat": [36.0, 35.0],
+            "lon": [-79.0, -80.0],
+            "source_file": ["programs.csv", "programs.csv"],
+        }
+    )
+    registry = UploadRegistry()
+    registry.add("programs", uploads)
+    map_utils.st.session_state["upload_registry"] = registry
+    map_utils.st.session_state["client_coordinates"] = None
+    config = {
+        "program_filters": [],
+        "program_marker": {"size": 8, "opacity": 0.5},
+        "client_marker": {"color": "#006af5"},
+    }
+
+    map_utils._map_uploaded_addresses(go.Figure(), config)
+    config["program_marker"]["opacity"] = 0.9
+    fig = map_utils._map_uploaded_addresses(go.Figure(), config)
+    assert calls == [[]]
+    assert fig.data[0].marker.opacity == 0.9
+
+    config["program_filters"] = ["PANTRY"]
+    fig = map_utils._map_uploaded_addresses(go.Figure(), config)
+    assert calls == [[], ["PANTRY"]]
+    assert len(fig.data[0].lat) == 1
+
+    registry.add("more", uploads.assign(lat=[36.5, 35.5], source_file="more.csv"))
+    fig = map_utils._map_uploaded_addresses(go.Figure(), config)
+    assert calls == [[], ["PANTRY"], ["PANTRY"]]
+    assert len(map_utils.st.session_state["mapped_addresses_filtered"]) == 2
+
+
+def _upload(name, content, file_id):
+    record = UploadedFileRec(file_id=file_id, name=name, type="text/csv", data=content.encode())
+    return UploadedFile(record, FileURLsProto())
+
+
+def test_uploads_are_identified_by_content(monkeypatch):
+    processed = []
+    original = map_utils.process_coordinates
+
+    def counting_process(uploaded_file, **kwargs):
+        processed.append(uploaded_file.file_id)
+        return original(uploaded_file, **kwargs)
+
+    monkeypatch.setattr(map_utils, "process_coordinates", counting_process)
+    map_utils.st.session_state["upload_registry"] = UploadRegistry()
+    config = {"program_filters": [], "program_marker": {}, "client_marker": {}}
+
+    for file_id, content in (
+        ("a", "lat,lon,Program Type\n35.5,-80.5,PANTRY\n"),
+        ("b", "lat,lon,Program Type\n35.5,-80.5,PANTRY\n"),  # unchanged re-upload
+        ("c", "lat,lon,Program Type\n36.5,-79.5,SHELTER\n"),  # same name, new content
+    ):
+        map_utils.st.session_state["client_coordinates"] = _upload("sites.csv", content, file_id)
+        map_utils._map_uploaded_addresses(go.Figure(), config)
+
+    registry = map_utils.st.session_state["upload_registry"]
+    assert processed == ["a", "c"]
+    assert len(registry) == 2
+
+    assert map_utils.remove_uploaded_file(registry.digests_for_name("sites.csv")[0])
+    assert len(registry) == 1
+    assert map_utils.remove_uploaded_file("sites.csv")
+    assert len(registry) == 0
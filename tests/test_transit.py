@@ -0,0 +1,281 @@
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import transit
+from cache import MISSING
+from maps_client import AsyncMapsClient, MapsClient, get_async_maps_client
+from route_cache import RouteCache, departure_bucket
+from route_model import RouteLeg, parse_routes
+from transit import (
+    get_transit_routes,
+    get_transit_routes_batch,
+    get_walking_summary,
+    run_transit_routes,
+)
+
+ROUTES_PATH = "/directions/v2:computeRoutes"
+
+
+def _route_payload(seconds):
+    step = {
+        "travelMode": "WALK",
+        "distanceMeters": 400,
+        "staticDuration": f"{seconds}s",
+        "navigationInstruction": {"instructions": "Walk north"},
+    }
+    return {
+        "routes": [
+            {
+                "legs": [
+                    {"distanceMeters": 400, "duration": f"{seconds}s", "steps": [step]}
+                ]
+            }
+        ]
+    }
+
+
+def test_batch_routes_run_concurrently_and_isolate_errors(monkeypatch, fake_maps_server):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def handle(params, body):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.2)
+        with lock:
+            in_flight -= 1
+        destination = body["destination"]["address"]
+        if destination == "Broken Rd":
+            return 500, {"error": {"message": "backend failure"}}
+        return 200, _route_payload(len(destination))
+
+    fake_maps_server.handlers[ROUTES_PATH] = handle
+    monkeypatch.setattr(transit, "ROUTES_URL", fake_maps_server.url + ROUTES_PATH)
+    client = AsyncMapsClient("AIzaFakeKey", max_retries=0, max_concurrency=3)
+    destinations = ["A St", "Broken Rd", "Main Street", "Elm", "Oak Avenue", "Pine"]
+    route_requests = [
+        {"start_address": "1 Start Pl", "end_address": address} for address in destinations
+    ]
+    progress = []
+
+    started = time.monotonic()
+    results = get_transit_routes_batch(
+        route_requests,
+        max_concurrency=3,
+        progress=lambda done, total: progress.append((done, total)),
+        client=client,
+    )
+    elapsed = time.monotonic() - started
+
+    assert peak == 3
+    assert elapsed < 0.2 * len(destinations) * 0.75
+    assert progress == [(done, 6) for done in range(1, 7)]
+    legs, error = results[1]
+    assert legs is None and "500" in str(error)
+    for address, (legs, error) in zip(destinations, results):
+        if address != "Broken Rd":
+            assert error is None
+            assert legs[0].duration_s == len(address)
+
+
+def test_stopping_a_batch_cancels_requests_in_flight(monkeypatch, fake_maps_server):
+    def handle(params, body):
+        if body["destination"]["address"] != "Fast Ln":
+            time.sleep(1.0)
+        return 200, _route_payload(60)
+
+    fake_maps_server.handlers[ROUTES_PATH] = handle
+    monkeypatch.setattr(transit, "ROUTES_URL", fake_maps_server.url + ROUTES_PATH)
+    received = []
+
+    def clear_results(idx, legs, error):
+        # Streamlit stops a running script by raising from its next st call
+        received.append(idx)
+        raise RuntimeError("results cleared")
+
+    route_requests = [
+        {"start_address": "1 Start Pl", "end_address": address}
+        for address in ["Slow St", "Fast Ln", "Slow Ave", "Slow Ct"]
+    ]
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        run_transit_routes(
+            route_requests, clear_results, client=AsyncMapsClient("AIzaFakeKey", max_retries=0)
+        )
+
+    assert received == [1]
+    assert time.monotonic() - started < 0.8
+
+
+def test_route_batches_share_one_client_session(monkeypatch, fake_maps_server):
+    fake_maps_server.handlers[ROUTES_PATH] = lambda params, body: (200, _route_payload(60))
+    monkeypatch.setattr(transit, "ROUTES_URL", fake_maps_server.url + ROUTES_PATH)
+    monkeypatch.setenv("MAPS_API_KEY", "AIzaSharedKey")
+    route_requests = [{"start_address": "1 Start Pl", "end_address": "2 End St"}]
+
+    first = get_transit_routes_batch(route_requests, max_concurrency=2)
+    session = get_async_maps_client(max_concurrency=2).session
+    second = get_transit_routes_batch(route_requests, max_concurrency=2)
+
+    assert first[0][0][0].duration_s == second[0][0][0].duration_s == 60
+    assert len(fake_maps_server.requests) == 2
+    assert get_async_maps_client(max_concurrency=2).session is session
+    assert not session.closed
+
+
+class _Router:
+    def routes(self, start_lat, start_lng, end_lat, end_lng, departure, alternative_routes=False):
+        return [RouteLeg(0, 0, 100, int(end_lat) * 60, [])]
+
+
+def test_offline_route_batches_need_no_api_key(monkeypatch):
+    monkeypatch.delenv("MAPS_API_KEY", raising=False)
+    router = _Router()
+    route_requests = [
+        {"start_lat": 36.0, "start_lng": -79.0, "end_lat": lat, "end_lng": -79.5, "backend": router}
+        for lat in (35.0, 37.0)
+    ]
+
+    results = get_transit_routes_batch(route_requests)
+
+    assert [legs[0].duration_s for legs, error in results] == [35 * 60, 37 * 60]
+
+
+def test_maps_client_retries_server_errors_and_sends_key(monkeypatch, fake_maps_server):
+    attempts = []
+
+    def handle(params, body):
+        attempts.append(body)
+        if len(attempts) == 1:
+            return 503, {"error": {"message": "try again"}}
+        return 200, _route_payload(60)
+
+    fake_maps_server.handlers[ROUTES_PATH] = handle
+    monkeypatch.setattr(transit, "ROUTES_URL", fake_maps_server.url + ROUTES_PATH)
+    client = MapsClient("AIzaFakeKey", max_retries=2, backoff_factor=0)
+    sent_headers = []
+    monkeypatch.setattr(
+        client.session, "post", _recording(client.session.post, sent_headers)
+    )
+
+    legs = get_transit_routes(start_address="1 Start Pl", end_address="2 End St", client=client)
+
+    assert len(attempts) == 2
+    assert legs[0].duration_s == 60
+    assert sent_headers[0]["X-Goog-Api-Key"] == "AIzaFakeKey"
+
+
+def _recording(post, sent_headers):
+    def wrapper(url, **kwargs):
+        sent_headers.append(kwargs["headers"])
+        return post(url, **kwargs)
+
+    return wrapper
+
+
+def test_route_cache_answers_repeat_requests_in_same_departure_slot(
+    tmp_path, monkeypatch, fake_maps_server
+):
+    fake_maps_server.handlers[ROUTES_PATH] = lambda params, body: (200, _route_payload(300))
+    monkeypatch.setattr(transit, "ROUTES_URL", fake_maps_server.url + ROUTES_PATH)
+    client = MapsClient("AIzaFakeKey", max_retries=0)
+    path = str(tmp_path / "routes.sqlite")
+    cache = RouteCache(path, max_entries=1)
+
+    def fetch(**kwargs):
+        return get_transit_routes(client=client, cache=cache, **kwargs)
+
+    first = fetch(
+        start_address="1 Start Pl", end_address="2 End St", departure_time="2024-05-01 09:47:10"
+    )
+    repeat = fetch(
+        start_address=" 1 start  pl", end_address="2 END ST", departure_time="2024-05-01 09:59:00"
+    )
+    coordinates = {"start_lng": -80.5, "end_lat": 35.2, "end_lng": -80.6}
+    fetch(start_lat=35.12341, departure_time="2024-05-01 09:47:10", **coordinates)
+    fetch(start_lat=35.12344, departure_time="2024-05-01 09:50:00", **coordinates)
+    # The next departure slot is fetched again
+    fetch(start_address="1 Start Pl", end_address="2 End St", departure_time="2024-05-01 10:00:00")
+
+    assert repeat == first
+    assert len(fake_maps_server.requests) == 3
+    assert cache.stats()["memory_hits"] == 2
+    assert cache.stats()["entries"] == 1
+
+    # A fresh process reads the same routes back from SQLite
+    reloaded = RouteCache(path)
+    key = reloaded.key(
+        datetime(2024, 5, 1, 9, 45),
+        transit.route_cache_preferences(False),
+        start_address="1 Start Pl",
+        end_address="2 End St",
+    )
+    assert [RouteLeg.from_json(leg) for leg in reloaded.get(key)] == first
+    assert reloaded.stats()["disk_hits"] == 1
+    assert reloaded.stats()["hit_rate"] == 1.0
+
+
+def test_route_cache_expires_and_evicts():
+    cache = RouteCache(None, max_entries=2, ttl=60)
+    cache.set("a", [1])
+    cache.set("b", [2])
+    assert cache.get("a") == [1]
+    cache.set("c", [3])
+    assert cache.get("b") is MISSING
+    expired = RouteCache(None, ttl=0)
+    expired.set("a", [1])
+    assert expired.get("a") is MISSING
+    assert departure_bucket(datetime(2024, 5, 1, 9, 44, 59), 15) == "2024-05-01T09:30"
+
+
+def test_parsed_legs_precompute_walking_metrics_and_round_trip():
+    def walk(seconds, meters=100):
+        return {"travelMode": "WALK", "staticDuration": f"{seconds}s", "distanceMeters": meters}
+
+    bus = {
+        "travelMode": "TRANSIT",
+        "staticDuration": "600s",
+        "distanceMeters": 5000,
+        "transitDetails": {
+            "stopDetails": {
+                "departureStop": {"name": "Depot"},
+                "arrivalStop": {"name": "Market St"},
+            },
+            "transitLine": {"name": "Route 7", "nameShort": "7"},
+            "stopCount": 4,
+        },
+    }
+    data = {
+        "routes": [
+            {
+                "legs": [
+                    {"duration": "1260s", "steps": [walk(60), walk(0), bus, walk(120)]},
+                    {"duration": "900s", "steps": [walk(30), bus, bus, walk(45), bus]},
+                    {"duration": "20s", "steps": [walk(20, 20)]},
+                ]
+            }
+        ]
+    }
+
+    legs = parse_routes(data)
+
+    # walk 60+0 | bus | walk 120 + 30 (spans legs) | bus bus | walk 45 | bus | walk 20
+    assert get_walking_summary(legs) == [60, 150, 45, 20]
+    assert legs[0].walk_time_s == 180 and legs[0].walk_distance_m == 300
+    step = legs[0].steps[2]
+    assert (step.line_name, step.departure_stop, step.arrival_stop, step.stop_count) == (
+        "7", "Depot", "Market St", 4,
+    )
+    assert not hasattr(step, "__dict__")
+    assert [RouteLeg.from_json(json.loads(json.dumps(leg.to_json()))) for leg in legs] == legs
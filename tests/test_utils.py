@@ -0,0 +1,93 @@
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(REPO_ROOT))
+
+from utils import (
+    ScoreCache,
+    build_tract_dataset,
+    load_and_process_data,
+    tract_dataset_is_current,
+    weighted_mean,
+)
+
+
+def test_weighted_mean_skips_zero_values_and_weights():
+    values = np.array(
+        [
+            [10.0, 20.0, 30.0],
+            [0.0, 20.0, 30.0],
+            [10.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0],
+        ]
+    )
+    weights = [1.0, 0.0, 3.0]
+
+    result = weighted_mean(values, weights)
+
+    np.testing.assert_allclose(result, [25.0, 30.0, 10.0, 0.0])
+
+
+def test_weighted_mean_accepts_a_single_row():
+    assert weighted_mean([10.0, 20.0], [1.0, 1.0]) == pytest.approx(15.0)
+    assert weighted_mean([10.0, 20.0], [0.0, 0.0]) == 0
+
+
+def test_score_cache_swaps_sources_without_touching_raw_values():
+    df = pd.DataFrame(
+        {
+            "pct_poverty": [0.0, 10.0, 20.0],
+            "pct_no_vehicle": [5.0, 0.0, 10.0],
+            "pct_fewer_vehicles": [1.0, 2.0, 3.0],
+            "pct_food_insecure": [np.nan, 4.0, 8.0],
+        }
+    )
+    cache = ScoreCache(df)
+    sources = {"pct_poverty": "pct_poverty", "pct_vehicle": "pct_no_vehicle"}
+
+    factors = cache.factors(sources, normalize=True)
+    np.testing.assert_allclose(factors["pct_vehicle"], [50.0, 0.0, 100.0])
+    scores = cache.scores({"pct_poverty": 1.0, "pct_vehicle": 1.0})
+    np.testing.assert_allclose(scores, [50.0, 50.0, 100.0])
+
+    # Overwriting the frame (as post_process_data does) must not leak into the cache
+    df["pct_poverty"] = 0.0
+    factors = cache.factors({**sources, "pct_vehicle": "pct_fewer_vehicles"}, normalize=True)
+    np.testing.assert_allclose(factors["pct_poverty"], [0.0, 50.0, 100.0])
+    np.testing.assert_allclose(factors["pct_vehicle"], [0.0, 50.0, 100.0])
+
+    factors = cache.factors(sources, normalize=False)
+    np.testing.assert_allclose(factors["pct_poverty"], [0.0, 10.0, 20.0])
+
+
+def test_tract_dataset_detects_stale_sources(tmp_path):
+    file_paths = {}
+    for key, name in (
+        ("acs", "full_acs_data.pkl"),
+        ("food_insecurity", "food_insecurity.csv"),
+        ("county_seats", "counties.csv"),
+    ):
+        shutil.copy(REPO_ROOT / "data" / name, tmp_path / name)
+        file_paths[key] = str(tmp_path / name)
+    file_paths["tract_dataset"] = str(tmp_path / "tracts.parquet")
+    config = {"file_paths": file_paths}
+
+    assert not tract_dataset_is_current(config)
+    built = build_tract_dataset(config)
+    assert tract_dataset_is_current(config)
+
+    loaded = load_and_process_data(config)
+    assert len(loaded) == len(built)
+    assert loaded.geom_equals(built).all()
+
+    with open(file_paths["food_insecurity"], "a") as f:
+        f.write("Alamance County,999,1.0\n")
+    assert not tract_dataset_is_current(config)
+    load_and_process_data(config)
+    assert tract_dataset_is_current(config)
@@ -1,8 +1,61 @@
-import os
+import asyncio
+import contextlib
 import requests
-from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Protocol, Tuple, Optional
 from datetime import datetime
 
+import aiohttp
+
+from cache import MISSING
+from maps_client import AsyncMapsClient, MapsClient, get_maps_client, run_with_maps_client
+from route_cache import RouteCache
+from route_model import RouteLeg, parse_routes, walking_segments
+
+# Google Maps Routes API endpoint
+ROUTES_URL = "https://routes.googleapis.com/directions/v2:computeRoutes"
+
+# Transit preferences sent with every route request
+TRANSIT_TRAVEL_MODES = ["BUS", "SUBWAY", "TRAIN", "LIGHT_RAIL"]
+TRANSIT_ROUTING_PREFERENCE = "FEWER_TRANSFERS"
+
+# Bump when the cached route format changes so stale entries are never read
+ROUTE_CACHE_FORMAT = 2
+
+# Route requests in flight at once for a batch search
+DEFAULT_MAX_CONCURRENT_ROUTES = 6
+
+
+def route_cache_preferences(alternative_routes: bool) -> str:
+    """The part of a route cache key describing what was asked of the Routes API."""
+    return (
+        f"v{ROUTE_CACHE_FORMAT}:TRANSIT:{','.join(TRANSIT_TRAVEL_MODES)}:"
+        f"{TRANSIT_ROUTING_PREFERENCE}:alternatives={alternative_routes}"
+    )
+
+
+class NoRoutesFound(Exception):
+    """The Routes API answered, but has no transit route between the two points."""
+
+
+class RoutingBackend(Protocol):
+    """Answers transit route requests locally instead of calling the Routes API.
+
+    See gtfs_router.GTFSRouter. ``routes`` returns legs in the same model
+    parsed from Routes API responses and raises NoRoutesFound when there is
+    no route.
+    """
+
+    def routes(
+        self,
+        start_lat: float,
+        start_lng: float,
+        end_lat: float,
+        end_lng: float,
+        departure: datetime,
+        alternative_routes: bool = False,
+    ) -> List[RouteLeg]: ...
+
 
 def debug_api_response(data: Dict) -> None:
     """Debug function to print the structure of the API response."""
@@ -29,7 +82,62 @@ def debug_api_response(data: Dict) -> None:
     print("=== END DEBUG ===\n")
 
 
-def get_transit_routes(
+# Response fields requested from the Routes API - simplified field mask for transit
+ROUTE_FIELD_MASK = ",".join(
+    [
+        "routes.legs.steps.transitDetails",
+        "routes.legs.steps.travelMode",
+        "routes.legs.steps.startLocation",
+        "routes.legs.steps.endLocation",
+        "routes.legs.steps.navigationInstruction",
+        "routes.legs.steps.distanceMeters",
+        "routes.legs.steps.staticDuration",
+        "routes.legs.startLocation",
+        "routes.legs.endLocation",
+        "routes.legs.duration",
+        "routes.legs.distanceMeters",
+        "routes.duration",
+        "routes.distanceMeters",
+    ]
+)
+
+
+def _parse_departure(departure_time: Optional[str]) -> datetime:
+    """Parse a 'YYYY-MM-DD HH:MM:SS' departure time, falling back to now."""
+    if departure_time:
+        try:
+            return datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            print(
+                f"Warning: Invalid departure_time format: {departure_time}. Using current time."
+            )
+    return datetime.now()
+
+
+def _backend_routes(
+    backend: RoutingBackend,
+    start_lat: float,
+    start_lng: float,
+    end_lat: float,
+    end_lng: float,
+    departure_time: Optional[str],
+    alternative_routes: bool,
+) -> List[RouteLeg]:
+    if None in (start_lat, start_lng, end_lat, end_lng):
+        raise ValueError(
+            "Routing backends need coordinates (start_lat, start_lng, end_lat, end_lng)"
+        )
+    return backend.routes(
+        start_lat,
+        start_lng,
+        end_lat,
+        end_lng,
+        _parse_departure(departure_time),
+        alternative_routes,
+    )
+
+
+def _prepare_route_request(
     start_lat: float = None,
     start_lng: float = None,
     end_lat: float = None,
@@ -38,33 +146,9 @@ def get_transit_routes(
     end_address: str = None,
     departure_time: Optional[str] = None,
     alternative_routes: bool = False,
-    debug: bool = False,
-) -> List[Dict]:
-    """
-    Get public transit route between two locations using Google Maps Routes API.
-    Can accept either coordinates or addresses.
-
-    Args:
-        start_lat: Starting latitude (if using coordinates)
-        start_lng: Starting longitude (if using coordinates)
-        end_lat: Destination latitude (if using coordinates)
-        end_lng: Destination longitude (if using coordinates)
-        start_address: Starting address (if using address)
-        end_address: Destination address (if using address)
-        departure_time: Optional departure time in format 'YYYY-MM-DD HH:MM:SS'
-                       If None, uses current time
-        alternative_routes: Whether to compute alternative routes
-        debug: Whether to print debug information about the API response
-
-    Returns:
-        List of route legs containing step-by-step directions
-    """
-
-    # Get API key from environment variable
-    api_key = os.getenv("MAPS_API_KEY")
-    if not api_key:
-        raise ValueError("MAPS_API_KEY environment variable not found")
-
+    cache: Optional[RouteCache] = None,
+) -> Tuple[Dict, Dict, Optional[str]]:
+    """Build the headers, request body and route cache key for a transit request."""
     # Validate input - either coordinates or addresses must be provided
     if start_address and end_address:
         # Using addresses
@@ -88,44 +172,26 @@ def get_transit_routes(
             "Must provide either coordinates (start_lat, start_lng, end_lat, end_lng) or addresses (start_address, end_address)"
         )
 
-    # Google Maps Routes API endpoint
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
-
     # Convert departure time to RFC3339 format if provided
-    departure_rfc3339 = None
-    if departure_time:
-        try:
-            dt = datetime.strptime(departure_time, "%Y-%m-%d %H:%M:%S")
-            departure_rfc3339 = dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-        except ValueError:
-            print(
-                f"Warning: Invalid departure_time format: {departure_time}. Using current time."
-            )
-
-    if not departure_rfc3339:
-        departure_rfc3339 = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    departure_dt = _parse_departure(departure_time)
+    departure_rfc3339 = departure_dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key(
+            departure_dt,
+            route_cache_preferences(alternative_routes),
+            start_address=start_address if start_address and end_address else None,
+            end_address=end_address if start_address and end_address else None,
+            start_lat=start_lat,
+            start_lng=start_lng,
+            end_lat=end_lat,
+            end_lng=end_lng,
+        )
 
-    # Request headers - simplified field mask for transit
     headers = {
         "Content-Type": "application/json",
-        "X-Goog-Api-Key": api_key,
-        "X-Goog-FieldMask": ",".join(
-            [
-                "routes.legs.steps.transitDetails",
-                "routes.legs.steps.travelMode",
-                "routes.legs.steps.startLocation",
-                "routes.legs.steps.endLocation",
-                "routes.legs.steps.navigationInstruction",
-                "routes.legs.steps.distanceMeters",
-                "routes.legs.steps.staticDuration",
-                "routes.legs.startLocation",
-                "routes.legs.endLocation",
-                "routes.legs.duration",
-                "routes.legs.distanceMeters",
-                "routes.duration",
-                "routes.distanceMeters",
-            ]
-        ),  # End of field mask
+        "X-Goog-FieldMask": ROUTE_FIELD_MASK,
     }
 
     # Simplified request body for transit
@@ -134,18 +200,110 @@ def get_transit_routes(
         "destination": destination_location,
         "travelMode": "TRANSIT",
         "transitPreferences": {
-            "allowedTravelModes": ["BUS", "SUBWAY", "TRAIN", "LIGHT_RAIL"],
-            "routingPreference": "FEWER_TRANSFERS",
+            "allowedTravelModes": TRANSIT_TRAVEL_MODES,
+            "routingPreference": TRANSIT_ROUTING_PREFERENCE,
         },
         "departureTime": departure_rfc3339,
         "computeAlternativeRoutes": alternative_routes,
         "languageCode": "en-US",
         "units": "METRIC",
     }
+    return headers, request_body, cache_key
+
+
+def _cached_routes(cache: Optional[RouteCache], cache_key: Optional[str]):
+    if cache is None:
+        return None
+    cached = cache.get(cache_key)
+    if cached is MISSING:
+        return None
+    return [RouteLeg.from_json(leg) for leg in cached]
+
+
+def _parse_route_response(
+    data: Dict, debug: bool, cache: Optional[RouteCache], cache_key: Optional[str]
+) -> List[RouteLeg]:
+    # Debug the response structure if requested
+    if debug:
+        debug_api_response(data)
+
+    if "routes" not in data or len(data["routes"]) == 0:
+        raise NoRoutesFound("No routes found")
+
+    # Parse straight into the compact leg model; step metrics are computed here once
+    all_legs = parse_routes(data)
+
+    if cache is not None:
+        cache.set(cache_key, [leg.to_json() for leg in all_legs])
+    return all_legs
+
+
+def get_transit_routes(
+    start_lat: float = None,
+    start_lng: float = None,
+    end_lat: float = None,
+    end_lng: float = None,
+    start_address: str = None,
+    end_address: str = None,
+    departure_time: Optional[str] = None,
+    alternative_routes: bool = False,
+    debug: bool = False,
+    client: Optional[MapsClient] = None,
+    cache: Optional[RouteCache] = None,
+    backend: Optional[RoutingBackend] = None,
+) -> List[RouteLeg]:
+    """
+    Get public transit route between two locations using Google Maps Routes API.
+    Can accept either coordinates or addresses.
+
+    Args:
+        start_lat: Starting latitude (if using coordinates)
+        start_lng: Starting longitude (if using coordinates)
+        end_lat: Destination latitude (if using coordinates)
+        end_lng: Destination longitude (if using coordinates)
+        start_address: Starting address (if using address)
+        end_address: Destination address (if using address)
+        departure_time: Optional departure time in format 'YYYY-MM-DD HH:MM:SS'
+                       If None, uses current time
+        alternative_routes: Whether to compute alternative routes
+        debug: Whether to print debug information about the API response
+        client: Maps client to send the request with (defaults to the shared,
+                pooled client for MAPS_API_KEY)
+        cache: Optional route cache to answer repeat requests from; new
+               results are stored in it
+        backend: Optional routing backend (e.g. an offline GTFS router) to
+                 answer the request instead of the Routes API; it needs
+                 coordinates, and client and cache are not used
+
+    Returns:
+        List of RouteLeg objects containing step-by-step directions
+    """
+    if backend is not None:
+        return _backend_routes(
+            backend, start_lat, start_lng, end_lat, end_lng, departure_time, alternative_routes
+        )
+
+    # Shared client: pooled connections, retries and the API key read once
+    client = client or get_maps_client()
+
+    headers, request_body, cache_key = _prepare_route_request(
+        start_lat,
+        start_lng,
+        end_lat,
+        end_lng,
+        start_address,
+        end_address,
+        departure_time,
+        alternative_routes,
+        cache,
+    )
+    cached = _cached_routes(cache, cache_key)
+    if cached is not None:
+        return cached
 
     try:
         # Make API request
-        response = requests.post(url, headers=headers, json=request_body)
+        response = client.post(ROUTES_URL, headers=headers, json=request_body)
 
         # Check for detailed error information
         if response.status_code != 200:
@@ -154,93 +312,230 @@ def get_transit_routes(
             print(f"Response Body: {response.text}")
             response.raise_for_status()
 
-        data = response.json()
-
-        # Debug the response structure if requested
-        if debug:
-            debug_api_response(data)
-
-        if "routes" not in data or len(data["routes"]) == 0:
-            raise Exception("No routes found")
-
-        # Extract route legs from all routes
-        all_legs = []
-
-        for route_idx, route in enumerate(data["routes"]):
-            route_legs = []
-
-            for leg_idx, leg in enumerate(route.get("legs", [])):
-                # Safely extract location data
-                start_location = None
-                end_location = None
-
-                if "startLocation" in leg and "latLng" in leg["startLocation"]:
-                    start_location = leg["startLocation"]["latLng"]
-                if "endLocation" in leg and "latLng" in leg["endLocation"]:
-                    end_location = leg["endLocation"]["latLng"]
-
-                leg_info = {
-                    "route_index": route_idx,
-                    "leg_index": leg_idx,
-                    "start_location": start_location,
-                    "end_location": end_location,
-                    "distance_meters": leg.get("distanceMeters", 0),
-                    "duration": leg.get("duration", "0s"),
-                    "steps": [],
-                }
-
-                # Process each step in the leg
-                for step_idx, step in enumerate(leg.get("steps", [])):
-                    # Safely extract step location data
-                    step_start_location = None
-                    step_end_location = None
-
-                    if "startLocation" in step and "latLng" in step["startLocation"]:
-                        step_start_location = step["startLocation"]["latLng"]
-                    if "endLocation" in step and "latLng" in step["endLocation"]:
-                        step_end_location = step["endLocation"]["latLng"]
-
-                    step_info = {
-                        "step_index": step_idx,
-                        "travel_mode": step.get("travelMode", "UNKNOWN"),
-                        "start_location": step_start_location,
-                        "end_location": step_end_location,
-                        "distance_meters": step.get("distanceMeters", 0),
-                        "duration": step.get(
-                            "duration", step.get("staticDuration", "0s")
-                        ),
-                        "instructions": step.get("navigationInstruction", {}).get(
-                            "instructions", ""
-                        ),
-                    }
-
-                    # Add transit-specific information if available
-                    if "transitDetails" in step:
-                        transit = step["transitDetails"]
-                        step_info["transit_details"] = {
-                            "stop_details": transit.get("stopDetails", {}),
-                            "transit_line": transit.get("transitLine", {}),
-                            "departure_time": transit.get("departureTime"),
-                            "arrival_time": transit.get("arrivalTime"),
-                            "headsign": transit.get("headsign", ""),
-                            "trip_short_text": transit.get("tripShortText", ""),
-                            "stop_count": transit.get("stopCount", 0),
-                        }
-
-                    leg_info["steps"].append(step_info)
-
-                route_legs.append(leg_info)
-
-            all_legs.extend(route_legs)
-
-        return all_legs
+        return _parse_route_response(response.json(), debug, cache, cache_key)
 
+    except NoRoutesFound:
+        raise
     except requests.exceptions.RequestException as e:
         raise Exception(f"Network error: {e}")
     except Exception as e:
         raise Exception(f"Error getting transit route: {e}")
 
 
+async def get_transit_routes_async(
+    client: Optional[AsyncMapsClient],
+    start_lat: float = None,
+    start_lng: float = None,
+    end_lat: float = None,
+    end_lng: float = None,
+    start_address: str = None,
+    end_address: str = None,
+    departure_time: Optional[str] = None,
+    alternative_routes: bool = False,
+    debug: bool = False,
+    cache: Optional[RouteCache] = None,
+    backend: Optional[RoutingBackend] = None,
+) -> List[RouteLeg]:
+    """
+    Async counterpart of get_transit_routes(), sent on an open AsyncMapsClient.
+
+    Takes the same arguments and raises the same errors; *client* must be
+    inside its ``async with`` block. A *backend* answers in-line, without
+    awaiting the network, and then *client* may be None.
+    """
+    if backend is not None:
+        return _backend_routes(
+            backend, start_lat, start_lng, end_lat, end_lng, departure_time, alternative_routes
+        )
+    headers, request_body, cache_key = _prepare_route_request(
+        start_lat,
+        start_lng,
+        end_lat,
+        end_lng,
+        start_address,
+        end_address,
+        departure_time,
+        alternative_routes,
+        cache,
+    )
+    cached = _cached_routes(cache, cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await client.post(ROUTES_URL, headers=headers, json=request_body)
+
+        if response.status != 200:
+            print(f"HTTP Status Code: {response.status}")
+            print(f"Response Body: {response.text}")
+            response.raise_for_status()
+
+        return _parse_route_response(response.json(), debug, cache, cache_key)
+
+    except NoRoutesFound:
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Timeouts carry no message of their own
+        raise Exception(f"Network error: {str(e) or type(e).__name__}")
+    except Exception as e:
+        raise Exception(f"Error getting transit route: {e}")
+
+
+async def iter_transit_routes_async(
+    route_requests: List[Dict], client: Optional[AsyncMapsClient]
+) -> AsyncIterator[Tuple[int, Optional[List[RouteLeg]], Optional[Exception]]]:
+    """
+    Fetch several transit routes on *client*, yielding each one as it completes.
+
+    Args:
+        route_requests: Keyword arguments for get_transit_routes_async(), one dict per route
+        client: Open client; its concurrency and per-host limits bound the fan-out.
+                May be None when every request has a *backend*
+
+    Returns:
+        Async iterator of (request index, route legs, error) tuples in completion
+        order. Closing the iterator early (e.g. with ``contextlib.aclosing``)
+        cancels the requests still in flight.
+    """
+
+    async def fetch(idx, kwargs):
+        try:
+            return idx, await get_transit_routes_async(client, **kwargs), None
+        except Exception as e:
+            return idx, None, e
+
+    tasks = [
+        asyncio.ensure_future(fetch(idx, kwargs)) for idx, kwargs in enumerate(route_requests)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_transit_routes(
+    route_requests: List[Dict],
+    on_result: Callable[[int, Optional[List[RouteLeg]], Optional[Exception]], None],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_ROUTES,
+    client: Optional[AsyncMapsClient] = None,
+) -> None:
+    """
+    Fetch several transit routes on one event loop, blocking until all finish.
+
+    Args:
+        route_requests: Keyword arguments for get_transit_routes_async(), one dict per route
+        on_result: Called as on_result(request index, route legs, error) from the
+                   calling thread as each route completes
+        max_concurrency: Maximum number of requests in flight at once
+        client: Unopened AsyncMapsClient to send the requests with; it is opened
+                and closed around the batch. By default the requests share the
+                process-wide client for MAPS_API_KEY and max_concurrency, whose
+                session stays open between batches. No client is needed, and
+                none is created, when every request has a *backend*.
+
+    If on_result raises - for example Streamlit stopping the script because the
+    user cleared the results - the requests still in flight are cancelled and
+    the exception propagates. Must not be called from a running event loop.
+    """
+    if not route_requests:
+        return
+
+    offline = all(request.get("backend") is not None for request in route_requests)
+    if client is None and not offline:
+        results = run_with_maps_client(
+            lambda shared: iter_transit_routes_async(route_requests, shared),
+            max_concurrency=max_concurrency,
+        )
+        with contextlib.closing(results):
+            for idx, legs, error in results:
+                on_result(idx, legs, error)
+        return
+
+    async def run():
+        async with contextlib.AsyncExitStack() as stack:
+            session_client = await stack.enter_async_context(client) if client else None
+            results = iter_transit_routes_async(route_requests, session_client)
+            async with contextlib.aclosing(results):
+                async for idx, legs, error in results:
+                    on_result(idx, legs, error)
+
+    asyncio.run(run())
+
+
+def iter_transit_routes(
+    route_requests: List[Dict],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_ROUTES,
+    fetch: Callable[..., List[Dict]] = None,
+) -> Iterator[Tuple[int, Optional[List[Dict]], Optional[Exception]]]:
+    """
+    Fetch several transit routes concurrently in threads, yielding each one as it completes.
+
+    Use this for a blocking *fetch* function; run_transit_routes() fans out
+    Routes API requests on one event loop instead.
+
+    Args:
+        route_requests: Keyword arguments for get_transit_routes(), one dict per route
+        max_concurrency: Maximum number of requests in flight at once
+        fetch: Function called with each request's keyword arguments
+               (defaults to get_transit_routes)
+
+    Returns:
+        Iterator of (request index, route legs, error) tuples in completion order.
+        A failed request yields its exception instead of raising, so one bad
+        destination does not abort the others.
+    """
+    fetch = fetch or get_transit_routes
+    if not route_requests:
+        return
+    workers = max(1, min(max_concurrency, len(route_requests)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch, **kwargs): idx for idx, kwargs in enumerate(route_requests)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                yield idx, future.result(), None
+            except Exception as e:
+                yield idx, None, e
+
+
+def get_transit_routes_batch(
+    route_requests: List[Dict],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_ROUTES,
+    progress: Optional[Callable[[int, int], None]] = None,
+    client: Optional[AsyncMapsClient] = None,
+) -> List[Tuple[Optional[List[RouteLeg]], Optional[Exception]]]:
+    """
+    Fetch several transit routes concurrently.
+
+    Args:
+        route_requests: Keyword arguments for get_transit_routes_async(), one dict per route
+        max_concurrency: Maximum number of requests in flight at once
+        progress: Optional callback called as progress(done, total) after each
+                  route completes, from the calling thread
+        client: Optional unopened AsyncMapsClient, as for run_transit_routes()
+
+    Returns:
+        (route legs, error) for each request, in the same order as route_requests
+    """
+    results = [(None, None)] * len(route_requests)
+    done = 0
+
+    def collect(idx, legs, error):
+        nonlocal done
+        results[idx] = (legs, error)
+        done += 1
+        if progress is not None:
+            progress(done, len(route_requests))
+
+    run_transit_routes(route_requests, collect, max_concurrency, client)
+    return results
+
+
 def duration_to_seconds(duration_str: str) -> int:
     """Convert duration string like '123s' to seconds as integer."""
     if duration_str.endswith("s"):
@@ -248,40 +543,18 @@ def duration_to_seconds(duration_str: str) -> int:
     return 0
 
 
-def get_walking_summary(legs: List[Dict]) -> List[int]:
+def get_walking_summary(legs: List[RouteLeg]) -> List[int]:
     """
     Analyze a route and return consecutive walking times as a summary.
 
     Args:
-        legs: List of route legs from get_transit_route()
+        legs: List of route legs from get_transit_routes()
 
     Returns:
         List of walking durations in seconds for each consecutive walking segment.
         For example, if route is walk1->walk2->bus->walk3, returns [walk1+walk2, walk3]
     """
-    walking_segments = []
-    current_walking_duration = 0
-
-    # Iterate through all steps in all legs
-    for leg in legs:
-        for step in leg["steps"]:
-            travel_mode = step.get("travel_mode", "UNKNOWN")
-            step_duration = duration_to_seconds(step.get("duration", "0s"))
-
-            if travel_mode == "WALK":
-                # Add to current walking segment
-                current_walking_duration += step_duration
-            else:
-                # Non-walking step - save current walking segment if it exists
-                if current_walking_duration > 0:
-                    walking_segments.append(current_walking_duration)
-                    current_walking_duration = 0
-
-    # Don't forget the last walking segment if route ends with walking
-    if current_walking_duration > 0:
-        walking_segments.append(current_walking_duration)
-
-    return walking_segments
+    return walking_segments(legs)
 
 
 def format_walking_summary(walking_segments: List[int]) -> str:
@@ -322,7 +595,7 @@ def format_distance(distance_meters: int) -> str:
         return f"{km:.1f} km"
 
 
-def print_route_summary(routes: List[Dict]) -> None:
+def print_route_summary(routes: List[RouteLeg]) -> None:
     """Print a human-readable summary of the routes."""
 
     if not routes:
@@ -332,61 +605,35 @@ def print_route_summary(routes: List[Dict]) -> None:
     for route_index, route in enumerate(routes):
         print(f"\n=== ROUTE {route_index + 1} ===")
         print(
-            f"Total distance: {format_distance(route['distance_meters'])}, "
-            f"Duration: {format_duration(route['duration'])}"
+            f"Total distance: {format_distance(route.distance_meters)}, "
+            f"Duration: {format_duration(route.duration)}"
         )
 
-        for step in route["steps"]:
-            distance_text = format_distance(step["distance_meters"])
-            duration_text = format_duration(step["duration"])
+        for step in route.steps:
+            distance_text = format_distance(step.distance_meters)
+            duration_text = format_duration(step.duration)
 
             print(
-                f"  Step {step['step_index'] + 1} ({step['travel_mode']}): "
+                f"  Step {step.step_index + 1} ({step.travel_mode}): "
                 f"{distance_text}, {duration_text}"
             )
 
-            if step.get("instructions"):
-                print(f"    Instructions: {step['instructions']}")
-
-            if "transit_details" in step:
-                transit = step["transit_details"]
+            if step.instructions:
+                print(f"    Instructions: {step.instructions}")
 
-                # Transit line info
-                line_info = transit.get("transit_line", {})
-                line_name = (
-                    line_info.get("nameShort")
-                    or line_info.get("name")
-                    or "Unknown Line"
+            if step.is_transit:
+                print(f"    Transit: {step.line_name or 'Unknown Line'}")
+                print(
+                    f"    From: {step.departure_stop or 'Unknown'} → "
+                    f"To: {step.arrival_stop or 'Unknown'}"
+                )
+                print(
+                    f"    Departure: {step.departure_time or 'Unknown'}, "
+                    f"Arrival: {step.arrival_time or 'Unknown'}"
                 )
 
-                # Stop info
-                stop_details = transit.get("stop_details", {})
-                dep_stop = stop_details.get("departureStop", {})
-                arr_stop = stop_details.get("arrivalStop", {})
-                dep_stop_name = dep_stop.get("name", "Unknown")
-                arr_stop_name = arr_stop.get("name", "Unknown")
-
-                print(f"    Transit: {line_name}")
-                print(f"    From: {dep_stop_name} → To: {arr_stop_name}")
-
-                # Times - handle both string and object formats
-                dep_time = transit.get("departure_time")
-                arr_time = transit.get("arrival_time")
-
-                if isinstance(dep_time, dict):
-                    dep_time_text = dep_time.get("text", "Unknown")
-                else:
-                    dep_time_text = str(dep_time) if dep_time else "Unknown"
-
-                if isinstance(arr_time, dict):
-                    arr_time_text = arr_time.get("text", "Unknown")
-                else:
-                    arr_time_text = str(arr_time) if arr_time else "Unknown"
-
-                print(f"    Departure: {dep_time_text}, Arrival: {arr_time_text}")
-
-                if transit.get("stop_count"):
-                    print(f"    Stops: {transit['stop_count']}")
+                if step.stop_count:
+                    print(f"    Stops: {step.stop_count}")
 
 
 # Example usage
@@ -0,0 +1,72 @@
+"""Registry of uploaded address files keyed by a hash of their contents."""
+
+import hashlib
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+
+def content_hash(uploaded_file) -> str:
+    """SHA-256 of an uploaded file's bytes, leaving its read position unchanged."""
+    if hasattr(uploaded_file, "getvalue"):
+        data = uploaded_file.getvalue()
+    else:
+        position = uploaded_file.tell()
+        uploaded_file.seek(0)
+        data = uploaded_file.read()
+        uploaded_file.seek(position)
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadRegistry:
+    """Processed upload frames keyed by content hash, in upload order.
+
+    Lookup, add and remove are dict operations. Streamlit ``file_id`` values
+    are remembered, so the same widget upload is never hashed twice.
+    """
+
+    def __init__(self):
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._file_ids: Dict[str, str] = {}
+
+    def digest_for(self, uploaded_file) -> str:
+        """Return the content hash for *uploaded_file*, reusing it for a known file_id."""
+        file_id = getattr(uploaded_file, "file_id", None)
+        if file_id is not None and file_id in self._file_ids:
+            return self._file_ids[file_id]
+        digest = content_hash(uploaded_file)
+        if file_id is not None:
+            self._file_ids[file_id] = digest
+        return digest
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def add(self, digest: str, df: pd.DataFrame) -> None:
+        """Store *df* under *digest*, replacing any frame already stored there."""
+        self._frames[digest] = df
+
+    def remove(self, digest: str) -> bool:
+        return self._frames.pop(digest, None) is not None
+
+    def digests_for_name(self, filename: str) -> List[str]:
+        """Content hashes of every upload whose ``source_file`` is *filename*."""
+        return [
+            digest
+            for digest, df in self._frames.items()
+            if not df.empty
+            and "source_file" in df.columns
+            and df["source_file"].iloc[0] == filename
+        ]
+
+    def digests(self) -> Tuple[str, ...]:
+        """Content hashes of every stored upload, in upload order."""
+        return tuple(self._frames)
+
+    def frames(self) -> List[pd.DataFrame]:
+        return list(self._frames.values())
@@ -1,9 +1,18 @@
+import hashlib
+import io
 import json
+import os
 import pickle
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pyarrow.parquet as pq
 import streamlit as st
 
+# Bump when the columns written by build_tract_dataset change so old artifacts rebuild
+TRACT_DATASET_VERSION = 2
+TRACT_DATASET_METADATA_KEY = b"tract_data"
+
 def load_config(config_path="config.json"):
     with open(config_path, "r") as f:
         return json.load(f)
@@ -21,7 +30,7 @@ def fix_tract(s):
         right_side = right_side + "0"
     return left_side + "." + right_side
 
-def load_and_process_data(config):
+def _merge_tract_sources(config):
     paths = config["file_paths"]
     with open(paths["acs"], "rb") as f:
         tract = pickle.load(f)  # expecting a GeoDataFrame
@@ -38,38 +47,267 @@ def load_and_process_data(config):
 
     countylist = pd.read_csv(paths["county_seats"], index_col=None)
     tract = tract.loc[tract["County"].isin(countylist["County"])]
+    return add_tract_extents(tract)
+
+def add_tract_extents(tract):
+    """Add WGS84 centroid and bounding box columns so the map never reprojects at render time."""
+    projected = tract.geometry.to_crs("EPSG:3857")
+    centroids = gpd.GeoSeries(projected.centroid, crs=projected.crs).to_crs("EPSG:4326")
+    bounds = tract.geometry.to_crs("EPSG:4326").bounds
+    return tract.assign(
+        centroid_lat=centroids.y,
+        centroid_lon=centroids.x,
+        min_lon=bounds["minx"],
+        min_lat=bounds["miny"],
+        max_lon=bounds["maxx"],
+        max_lat=bounds["maxy"],
+    )
+
+def file_hash(path):
+    """SHA-256 of the file at *path*, to tie an artifact to the input it was built from."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def tract_sources_hash(config):
+    """Hash the files the tract dataset is built from, plus the dataset format version."""
+    paths = config["file_paths"]
+    digest = hashlib.sha256(f"v{TRACT_DATASET_VERSION}".encode())
+    for key in ("acs", "food_insecurity", "county_seats"):
+        with open(paths[key], "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def read_tract_dataset_metadata(path):
+    """Return the build metadata stored in a tract dataset, or None if it has none."""
+    metadata = pq.read_schema(path).metadata or {}
+    if TRACT_DATASET_METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[TRACT_DATASET_METADATA_KEY])
+
+def tract_dataset_is_current(config):
+    path = config["file_paths"].get("tract_dataset")
+    if not path or not os.path.exists(path):
+        return False
+    metadata = read_tract_dataset_metadata(path)
+    if metadata is None or metadata.get("version") != TRACT_DATASET_VERSION:
+        return False
+    try:
+        return metadata.get("source_hash") == tract_sources_hash(config)
+    except FileNotFoundError:
+        # Deployments may ship only the built artifact
+        return True
+
+def build_tract_dataset(config, tract=None):
+    """Merge the tract sources and write them to the GeoParquet tract dataset."""
+    path = config["file_paths"]["tract_dataset"]
+    if tract is None:
+        tract = _merge_tract_sources(config)
+    buffer = io.BytesIO()
+    tract.to_parquet(buffer)
+    table = pq.read_table(buffer)
+    metadata = {
+        **(table.schema.metadata or {}),
+        TRACT_DATASET_METADATA_KEY: json.dumps(
+            {"version": TRACT_DATASET_VERSION, "source_hash": tract_sources_hash(config)}
+        ).encode(),
+    }
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+    os.replace(tmp_path, path)
     return tract
 
-def weighted_mean(values, weights):
-    valid_pairs = [(v, w) for v, w in zip(values, weights) if v != 0 and w != 0]
-    if not valid_pairs:
-        return 0
-    values, weights = zip(*valid_pairs)
-    norm_weights = [w / sum(weights) for w in weights]
-    return sum([v * w for v, w in zip(values, norm_weights)])
-
-def normalize_column(col):
-    if "normalize" in st.session_state["config"] and st.session_state["config"]["normalize"]:
-        return 100 * (col - col.min()) / (col.max() - col.min())
-    return col
-
-def post_process_data(_tract_data, vehicle_num_toggle, poverty_weight, vehicle_weight, food_weight):
-    if not vehicle_num_toggle:
-        _tract_data["pct_vehicle"] = _tract_data["pct_no_vehicle"]
-    else:
-        _tract_data["pct_vehicle"] = _tract_data["pct_fewer_vehicles"]
-    _tract_data["pct_poverty"] = normalize_column(_tract_data["pct_poverty"]).fillna(0)
-    _tract_data["pct_vehicle"] = normalize_column(_tract_data["pct_vehicle"]).fillna(0)   
-    _tract_data["pct_food_insecure"] = normalize_column(_tract_data["pct_food_insecure"]).fillna(0) 
-    _tract_data["combined_pct"] = _tract_data[
-        ["pct_poverty", "pct_vehicle", "pct_food_insecure"]
-    ].apply(
-        lambda x: weighted_mean(
-            x, [poverty_weight, vehicle_weight, food_weight]
-        ),
-        axis=1,
+def load_and_process_data(config):
+    """Load the tract GeoDataFrame, preferring the prebuilt GeoParquet dataset.
+
+    A missing or stale dataset is rebuilt from the source files when possible.
+    """
+    if "tract_dataset" not in config["file_paths"]:
+        return _merge_tract_sources(config)
+    path = config["file_paths"]["tract_dataset"]
+    if not tract_dataset_is_current(config):
+        tract = _merge_tract_sources(config)
+        try:
+            build_tract_dataset(config, tract)
+        except OSError:
+            return tract
+    return gpd.read_parquet(path, memory_map=True)
+
+def weighted_mean(values, weights, mask=None):
+    """Weighted mean along the last axis, skipping zero values and zero weights.
+
+    *values* may be a single row of factors or a 2-D ``(rows, factors)`` matrix;
+    rows with no valid pairs score 0. Callers that keep NaN-free values around
+    can pass their ``values != 0`` *mask* so it is not rebuilt on every call.
+    """
+    if mask is None:
+        values = np.nan_to_num(np.asarray(values, dtype=float))
+        mask = values != 0
+    weights = np.asarray(weights, dtype=float)
+    # Zero values and zero weights drop out of both products
+    total = mask @ weights
+    weighted = values @ weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = np.where(total != 0, weighted / total, 0.0)
+    return result if result.ndim else float(result)
+
+SCORE_SOURCE_COLUMNS = ("pct_poverty", "pct_no_vehicle", "pct_fewer_vehicles", "pct_food_insecure")
+# Minutes by transit to the closest facility, from the transit access artifact
+ACCESS_FACTOR_COLUMN = "transit_minutes"
+# Optional factors that are only scored when their column has been loaded
+OPTIONAL_SCORE_SOURCE_COLUMNS = (ACCESS_FACTOR_COLUMN,)
+
+def vehicle_source_column(vehicle_num_toggle):
+    return "pct_fewer_vehicles" if vehicle_num_toggle else "pct_no_vehicle"
+
+def normalize_values(values):
+    """Min-max scale *values* to 0-100, ignoring NaNs like ``Series.min``/``max`` do."""
+    if np.isnan(values).all():
+        return values.copy()
+    low, high = np.nanmin(values), np.nanmax(values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * (values - low) / (high - low)
+
+class FactorColumns:
+    """Read-only cleaned and normalized copies of the raw factor columns.
+
+    Built once per process and shared by every session's ScoreCache. The raw
+    values are copied, so normalizing never compounds on already-normalized data.
+    """
+
+    def __init__(self, _tract_data, source_columns=SCORE_SOURCE_COLUMNS):
+        self.index = _tract_data.index
+        self._columns = {}
+        for col in source_columns:
+            raw = _tract_data[col].to_numpy(dtype=float, copy=True)
+            for normalize in (False, True):
+                values = np.nan_to_num(normalize_values(raw) if normalize else raw, nan=0.0)
+                values.setflags(write=False)
+                self._columns[(col, normalize)] = values
+
+    def __contains__(self, source):
+        return (source, False) in self._columns
+
+    def column(self, source, normalize):
+        """Return the cleaned (and optionally normalized) values of a source column."""
+        return self._columns[(source, bool(normalize))]
+
+class ScoreCache:
+    """The current factor matrix and its masks, kept between Streamlit reruns.
+
+    A weight change only costs two matrix-vector products, and changing one
+    factor's source column swaps just that column.
+    """
+
+    def __init__(self, factor_columns):
+        if not isinstance(factor_columns, FactorColumns):
+            factor_columns = FactorColumns(factor_columns)
+        self.index = factor_columns.index
+        self._factor_columns = factor_columns
+        self._factors = ()
+        self._sources = {}
+        self._normalize = None
+        self._values = np.zeros((len(self.index), 0))
+        self._mask = np.zeros((len(self.index), 0))
+
+    def has_source(self, source):
+        return source in self._factor_columns
+
+    def column(self, source, normalize):
+        return self._factor_columns.column(source, normalize)
+
+    def factors(self, sources, normalize):
+        """Point each factor at a source column and return ``{factor: values}``.
+
+        *sources* maps factor names to source columns. Only factors whose source
+        changed since the last call are rebuilt.
+        """
+        factors = tuple(sources)
+        if factors != self._factors or normalize != self._normalize:
+            self._factors = factors
+            self._normalize = normalize
+            self._sources = {}
+            self._values = np.zeros((len(self.index), len(factors)))
+            self._mask = np.zeros((len(self.index), len(factors)))
+        for i, factor in enumerate(factors):
+            if self._sources.get(factor) != sources[factor]:
+                values = self.column(sources[factor], normalize)
+                self._values[:, i] = values
+                self._mask[:, i] = values != 0
+                self._sources[factor] = sources[factor]
+        return {factor: self._values[:, i] for i, factor in enumerate(factors)}
+
+    def scores(self, factor_weights):
+        """Weighted mean of the current factors, skipping zero values and zero weights."""
+        weights = [factor_weights.get(f, 0.0) for f in self._factors]
+        return weighted_mean(self._values, weights, self._mask)
+
+def compute_scores(
+    score_cache, vehicle_num_toggle, poverty_weight, vehicle_weight, food_weight, transit_weight=0.0
+):
+    """Return the per-session score columns as a DataFrame aligned to the tracts.
+
+    The transit access factor is included whenever its column was loaded.
+    """
+    normalize = bool(st.session_state["config"].get("normalize", False))
+    sources = {
+        "pct_poverty": "pct_poverty",
+        "pct_vehicle": vehicle_source_column(vehicle_num_toggle),
+        "pct_food_insecure": "pct_food_insecure",
+    }
+    if score_cache.has_source(ACCESS_FACTOR_COLUMN):
+        sources[ACCESS_FACTOR_COLUMN] = ACCESS_FACTOR_COLUMN
+    factors = score_cache.factors(sources, normalize)
+    scores = pd.DataFrame(
+        {col: values.copy() for col, values in factors.items()}, index=score_cache.index
     )
-    # st.write(_tract_data)
+    scores["combined_pct"] = score_cache.scores(
+        {
+            "pct_poverty": poverty_weight,
+            "pct_vehicle": vehicle_weight,
+            "pct_food_insecure": food_weight,
+            ACCESS_FACTOR_COLUMN: transit_weight,
+        }
+    )
+    return scores
+
+def post_process_data(
+    _tract_data,
+    vehicle_num_toggle,
+    poverty_weight,
+    vehicle_weight,
+    food_weight,
+    score_cache=None,
+):
+    if score_cache is None:
+        score_cache = ScoreCache(_tract_data)
+    scores = compute_scores(
+        score_cache, vehicle_num_toggle, poverty_weight, vehicle_weight, food_weight
+    )
+    for col in scores.columns:
+        _tract_data[col] = scores[col]
     return _tract_data
 
+def attach_scores(_tract_data, scores):
+    """Return a new frame of the shared tract data with the session's score columns."""
+    return _tract_data.drop(columns=scores.columns, errors="ignore").join(scores)
+
+@st.cache_resource(show_spinner="Loading tract data...")
+def load_shared_tracts(file_paths):
+    """Load the tract geometry and base ACS columns once per process.
 
+    The returned GeoDataFrame and FactorColumns are shared by every session and
+    must not be mutated; per-session scores come from compute_scores. A transit
+    access artifact built from another facilities file is left out.
+    """
+    tract = load_and_process_data({"file_paths": dict(file_paths)})
+    access_path = file_paths.get("transit_access")
+    if access_path and os.path.exists(access_path):
+        # Only needed when the artifact exists; keeps routing out of the map's imports
+        from accessibility import attach_transit_access, transit_access_is_current
+
+        if transit_access_is_current(access_path, file_paths.get("programs")):
+            tract = attach_transit_access(tract, access_path)
+    source_columns = SCORE_SOURCE_COLUMNS + tuple(
+        col for col in OPTIONAL_SCORE_SOURCE_COLUMNS if col in tract.columns
+    )
+    return tract, FactorColumns(tract, source_columns)